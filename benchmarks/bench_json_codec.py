@@ -0,0 +1,114 @@
+"""Compare the json codecs on conversation and search payloads
+
+The payloads are built with the shape and the size of real responses: every
+tweet of `globalObjects` carries it's user, entities and counters, while the
+crawler reads only `full_text`. Pass recorded response bodies with `-p` to
+time those instead.
+
+Usage:
+    python -m benchmarks.bench_json_codec [-n NUMBER] [-p PAYLOAD ...]
+"""
+import sys
+import json
+import timeit
+import argparse
+
+from tweet_crawler import json_codec
+
+
+TEXT = "Starship 🚀 lifts off from Starbase, Texas — «the largest rocket ever flown» #SpaceX https://t.co/abcdefghij"
+
+
+def _tweet(i):
+    return {
+        "created_at": "Thu Apr 20 13:33:{:02d} +0000 2023".format(i % 60),
+        "id": 1649000000000000000 + i,
+        "id_str": str(1649000000000000000 + i),
+        "full_text": "{} ({})".format(TEXT, i),
+        "display_text_range": [0, 120],
+        "entities": {
+            "hashtags": [{"text": "SpaceX", "indices": [70, 77]}],
+            "urls": [{"url": "https://t.co/abcdefghij", "expanded_url": "https://spacex.com/launches", "indices": [78, 101]}],
+            "user_mentions": [],
+        },
+        "user_id_str": str(10000 + i % 50),
+        "in_reply_to_status_id_str": str(1649000000000000000),
+        "retweet_count": i * 3,
+        "favorite_count": i * 17,
+        "reply_count": i % 7,
+        "lang": "en",
+        "conversation_id_str": str(1649000000000000000),
+    }
+
+
+def conversation_payload(modules=20, replies=5):
+    """a conversation page of `modules` timelines of `replies` replies
+    """
+    tweets = {}
+    entries = [{"entryId": "tweet-0", "content": {"item": {"content": {"tweet": {"id": "0"}}}}}]
+    tweets["0"] = _tweet(0)
+    n = 1
+    for m in range(modules):
+        items = []
+        for _ in range(replies):
+            tweets[str(n)] = _tweet(n)
+            items.append({"entryId": "tweet-{}".format(n), "item": {"content": {"tweet": {"id": str(n)}}}})
+            n += 1
+        items.append({"entryId": "cursor-{}".format(m), "item": {"content": {"timelineCursor": {"value": "LBn" * 20, "cursorType": "ShowMoreThreads"}}}})
+        entries.append({"entryId": "conversationThread-{}".format(m), "content": {"timelineModule": {"items": items, "displayType": "VerticalConversation"}}})
+    entries.append({"entryId": "cursor-bottom", "content": {"operation": {"cursor": {"value": "LBn" * 20, "cursorType": "Bottom"}}}})
+    return {
+        "globalObjects": {"tweets": tweets, "users": {}},
+        "timeline": {"id": "Conversation-0", "instructions": [{"addEntries": {"entries": entries}}]},
+    }
+
+
+def search_payload(results=20):
+    """a search page of `results` tweets
+    """
+    tweets = {str(i): _tweet(i) for i in range(results)}
+    entries = [{"entryId": "sq-I-t-{}".format(i), "content": {"item": {"content": {"tweet": {"id": str(i)}}}}} for i in range(results)]
+    entries.append({"entryId": "sq-cursor-bottom", "content": {"operation": {"cursor": {"value": "scroll:" + "A" * 60, "cursorType": "Bottom"}}}})
+    return {
+        "globalObjects": {"tweets": tweets, "users": {}},
+        "timeline": {"id": "search-6", "instructions": [{"addEntries": {"entries": entries}}]},
+    }
+
+
+def bench(name, body, number):
+    """time the decoding of a response body and the encoding of the decoded object
+    """
+    print("{} ({:.1f} KB)".format(name, len(body) / 1024))
+    # the previous decoding, `json.loads(response.text)`
+    text = timeit.timeit(lambda: json.loads(body.decode("utf-8")), number=number) / number
+    print("  json.loads(text):   {:8.1f} us/call".format(text * 1e6))
+    obj = json.loads(body)
+    for codec_name in json_codec.CODECS:
+        try:
+            codec = json_codec.get_codec(codec_name)
+        except ImportError as e:
+            print("  {}: skipped. {}".format(codec_name, e))
+            continue
+        loads = timeit.timeit(lambda: codec.loads(body), number=number) / number
+        dumps = timeit.timeit(lambda: codec.dumps(obj), number=number) / number
+        print("  {:7s} loads(bytes): {:8.1f} us/call ({:.1f}x)   dumps: {:8.1f} us/call".format(codec_name, loads * 1e6, text / loads, dumps * 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", help="The amount of calls to time. Default is 200.", default=200, type=int)
+    parser.add_argument("-p", "--payload", help="A recorded response body to time. Default is the built payloads.", nargs="*", default=None)
+    args = parser.parse_args()
+
+    if args.payload:
+        for path in args.payload:
+            with open(path, "rb") as f:
+                bench(path, f.read(), args.number)
+        return
+
+    bench("conversation page", json.dumps(conversation_payload()).encode("utf-8"), args.number)
+    bench("search page", json.dumps(search_payload()).encode("utf-8"), args.number)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
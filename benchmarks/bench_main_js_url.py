@@ -0,0 +1,43 @@
+"""Compare the regex scanner of `get_main_js_url` with the BeautifulSoup fallback
+
+Usage:
+    python -m benchmarks.bench_main_js_url [-n NUMBER]
+"""
+import os
+import sys
+import time
+import timeit
+import argparse
+
+from tweet_crawler import tweet_fetcher
+
+
+HOMEPAGE = os.path.join(os.path.dirname(__file__), "../tests/data/homepage.html")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", help="The amount of calls to time. Default is 200.", default=200, type=int)
+    args = parser.parse_args()
+
+    with open(HOMEPAGE, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    scan = timeit.timeit(lambda: tweet_fetcher.get_main_js_url(html), number=args.number) / args.number
+    print("regex scanner: {:8.1f} us/call".format(scan * 1e6))
+
+    try:
+        started = time.perf_counter()
+        import bs4  # noqa: F401
+        import_time = time.perf_counter() - started
+    except ImportError:
+        print("bs4 is not installed. skip the BeautifulSoup benchmark.")
+        return
+
+    soup = timeit.timeit(lambda: tweet_fetcher._get_main_js_url_bs4(html), number=args.number) / args.number
+    print("BeautifulSoup: {:8.1f} us/call (+{:.1f} ms to import bs4)".format(soup * 1e6, import_time * 1e3))
+    print("speedup:       {:8.1f}x".format(soup / scan))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
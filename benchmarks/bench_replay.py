@@ -0,0 +1,116 @@
+"""Time a whole `CrawlerManager` crawl replayed from a cassette
+
+Record a cassette once, then replay it as often as needed, without the
+network:
+
+    python crawler.py "spacex" -mr 100 -thd 4 -rec data/spacex.jsonl.gz
+
+The keyword and the amount of tweets to download are read from the
+recorded requests. The tweets are
+counted instead of saved, so the time is spent in the fetchers, the parsers
+and the threads of the crawler. The access token is not part of the
+recorded requests, so the guest tokens are requested with a placeholder.
+
+Usage:
+    python -m benchmarks.bench_replay CASSETTE [-mr MAX_RESULT] [-thd THREADS] [-rl LATENCY] [-rj JITTER] [-pw WORKERS] [-sp]
+"""
+import sys
+import time
+import argparse
+from urllib.parse import urlsplit, parse_qs
+
+from crawler import CrawlerManager, replay_latency_type
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.cassette import ReplaySession, load_cassette
+from tweet_crawler.storages.framework import Storage
+
+
+SEARCH_PATH = "/2/search/adaptive.json"
+CONVERSATION_PATH = "/2/timeline/conversation/"
+
+
+class CountingStorage(Storage):
+    """count the saved tweets and timelines
+    """
+
+    def __init__(self):
+        self.tweets = 0
+        self.timelines = 0
+
+    def save_tweet(self, parsed_tweet):
+        self.tweets += 1
+        self.timelines += len(parsed_tweet["timelines"])
+
+    def append_timeline(self, tweet_id, timeline):
+        self.timelines += len(timeline)
+
+
+def recorded_crawl(path):
+    """the keywords searched in a cassette, and the amount of conversations downloaded
+    """
+    keywords = []
+    tweets = 0
+    for key in load_cassette(path):
+        parts = urlsplit(key.split(" ")[1])
+        query = parse_qs(parts.query)
+        if parts.path == SEARCH_PATH:
+            for keyword in query.get("q", []):
+                if keyword not in keywords:
+                    keywords.append(keyword)
+        elif parts.path.startswith(CONVERSATION_PATH) and "cursor" not in query:
+            tweets += 1
+    return keywords, tweets
+
+
+def replay(path, keywords, args):
+    session = ReplaySession(path, latency=args.replay_latency, jitter=args.replay_jitter)
+    token_pool = TokenPool(size=1, access_token="replay", session=session)
+    storage = CountingStorage()
+    mgr = CrawlerManager(
+        keywords if len(keywords) > 1 else keywords[0],
+        storage,
+        max_result=args.max_result,
+        max_thread=args.max_thread,
+        sleep_duration=0,
+        progress_interval=0,
+        session=session,
+        token_pool=token_pool,
+        parse_workers=args.parse_workers,
+        streaming=args.stream_parse)
+
+    started = time.perf_counter()
+    mgr.start()
+    mgr.wait()
+    mgr.stop()
+    elapsed = time.perf_counter() - started
+    token_pool.close()
+    return storage, sum(session.replayed().values()), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("cassette", help="A cassette recorded with `crawler.py --record`.")
+    parser.add_argument("-mr", "--max_result", help="The amount of tweets to download. Default is the amount of conversations in the cassette.", default=None, type=int)
+    parser.add_argument("-thd", "--max_thread", help="The amount of worker threads. Default is 4.", default=4, type=int)
+    parser.add_argument("-rl", "--replay_latency", help="The delay in seconds added to every response, or 'recorded'. Default is 0.", default=0, type=replay_latency_type)
+    parser.add_argument("-rj", "--replay_jitter", help="The maximum random delay in seconds added to the latency. Default is 0.", default=0, type=float)
+    parser.add_argument("-pw", "--parse_workers", help="The amount of processes decoding the conversation pages. Default is 0.", default=0, type=int)
+    parser.add_argument("-sp", "--stream_parse", help="Parse the conversation pages with the streaming parser.", action="store_true")
+    args = parser.parse_args()
+
+    keywords, tweets = recorded_crawl(args.cassette)
+    if not keywords:
+        parser.error("{} has no search request".format(args.cassette))
+    if args.max_result is None:
+        args.max_result = tweets
+
+    storage, requests, elapsed = replay(args.cassette, keywords, args)
+
+    print("keywords:  {}".format(", ".join(keywords)))
+    print("requests:  {} in {:.2f}s ({:.1f} requests/s)".format(requests, elapsed, requests / elapsed))
+    print("tweets:    {} ({:.1f} tweets/s)".format(storage.tweets, storage.tweets / elapsed))
+    print("timelines: {}".format(storage.timelines))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,66 +1,176 @@
 import time
 import threading
+import asyncio
+import contextlib
+import os
 import signal
 import sys
+import re
+import hashlib
 import argparse
 
 from tweet_crawler import logger
 from tweet_crawler import tweet_fetcher
-from tweet_crawler.tweet_parser import TwitterSearch
-from tweet_crawler.tweet_parser import Tweet
+from tweet_crawler.http_session import HttpSession
+from tweet_crawler.crawl_context import CrawlContext
+from tweet_crawler.cassette import RecordingSession, ReplaySession
+from tweet_crawler.retry import AsyncRetryPolicy, AuthError
+from tweet_crawler.parse_pool import ParsePool
+from tweet_crawler.search_prefetcher import SearchPrefetcher
+from tweet_crawler.seen_index import open_seen_index
+from tweet_crawler.checkpoint import Checkpoint
+from tweet_crawler.keyword_scheduler import KeywordScheduler, load_keywords, to_keyword_tasks
+from tweet_crawler.distributed import DistributedCrawler, open_work_queue, seed
+from tweet_crawler.token_cache import AccessTokenCache
+from tweet_crawler.async_fetcher import AsyncHttpSession
+from tweet_crawler.async_parser import AsyncTwitterSearch
+from tweet_crawler.async_parser import AsyncTweet
 from tweet_crawler.storages.json_storage import JsonStorage
+from tweet_crawler.storages.jsonl_storage import JsonlStorage
+from tweet_crawler.storages.sqlite_storage import SqliteStorage
+from tweet_crawler.storages.buffered_storage import BufferedStorage
+from tweet_crawler.storages.queue_storage import QueueStorage
+from tweet_crawler.storages.framework import is_storage_factory
 
 class CrawlerManager:
     
-    def __init__(self, keyword, storage, max_result=-1, max_thread=3, sleep_duration=0.5, max_timelines=-1, timeline_length=-1, token_refresh_duration=300):
+    def __init__(self, keyword, storage, max_result=-1, max_thread=3, sleep_duration=0.5, max_timelines=-1, timeline_length=-1, token_refresh_duration=300, session=None, pool_size=None, buffer_size=None, progress_interval=1, token_pool=None, token_pool_size=1, token_cache=None, max_retries=3, module_workers=1, low_watermark=None, prefetch_pages=2, seen_index=None, refresh_seen=False, checkpoint=None, checkpoint_interval=30, resume=False, parse_workers=0, streaming=False):
         """A twitter crawler based on searching result
 
+        Many keywords can share the workers, the tokens and the session. Each
+        keyword is searched by it's own `SearchPrefetcher`, and the workers
+        take the ids by weighted round-robin. see `tweet_crawler.keyword_scheduler`.
 
         Args:
-            keyword: the keyword to search.
-            storage: the storage method. see `tweet_crawler.storages.frameword`. for now, only `json_storage` is implemented.
-            max_result: the maximum result to search. set -1 for infinity.
-            max_thread: the maximum tweet-downloading thread to execute.
-            sleep_duration: the cooldown for each request in a thread.
+            keyword: the keyword to search, or a list of keywords and `keyword_scheduler.KeywordTask`s.
+            storage: the storage method. see `tweet_crawler.storages.framework`. or a callable returning the storage of a keyword, to save each keyword on it's own.
+            max_result: the maximum result to search for each keyword, unless it's `KeywordTask` sets one. set -1 for infinity.
+            max_thread: the amount of tweet-downloading worker threads.
+            sleep_duration: the cooldown for each request in a thread. set "auto" to pace the requests by the rate limit headers instead. see `tweet_crawler.rate_limiter`.
             max_timelines: the maximum timelines (responses) of a tweet to download. set -1 to download the whole timelines.
             timeline_length: the maximum response of a timeline to download. set -1 for infinity. set -1 to download the whole responses.
-            token_refresh_duration: the time duration in seconds to refresh the access tokens.
+            token_refresh_duration: the time duration in seconds a guest token is used before it is replaced.
+            session: the http session shared by every request. see `tweet_crawler.http_session`. a new `HttpSession` is created if None.
+            pool_size: the maximum kept-alive connections per host of the created session. default is `max_thread` * `module_workers` + 1.
+            buffer_size: the high watermark, the amount of searched ids of a keyword waiting for a worker to pause searching. default is max(2 * `max_thread`, 20). it is never smaller than `max_thread`.
+            progress_interval: the time duration in seconds between two progress reports. set 0 to disable.
+            token_pool: the `TokenPool` handing a guest token to each request. a new one is created if None.
+            token_pool_size: the amount of guest tokens of the created token pool.
+            token_cache: a `token_cache.AccessTokenCache` used by the created token pool.
+            max_retries: the maximum amount of retries of a failed request. see `tweet_crawler.retry.RetryPolicy`.
+            module_workers: the maximum amount of timeline modules of a page expanded concurrently in a conversation.
+            low_watermark: the amount of searched ids of a keyword waiting for a worker to resume searching. default is `max_thread`, below `buffer_size`.
+            prefetch_pages: the maximum amount of search pages of a keyword buffered ahead of the workers. see `tweet_crawler.search_prefetcher`.
+            seen_index: a `seen_index.SeenIndex` of the tweets crawled before. a tweet is added once it's download is complete.
+            refresh_seen: download the tweets in `seen_index` again instead of skipping them.
+            checkpoint: a `checkpoint.Checkpoint` to save the state of the crawl to. it is cleared once the crawl is complete.
+            checkpoint_interval: the time duration in seconds between two checkpoints.
+            resume: continue from the state in `checkpoint` instead of searching from the top.
+            parse_workers: the amount of processes decoding the conversation pages. see `tweet_crawler.parse_pool`. set 0 to decode them in the worker threads.
+            streaming: parse the conversation pages with a streaming parser, to bound the memory of a conversation. see `tweet_crawler.stream_parser`.
         """
         self.keyword = keyword
+        self.tasks = to_keyword_tasks(keyword)
         self.storage = storage
+        if is_storage_factory(storage):
+            self.storages = {task.keyword: storage(task.keyword) for task in self.tasks}
+        else:
+            self.storages = {task.keyword: storage for task in self.tasks}
         self.max_result = max_result
         self.max_thread = max_thread
-        self.sleep_duration = sleep_duration
         self.max_timelines = max_timelines
         self.timeline_length = timeline_length
         self.token_refresh_duration = token_refresh_duration
+        self.progress_interval = progress_interval
+        self.module_workers = module_workers
+        self.streaming = streaming
+
+        self.context = CrawlContext(
+            max_thread=max_thread,
+            sleep_duration=sleep_duration,
+            max_timelines=max_timelines,
+            timeline_length=timeline_length,
+            token_refresh_duration=token_refresh_duration,
+            session=session,
+            pool_size=pool_size,
+            token_pool=token_pool,
+            token_pool_size=token_pool_size,
+            token_cache=token_cache,
+            max_retries=max_retries,
+            module_workers=module_workers,
+            parse_workers=parse_workers,
+            streaming=streaming)
+        self.session = self.context.session
+        self.token_pool = self.context.token_pool
+        self.rate_limiter = self.context.rate_limiter
+        self.retry_policy = self.context.retry_policy
+        self.parse_pool = self.context.parse_pool
+        self.sleep_duration = self.context.sleep_duration
+
+        self.scheduler = None
+
+        if buffer_size is None:
+            buffer_size = max(2 * max_thread, 20)
+        self.high_watermark = max(buffer_size, max_thread)
+        self.low_watermark = low_watermark if low_watermark is not None else max_thread
+        self.prefetch_pages = prefetch_pages
+        self.seen_index = seen_index
+        self.refresh_seen = refresh_seen
+
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.__resume_state = None
+        if resume and checkpoint is not None:
+            self.__resume_state = checkpoint.load()
+            saved = self.__resume_state["keywords"] if self.__resume_state is not None else {}
+            if self.__resume_state is not None and not any(task.keyword in saved for task in self.tasks):
+                raise ValueError("The checkpoint '{}' is a crawl of {}, not {}.".format(
+                    checkpoint.path,
+                    ", ".join("'{}'".format(k) for k in saved),
+                    ", ".join("'{}'".format(task.keyword) for task in self.tasks)))
+        # the timelines a conversation has saved, keyed by keyword and tweet id
+        self.__progress = {}
+        # a write to the storage and the progress it makes change together
+        self.__state_lock = threading.Lock() if checkpoint is not None else contextlib.nullcontext()
+
+        self.__stop_event = threading.Event()
+        self.__finished = threading.Event()
+        self.__stopped = False
+        self.__lock = threading.Lock()
+        self.__active_workers = 0
+        self.__alive_workers = 0
+        self.__workers = []
+        self.__thread_progress = None
+        self.__thread_checkpoint = None
+
+
+    @property
+    def run(self):
+        """True until every worker has exited
+        """
+        return not self.__finished.is_set()
 
-        self.tokens = None
-        self.last_token_refresh = None
-        self.search = None
-
-        self.run = True
 
-        self.fetched_ids = 0
-        self.id_buffer = []
-        self.__running_threads = {}
-        self.__thread_fetch_ids = None
-        self.__thread_thread_manager = None
+    @property
+    def fetched_ids(self):
+        """the amount of searched ids
+        """
+        return self.scheduler.fetched_ids if self.scheduler is not None else 0
 
 
     def refresh_token(self, force=False):
-        """refresh access tokens
+        """replace the expired guest tokens of `self.token_pool`
+
+        The token pool also refreshes itself in the background.
 
         Args:
-            force: ignore `self.token_refresh_duration` to force update the tokens.
+            force: replace every guest token.
         
         Returns: None
         """
-        if force or self.last_token_refresh is None or time.time() - self.last_token_refresh >= self.token_refresh_duration:
-            logger.info("Start refresh tokens")
-            self.tokens = tweet_fetcher.get_tokens()
-            logger.info("Tokens refreshed")
-            self.last_token_refresh = time.time()
+        logger.info("Start refresh tokens")
+        self.token_pool.refresh(force=force)
+        logger.info("Tokens refreshed")
 
 
     def start(self):
@@ -71,166 +181,756 @@ class CrawlerManager:
 
         Returns: None
         """
-        logger.info("Start searching for '{}'".format(self.keyword))
-        self.refresh_token()
-        self.search = TwitterSearch(self.keyword, self.tokens["access_token"], self.tokens["csrf_token"], self.tokens["guest_token"])
+        self.context.start()
+        self.scheduler = KeywordScheduler()
+        for task in self.tasks:
+            logger.info("Start searching for '{}'".format(task.keyword))
+            search = self.context.new_search(task.keyword)
+            prefetcher = SearchPrefetcher(
+                search,
+                max_result=task.max_result if task.max_result is not None else self.max_result,
+                prefetch_pages=self.prefetch_pages,
+                high_watermark=self.high_watermark,
+                low_watermark=self.low_watermark,
+                sleep_duration=self.sleep_duration,
+                skip=self.seen_index.__contains__ if self.seen_index is not None and not self.refresh_seen else None,
+                condition=self.scheduler.condition)
+
+            state = self.__resume_state["keywords"].get(task.keyword) if self.__resume_state is not None else None
+            if state is not None:
+                prefetcher.restore(state["cursor"], state["pending"], state["fetched_ids"])
+                for tweet_id, progress in state["tweets"].items():
+                    self.__progress[(task.keyword, tweet_id)] = dict(progress)
+                logger.info("Resume '{}' with {} pending tweets, {} of them downloaded halfway.".format(task.keyword, len(state["pending"]), len(state["tweets"])))
+            self.scheduler.add(task.keyword, prefetcher, task.weight)
+
+        self.__alive_workers = self.max_thread
+        for _ in range(self.max_thread):
+            thd = threading.Thread(target=self.__worker, args=(), daemon=True)
+            self.__workers.append(thd)
+            thd.start()
+
+        self.scheduler.start()
+
+        if self.progress_interval > 0:
+            self.__thread_progress = threading.Thread(target=self.__report_progress, args=(), daemon=True)
+            self.__thread_progress.start()
+
+        if self.checkpoint is not None and self.checkpoint_interval > 0:
+            self.__thread_checkpoint = threading.Thread(target=self.__save_checkpoints, args=(), daemon=True)
+            self.__thread_checkpoint.start()
+
+
+    def wait(self, timeout=None):
+        """block until every task has been completed or the crawler is stopped
 
-        self.__fetch_ids()
-        self.__thread_fetch_ids = threading.Thread(target=self.__search_ids, args=())
-        self.__thread_fetch_ids.start()
 
-        self.__thread_thread_manager = threading.Thread(target=self.__thread_manager, args=())
-        self.__thread_thread_manager.start()
+        Args:
+            timeout: the maximum time in seconds to wait. None to wait forever.
+
+        Returns: True if the crawler has finished.
+        """
+        return self.__finished.wait(timeout)
 
 
     def stop(self):
-        """stop the crawler
+        """stop the crawler and close the storages
 
 
         Args: None
 
         Returns: None
         """
+        with self.__lock:
+            if self.__stopped:
+                return
+            self.__stopped = True
+        complete = self.__finished.is_set()
+
         logger.info("Stopping...")
-        self.run = False
-        self.__thread_fetch_ids.join()
-        self.__thread_thread_manager.join()
+        self.__stop_event.set()
+        # wakes the requests waiting for a token before joining the threads
+        self.context.interrupt()
+        if self.scheduler is not None:
+            self.scheduler.close()
+        if not complete:
+            # wakes the writes waiting for a consumer. see `tweet_crawler.storages.queue_storage`
+            for storage in self.__distinct_storages():
+                if hasattr(storage, "interrupt"):
+                    storage.interrupt()
+        for thd in self.__workers:
+            thd.join()
+        if self.__thread_progress is not None:
+            self.__thread_progress.join()
+        if self.__thread_checkpoint is not None:
+            self.__thread_checkpoint.join()
+        if self.checkpoint is not None and self.scheduler is not None:
+            if complete:
+                self.checkpoint.clear()
+            else:
+                try:
+                    self.save_checkpoint()
+                except Exception:
+                    # e.g. a write lost by the storage, the checkpoint before stays
+                    logger.error("Failed to save the checkpoint.", exc_info=True)
+
+        self.context.close()
+        for storage in self.__distinct_storages():
+            storage.close()
+
+
+    def __distinct_storages(self):
+        """the storages of the keywords, each once
+        """
+        storages = []
+        for storage in self.storages.values():
+            if not any(storage is s for s in storages):
+                storages.append(storage)
+        return storages
 
-        for th in self.__running_threads:
-            th.join()
 
+    def __worker(self):
+        """consume ids of `self.scheduler` until every search is exhausted or the crawler is stopped
 
-    def __thread_manager(self):
-        """automatically create new threads to download a tweet
 
+        Args: None
+
+        Returns: None
+        """
+        try:
+            while True:
+                item = self.scheduler.get()
+                if item is None or self.__stop_event.is_set():
+                    break
+                keyword, tweet_id = item
+
+                with self.__lock:
+                    self.__active_workers += 1
+                done = True
+                try:
+                    done = self.__download_twitter(keyword, tweet_id)
+                    if done and self.seen_index is not None:
+                        self.seen_index.add(tweet_id)
+                except Exception:
+                    if self.__stop_event.is_set():
+                        # the request was cut by `stop()`
+                        done = False
+                    else:
+                        logger.error("Failed to download tweet {}.".format(tweet_id), exc_info=True)
+                finally:
+                    # an interrupted tweet stays pending for the checkpoint
+                    if done:
+                        with self.__state_lock:
+                            self.scheduler.task_done(keyword, tweet_id)
+                            self.__progress.pop((keyword, tweet_id), None)
+                    with self.__lock:
+                        self.__active_workers -= 1
+        finally:
+            with self.__lock:
+                self.__alive_workers -= 1
+                last = self.__alive_workers == 0
+            if last:
+                logger.info("All tasks have been completed. Exit.")
+                self.__stop_event.set()
+                self.__finished.set()
+
+
+    def __report_progress(self):
+        """print the amount of busy workers and buffered ids every `self.progress_interval` seconds
 
-        This method will consume IDs in the `self.id_buffer`.
-        After a ID is consumed, a new thread will created to download
-        a tweet based on the ID.
 
         Args: None
 
         Returns: None
         """
-        while self.run:
-            if len(self.__running_threads) < self.max_thread and len(self.id_buffer) > 0:
-                tweet_id = self.id_buffer.pop(0)
-                thd = threading.Thread(target=self.__download_twitter, args=(tweet_id,))
-                self.__running_threads[tweet_id] = thd
-                self.__running_threads[tweet_id].start()
-            
-            print("Running threads: {}, Buffer ids: {}".format(len(self.__running_threads), len(self.id_buffer)), end="\r")
+        while not self.__stop_event.wait(self.progress_interval):
+            print("Running threads: {}, Buffer ids: {}".format(self.__active_workers, self.scheduler.qsize()), end="\r")
 
-            if self.max_result != -1 and self.fetched_ids >= self.max_result and len(self.__running_threads) == 0 and len(self.id_buffer) == 0:
-                logger.info("All tasks have been completed. Exit.")
-                self.run = False
-                break
 
+    def __save_checkpoints(self):
+        """save a checkpoint every `self.checkpoint_interval` seconds
 
-    def __search_ids(self):
-        """searching tweets and get tweet id by keyword
 
         Args: None
 
         Returns: None
         """
-        while self.run:
-            if self.max_result != -1 and self.fetched_ids >= self.max_result:
-                logger.info("Reached max_result. Stop searching.")
-                break
+        while not self.__stop_event.wait(self.checkpoint_interval):
+            try:
+                self.save_checkpoint()
+            except Exception:
+                logger.error("Failed to save the checkpoint.", exc_info=True)
 
-            self.__fetch_ids()
 
-            time.sleep(self.sleep_duration)
-        
-
-    def __fetch_ids(self):
-        """search and append the result tweet id to `self.id_buffer`
+    def save_checkpoint(self):
+        """save the search cursors, the pending ids and the progress of the conversations to `self.checkpoint`
 
+        The storage is flushed before the checkpoint is written, so a resumed
+        crawl never skips a write the checkpoint counts as done.
 
         Args: None
 
         Returns: None
         """
-        self.refresh_token()
-        if len(self.id_buffer) <= self.max_thread:
-            ids = self.search.get_next_ids()
-            
-            if self.max_result != -1 and len(ids) + self.fetched_ids > self.max_result:
-                ids = ids[:(self.max_result - self.fetched_ids)]
-            
-            self.id_buffer += ids
-            self.fetched_ids += len(ids)
-            logger.info("Fetch {} search results.".format(len(ids)))
+        with self.__state_lock:
+            keywords = self.scheduler.snapshot()
+            for keyword, state in keywords.items():
+                state["tweets"] = {tweet_id: dict(self.__progress[(keyword, tweet_id)]) for tweet_id in state["pending"] if (keyword, tweet_id) in self.__progress}
+        for storage in self.__distinct_storages():
+            storage.flush()
+        self.checkpoint.save({"keywords": keywords})
+        logger.debug("Checkpoint saved with {} pending tweets.".format(sum(len(state["pending"]) for state in keywords.values())))
 
 
-    def __download_twitter(self, tweet_id):
+    def __download_twitter(self, keyword, tweet_id):
         """download a single tweet and it's timelines (responses) by tweet id
 
 
-        the downloaded data will be stored by following `self.storage`
+        the downloaded data will be stored by following the storage of the keyword
 
         Args:
+            keyword: the keyword the tweet is searched by
             tweet_id: the tweet_id of a tweet to download
 
+        Returns: True if the whole tweet is downloaded, False if the crawler is stopped in between
+        """
+        def on_saved(cursor, timelines):
+            self.__progress[(keyword, tweet_id)] = {"cursor": cursor, "timelines": timelines}
+
+        return self.context.download(
+            tweet_id,
+            self.storages[keyword],
+            self.__stop_event,
+            progress=self.__progress.get((keyword, tweet_id)),
+            on_saved=on_saved,
+            lock=self.__state_lock)
+
+
+class AsyncCrawlerManager:
+
+    # the amount of search pages failing in a row, after their retries, to stop searching
+    max_search_failures = 5
+
+    def __init__(self, keyword, storage, max_result=-1, max_thread=100, sleep_duration=0.5, max_timelines=-1, timeline_length=-1, token_refresh_duration=300, session=None, pool_size=None, token_cache=None, module_workers=1, seen_index=None, refresh_seen=False, parse_workers=0, streaming=False, max_retries=3):
+        """A twitter crawler running every conversation on a single asyncio event loop
+
+
+        Args:
+            keyword: the keyword to search.
+            storage: the storage method. see `tweet_crawler.storages.framework`.
+            max_result: the maximum result to search. set -1 for infinity.
+            max_thread: the maximum amount of conversations downloading concurrently.
+            sleep_duration: the cooldown for each request in a conversation.
+            max_timelines: the maximum timelines (responses) of a tweet to download. set -1 to download the whole timelines.
+            timeline_length: the maximum response of a timeline to download. set -1 to download the whole responses.
+            token_refresh_duration: the time duration in seconds to refresh the access tokens.
+            session: an `AsyncHttpSession`. a new one is created if None.
+            pool_size: the maximum amount of connections of the created session. default is `max_thread` * `module_workers` + 1.
+            token_cache: a `token_cache.AccessTokenCache` to reuse the access token scraped before.
+            module_workers: the maximum amount of timeline modules of a page expanded concurrently in a conversation.
+            seen_index: a `seen_index.SeenIndex` of the tweets crawled before. a tweet is added once it's download is complete.
+            refresh_seen: download the tweets in `seen_index` again instead of skipping them.
+            parse_workers: the amount of processes decoding the conversation pages off the event loop. see `tweet_crawler.parse_pool`. set 0 to decode them on the loop.
+            streaming: parse the conversation pages with a streaming parser, to bound the memory of a conversation. see `tweet_crawler.stream_parser`.
+            max_retries: the maximum amount of retries of a failed request. see `tweet_crawler.retry.AsyncRetryPolicy`.
+        """
+        self.keyword = keyword
+        self.storage = storage
+        self.max_result = max_result
+        self.max_thread = max_thread
+        self.sleep_duration = sleep_duration
+        self.max_timelines = max_timelines
+        self.timeline_length = timeline_length
+        self.token_refresh_duration = token_refresh_duration
+        self.module_workers = module_workers
+        self.seen_index = seen_index
+        self.refresh_seen = refresh_seen
+        self.parse_pool = ParsePool(parse_workers) if parse_workers > 0 else None
+        self.streaming = streaming
+        self.retry_policy = AsyncRetryPolicy(max_retries=max_retries)
+
+        self.__own_session = session is None
+        if session is None:
+            session = AsyncHttpSession(pool_size=pool_size if pool_size is not None else max_thread * module_workers + 1)
+        self.session = session
+        self.__token_session = HttpSession(pool_size=1)
+        self.token_cache = token_cache
+
+        self.tokens = None
+        self.last_token_refresh = None
+        self.search = None
+        self.__token_lock = None
+
+        self.run = True
+
+        self.fetched_ids = 0
+        self.__tasks = set()
+
+
+    async def refresh_token(self, force=False):
+        """refresh access tokens. the blocking token requests run in the default executor.
+
+        Args:
+            force: ignore `self.token_refresh_duration` to force update the tokens.
+
         Returns: None
         """
-        logger.info("Start download tweet {}.".format(tweet_id))
-        tweet = Tweet(
-            tweet_id=tweet_id,
-            access_token=self.tokens["access_token"],
-            csrf_token=self.tokens["csrf_token"],
-            guest_token=self.tokens["guest_token"])
-
-        main_tweet = tweet.get_main_tweet(self.timeline_length)
-        self.storage.save_tweet(main_tweet)
-        timeline_ctn = len(main_tweet["timelines"])
-
-        while self.run:
-            if (tweet.get_next_cursor() is None) or (self.max_timelines != -1 and timeline_ctn >= self.max_timelines):
+        if force or self.last_token_refresh is None or time.time() - self.last_token_refresh >= self.token_refresh_duration:
+            logger.info("Start refresh tokens")
+            loop = asyncio.get_event_loop()
+            self.tokens = await loop.run_in_executor(None, lambda: tweet_fetcher.get_tokens(session=self.__token_session, token_cache=self.token_cache))
+            logger.info("Tokens refreshed")
+            self.last_token_refresh = time.time()
+
+
+    async def __replace_tokens(self, tokens):
+        """refresh the tokens rejected by twitter, unless another task refreshed them already
+
+
+        Args:
+            tokens: the rejected tokens
+
+        Returns: False if the tokens failed to refresh
+        """
+        async with self.__token_lock:
+            if self.tokens is not tokens:
+                return True
+            try:
+                await self.refresh_token(force=True)
+            except Exception:
+                logger.error("Failed to refresh tokens.", exc_info=True)
+                return False
+            return True
+
+
+    def start(self):
+        """run the crawler until all tasks are completed or `stop()` is called, then close `self.storage`
+
+
+        Args: None
+
+        Returns: None
+        """
+        asyncio.run(self.crawl())
+
+
+    def stop(self):
+        """stop the crawler. the running conversations finish their current page and exit.
+
+
+        Args: None
+
+        Returns: None
+        """
+        logger.info("Stopping...")
+        self.run = False
+
+
+    async def crawl(self):
+        """search the keyword and download every result concurrently
+
+
+        Args: None
+
+        Returns: None
+        """
+        logger.info("Start searching for '{}'".format(self.keyword))
+        semaphore = asyncio.Semaphore(self.max_thread)
+        self.__token_lock = asyncio.Lock()
+        try:
+            await self.refresh_token()
+            self.search = AsyncTwitterSearch(self.keyword, self.tokens["access_token"], self.tokens["csrf_token"], self.tokens["guest_token"], session=self.session, retry_policy=self.retry_policy)
+
+            failures = 0
+            while self.run:
+                if self.max_result != -1 and self.fetched_ids >= self.max_result:
+                    logger.info("Reached max_result. Stop searching.")
+                    break
+
+                try:
+                    ids = await self.__fetch_ids()
+                except Exception as e:
+                    # the running conversations go on, the same page is searched again
+                    failures += 1
+                    logger.error("Failed to search '{}' ({} in a row).".format(self.keyword, failures), exc_info=True)
+                    if failures >= self.max_search_failures:
+                        logger.error("Stop searching after {} failed search pages.".format(failures))
+                        break
+                    if isinstance(e, AuthError):
+                        self.last_token_refresh = None
+                    await asyncio.sleep(max(self.sleep_duration, 1))
+                    continue
+                failures = 0
+
+                if len(ids) == 0:
+                    logger.info("No more search results. Stop searching.")
+                    break
+
+                for tweet_id in ids:
+                    await semaphore.acquire()
+                    if not self.run:
+                        semaphore.release()
+                        break
+                    task = asyncio.ensure_future(self.__download_twitter(tweet_id))
+                    self.__tasks.add(task)
+                    task.add_done_callback(self.__tasks.discard)
+                    task.add_done_callback(lambda _: semaphore.release())
+
+                await asyncio.sleep(self.sleep_duration)
+
+            if len(self.__tasks) > 0:
+                await asyncio.gather(*self.__tasks)
+            logger.info("All tasks have been completed. Exit.")
+        finally:
+            self.run = False
+            self.retry_policy.close()
+            if self.__own_session:
+                await self.session.close()
+            self.__token_session.close()
+            if self.parse_pool is not None:
+                self.parse_pool.close()
+            await asyncio.get_event_loop().run_in_executor(None, self.storage.close)
+
+
+    async def __fetch_ids(self):
+        """search the next page and return the tweet ids within `max_result`
+
+
+        Args: None
+
+        Returns: a list of tweet id
+        """
+        await self.refresh_token()
+        self.search.access_token = self.tokens["access_token"]
+        self.search.csrf_token = self.tokens["csrf_token"]
+        self.search.guest_token = self.tokens["guest_token"]
+
+        ids = await self.search.get_next_ids()
+        while self.seen_index is not None and not self.refresh_seen and len(ids) > 0:
+            kept = [tweet_id for tweet_id in ids if tweet_id not in self.seen_index]
+            if len(kept) > 0 or not self.run:
+                ids = kept
                 break
+            # every id was crawled before, an empty list would end the search
+            logger.info("Skip {} seen search results.".format(len(ids)))
+            ids = await self.search.get_next_ids()
+        if self.max_result != -1 and len(ids) + self.fetched_ids > self.max_result:
+            ids = ids[:(self.max_result - self.fetched_ids)]
 
-            timelines = tweet.get_next_timelines()
-            if self.max_timelines != -1 and timeline_ctn + len(timelines) > self.max_timelines:
-                timelines = timelines[:(self.max_timelines - timeline_ctn)]
-            
-            timeline_ctn += len(timelines)
-            self.storage.append_timeline(tweet_id, timelines)
+        self.fetched_ids += len(ids)
+        logger.info("Fetch {} search results.".format(len(ids)))
+        return ids
 
-            time.sleep(self.sleep_duration)
-        
+
+    async def __download_twitter(self, tweet_id):
+        """download a single tweet and it's timelines (responses) by tweet id
+
+
+        Args:
+            tweet_id: the tweet_id of a tweet to download
+
+        Returns: True if the whole tweet is downloaded
+        """
+        logger.info("Start download tweet {}.".format(tweet_id))
+        loop = asyncio.get_event_loop()
+        started = False
+        renewed = False
+        while True:
+            tokens = self.tokens
+            try:
+                tweet = AsyncTweet(
+                    tweet_id=tweet_id,
+                    access_token=tokens["access_token"],
+                    csrf_token=tokens["csrf_token"],
+                    guest_token=tokens["guest_token"],
+                    session=self.session,
+                    retry_policy=self.retry_policy,
+                    module_workers=self.module_workers,
+                    parse_pool=self.parse_pool,
+                    streaming=self.streaming)
+
+                pages = tweet.iter_timelines(max_timelines=self.max_timelines, timeline_length=self.timeline_length)
+                async for timelines in pages:
+                    if started:
+                        await loop.run_in_executor(None, self.storage.append_records, tweet_id, timelines)
+                    else:
+                        await loop.run_in_executor(None, self.storage.save_record, tweet.record)
+                        started = True
+
+                    if not self.run:
+                        break
+                    if tweet.get_next_cursor() is not None:
+                        await asyncio.sleep(self.sleep_duration)
+                await pages.aclose()
+                break
+            except AuthError:
+                # a tweet is downloaded again once, before any of it is saved. otherwise it is left out of the seen index.
+                if not await self.__replace_tokens(tokens) or started or renewed:
+                    logger.error("Failed to download tweet {}.".format(tweet_id), exc_info=True)
+                    return False
+                renewed = True
+                logger.info("Tokens of tweet {} rejected. Download it again with new tokens.".format(tweet_id))
+            except Exception:
+                logger.error("Failed to download tweet {}.".format(tweet_id), exc_info=True)
+                return False
+
+        if not self.run:
+            logger.info("Tweet {} interrupted.".format(tweet_id))
+            return False
+        if self.seen_index is not None:
+            await loop.run_in_executor(None, self.seen_index.add, tweet_id)
         logger.info("Tweet {} finished.".format(tweet_id))
-        del self.__running_threads[tweet_id]
-            
+        return True
+
+
+def _start_crawl(keyword, queue_size, kwargs):
+    """start a `CrawlerManager` writing into a `QueueStorage`, stopped once it has finished
+    """
+    storage = QueueStorage(queue_size)
+    manager = CrawlerManager(keyword, storage, **kwargs)
+    manager.start()
+    # closes the storage, which ends the records once they are consumed
+    closer = threading.Thread(target=lambda: manager.wait() and manager.stop(), args=(), daemon=True)
+    closer.start()
+    return manager, storage, closer
+
+
+def crawl(keyword, queue_size=100, **kwargs):
+    """search the keyword and iterate the records as they are downloaded
+
+    The crawl runs in the worker threads of a `CrawlerManager` and hands the
+    records over through a `QueueStorage`. The workers block while
+    `queue_size` records are waiting, and the searches pause once the
+    searched ids reach the high watermark, so the crawl never runs ahead of
+    the consumer by more than the queue and the search buffer. Leaving the
+    loop early stops the crawler.
+
+    Args:
+        keyword: the keyword to search, or a list of keywords. see `CrawlerManager`.
+        queue_size: the amount of records downloaded ahead of the consumer.
+        kwargs: the other arguments of `CrawlerManager`, e.g. `max_result` and `max_thread`.
+
+    Returns:
+        a generator of `tweet_crawler.records.ConversationRecord`. a later page of a tweet is a record of the same `tweet_id` with `text` None and only the timelines of that page.
+    """
+    manager, storage, closer = _start_crawl(keyword, queue_size, kwargs)
+    try:
+        while True:
+            record = storage.get()
+            if record is None:
+                break
+            yield record
+    finally:
+        manager.stop()
+        closer.join()
+
+
+async def crawl_async(keyword, queue_size=100, **kwargs):
+    """the async iterator of `crawl`
+
+    The crawl runs in the worker threads of a `CrawlerManager` as in `crawl`,
+    and the records are awaited from an executor, so the event loop is never
+    blocked by a full or empty queue.
+
+    Args: see `crawl`
+
+    Returns:
+        an async generator of `tweet_crawler.records.ConversationRecord`
+    """
+    loop = asyncio.get_running_loop()
+    manager, storage, closer = await loop.run_in_executor(None, _start_crawl, keyword, queue_size, kwargs)
+    try:
+        while True:
+            record = await loop.run_in_executor(None, storage.get)
+            if record is None:
+                break
+            yield record
+    finally:
+        await loop.run_in_executor(None, manager.stop)
+        await loop.run_in_executor(None, closer.join)
+
+
+def sleep_duration_type(value):
+    """parse `--sleep_duration`, a number of seconds or "auto"
+    """
+    if value == "auto":
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected a number of seconds or 'auto', got '{}'".format(value))
+
+
+def replay_latency_type(value):
+    """parse `--replay_latency`, a number of seconds or "recorded"
+    """
+    if value == "recorded":
+        return value
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected a number of seconds or 'recorded', got '{}'".format(value))
+
+
+def keyword_folder(keyword):
+    """the sub-folder saving the tweets of a keyword, a file name safe form of it
+    """
+    name = re.sub(r"[^\w\-]+", "_", keyword).strip("_")
+    if name != keyword:
+        # two keywords may share the same safe form
+        name = "{}-{}".format(name, hashlib.sha1(keyword.encode("utf-8")).hexdigest()[:8])
+    return name
+
+
+def create_storage(storage_format, folder):
+    """create the storage of `--storage` saving into a folder
+    """
+    if storage_format == "jsonl":
+        return JsonlStorage(folder)
+    elif storage_format == "sqlite":
+        return SqliteStorage(os.path.join(folder, "tweets.sqlite3"))
+    elif storage_format == "parquet":
+        from tweet_crawler.storages.parquet_storage import ParquetStorage
+        return ParquetStorage(folder)
+    return JsonStorage(folder)
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument("keyword", help="The keyword to search")
+    parser.add_argument("keyword", help="The keyword to search", nargs="?", default=None)
+    parser.add_argument("-kf", "--keyword_file", help="A file of keywords to search with the same workers, one per line, optionally followed by a tab and it's weight, and a tab and it's max_result (thread engine only). The tweets of each keyword are saved in their own sub-folder of FOLDER.", default=None, type=str)
     parser.add_argument("-f", "--folder", help="The folder to save the tweets. The default folder is './data'", default="./data", type=str)
+    parser.add_argument("-s", "--storage", help="The storage format. 'json' saves a file per tweet, 'jsonl' appends records to rolling segment files, 'sqlite' saves into FOLDER/tweets.sqlite3, 'parquet' writes flat reply rows to Parquet files (requires pyarrow). Default is 'json'.", default="json", choices=["json", "jsonl", "sqlite", "parquet"], type=str)
     parser.add_argument("-mr", "--max_result", help="The maximum amount of tweets to download. Default is 10. Set -1 for unlimiting.", default=10, type=int)
     parser.add_argument("-thd", "--max_thread", help="The maximum amount of threads to run. Default is 1.", default=1, type=int)
-    parser.add_argument("-sd", "--sleep_duration", help="The time between each request for each thread.", default=1, type=int)
+    parser.add_argument("-sd", "--sleep_duration", help="The time between each request for each thread. Set 'auto' to pace the requests by the rate limit headers of twitter (thread engine only). Default is 1.", default=1, type=sleep_duration_type)
     parser.add_argument("-mt", "--max_timelines", help="The maximum amount of timelines (responses) to download for each tweet. Set -1 for unlimiting. Default is -1.", default=-1, type=int)
     parser.add_argument("-tl", "--timeline_length", help="The maximum length of a timeline to download. Set -1 for unlimiting. Default is -1.", default=-1, type=int)
     parser.add_argument("-trd", "--token_refresh_duration", help="The time duration in seconds to refresh the access tokens. Default is 300 seconds.", default=300, type=int)
+    parser.add_argument("-ps", "--pool_size", help="The maximum amount of kept-alive connections per host. Default is max_thread * module_workers + 1.", default=None, type=int)
+    parser.add_argument("-tps", "--token_pool_size", help="The amount of guest tokens shared by the threads. Default is 1.", default=1, type=int)
+    parser.add_argument("-tc", "--token_cache", help="The file to cache the access token scraped from main.*.js. Set an empty string to disable. Default is './.cache/access_token.json'.", default="./.cache/access_token.json", type=str)
+    parser.add_argument("-tct", "--token_cache_ttl", help="The time duration in seconds to trust the cached access token without revalidation. Default is 86400 seconds.", default=86400, type=int)
+    parser.add_argument("-hw", "--high_watermark", help="The amount of searched ids waiting for a worker to pause searching (thread engine only). Default is max(2 * max_thread, 20).", default=None, type=int)
+    parser.add_argument("-lw", "--low_watermark", help="The amount of searched ids waiting for a worker to resume searching (thread engine only). Default is max_thread.", default=None, type=int)
+    parser.add_argument("-pp", "--prefetch_pages", help="The maximum amount of search pages buffered ahead of the workers (thread engine only). Default is 2.", default=2, type=int)
+    parser.add_argument("-mw", "--module_workers", help="The maximum amount of reply threads of a page expanded concurrently in a conversation. Default is 1.", default=1, type=int)
+    parser.add_argument("-pw", "--parse_workers", help="The amount of processes decoding the conversation pages, off the threads of the crawler. Set 0 to decode them in the crawler. Default is 0.", default=0, type=int)
+    parser.add_argument("-sp", "--stream_parse", help="Parse the conversation pages with a streaming json parser, keeping only the texts and the cursors of a page in memory. Requires ijson to stream, otherwise each page is decoded whole and dropped right after.", action="store_true")
+    parser.add_argument("-rt", "--max_retries", help="The maximum amount of retries of a failed request. Default is 3.", default=3, type=int)
+    parser.add_argument("-wb", "--write_behind", help="Queue the writes in memory and apply them to the storage from a background thread.", action="store_true")
+    parser.add_argument("-sn", "--seen", help="What to do with the tweets downloaded by a previous run. 'skip' leaves them out of the search results, 'refresh' downloads them again, 'off' disables the seen index. Default is 'skip'.", default="skip", choices=["skip", "refresh", "off"], type=str)
+    parser.add_argument("-si", "--seen_index", help="The folder of the seen index. It is built from the storage on the first run. Default is 'FOLDER/.seen_index'.", default=None, type=str)
+    parser.add_argument("-cp", "--checkpoint", help="The file to save the state of the crawl to, so it can be resumed (thread engine only). Set an empty string to disable. Default is 'FOLDER/.checkpoint/state.json'.", default=None, type=str)
+    parser.add_argument("-cpi", "--checkpoint_interval", help="The time duration in seconds between two checkpoints. Default is 30 seconds.", default=30, type=float)
+    parser.add_argument("-r", "--resume", help="Continue the crawl saved in the checkpoint instead of searching from the top.", action="store_true")
+    parser.add_argument("-q", "--queue", help="Share the work with the other processes using the same work queue, 'sqlite:///PATH' for the processes of one host or 'redis://HOST:PORT/DB' for many hosts (requires redis, thread engine only). The keywords are added to the queue, and the process exits once the queue is drained. The queue replaces the seen index and the checkpoint.", default=None, type=str)
+    parser.add_argument("-ld", "--lease_duration", help="The time duration in seconds a task of the work queue is held without a report, before another process takes it over. Default is 120 seconds.", default=120, type=float)
+    parser.add_argument("-rec", "--record", help="Record every request and it's response to a cassette file, gzip compressed if it ends with '.gz' (thread engine only).", default=None, type=str)
+    parser.add_argument("-rep", "--replay", help="Answer the requests from a cassette recorded with --record instead of the network (thread engine only).", default=None, type=str)
+    parser.add_argument("-rl", "--replay_latency", help="The delay in seconds added to every replayed response. Set 'recorded' to wait as long as the recorded request took. Default is 0.", default=0, type=replay_latency_type)
+    parser.add_argument("-rj", "--replay_jitter", help="The maximum random delay in seconds added to --replay_latency. It is the same for every run. Default is 0.", default=0, type=float)
+    parser.add_argument("-e", "--engine", help="The crawl engine. 'thread' runs max_thread worker threads, 'asyncio' runs up to max_thread conversations on one event loop. Default is 'thread'.", default="thread", choices=["thread", "asyncio"], type=str)
     args = parser.parse_args()
-
-    mgr = CrawlerManager(
-        keyword=args.keyword,
-        storage=JsonStorage(args.folder),
+    if args.sleep_duration == "auto" and args.engine != "thread":
+        parser.error("--sleep_duration auto requires the thread engine")
+    if args.resume and args.engine != "thread":
+        parser.error("--resume requires the thread engine")
+    if (args.keyword is None) == (args.keyword_file is None):
+        parser.error("give either a keyword or --keyword_file")
+    if args.keyword_file is not None and args.engine != "thread":
+        parser.error("--keyword_file requires the thread engine")
+    if args.queue is not None and args.engine != "thread":
+        parser.error("--queue requires the thread engine")
+    if args.record is not None and args.replay is not None:
+        parser.error("give either --record or --replay")
+    if (args.record is not None or args.replay is not None) and args.engine != "thread":
+        parser.error("--record and --replay require the thread engine")
+
+    if args.keyword_file is not None:
+        keyword = load_keywords(args.keyword_file)
+        storages = {task.keyword: create_storage(args.storage, os.path.join(args.folder, keyword_folder(task.keyword))) for task in keyword}
+    else:
+        keyword = args.keyword
+        storages = {keyword: create_storage(args.storage, args.folder)}
+    seen_index = None
+    if args.seen != "off" and args.queue is None:
+        seen_index = open_seen_index(args.seen_index or os.path.join(args.folder, ".seen_index"), list(storages.values()))
+    if args.write_behind:
+        storages = {k: BufferedStorage(storage) for k, storage in storages.items()}
+
+    options = dict(
+        keyword=keyword,
+        storage=storages[args.keyword] if args.keyword is not None else storages.__getitem__,
         max_result=args.max_result,
         max_thread=args.max_thread,
         sleep_duration=args.sleep_duration,
         max_timelines=args.max_timelines,
         timeline_length=args.timeline_length,
-        token_refresh_duration=args.token_refresh_duration
+        token_refresh_duration=args.token_refresh_duration,
+        pool_size=args.pool_size,
+        module_workers=args.module_workers,
+        parse_workers=args.parse_workers,
+        streaming=args.stream_parse,
+        seen_index=seen_index,
+        refresh_seen=args.seen == "refresh",
+        token_cache=AccessTokenCache(args.token_cache, ttl=args.token_cache_ttl) if args.token_cache else None
     )
-    mgr.start()
-    
+    session = None
+    if args.record is not None:
+        session = RecordingSession(args.record, pool_size=args.pool_size if args.pool_size is not None else args.max_thread * args.module_workers + 1)
+    elif args.replay is not None:
+        session = ReplaySession(args.replay, latency=args.replay_latency, jitter=args.replay_jitter)
+
+    work_queue = None
+    if args.queue is not None:
+        work_queue = open_work_queue(args.queue)
+        seed(work_queue, keyword, max_result=args.max_result)
+        mgr = DistributedCrawler(
+            work_queue,
+            options["storage"],
+            max_thread=args.max_thread,
+            sleep_duration=args.sleep_duration,
+            max_timelines=args.max_timelines,
+            timeline_length=args.timeline_length,
+            token_refresh_duration=args.token_refresh_duration,
+            pool_size=args.pool_size,
+            token_pool_size=args.token_pool_size,
+            token_cache=options["token_cache"],
+            max_retries=args.max_retries,
+            module_workers=args.module_workers,
+            parse_workers=args.parse_workers,
+            streaming=args.stream_parse,
+            lease_duration=args.lease_duration,
+            session=session)
+    elif args.engine == "asyncio":
+        mgr = AsyncCrawlerManager(max_retries=args.max_retries, **options)
+    else:
+        checkpoint_path = args.checkpoint if args.checkpoint is not None else os.path.join(args.folder, ".checkpoint", "state.json")
+        mgr = CrawlerManager(
+            token_pool_size=args.token_pool_size,
+            max_retries=args.max_retries,
+            buffer_size=args.high_watermark,
+            low_watermark=args.low_watermark,
+            prefetch_pages=args.prefetch_pages,
+            checkpoint=Checkpoint(checkpoint_path) if checkpoint_path else None,
+            checkpoint_interval=args.checkpoint_interval,
+            resume=args.resume,
+            session=session,
+            **options)
+
     def signal_handler(signal, frame):
         logger.debug("HOLD HOLD HOLD")
         mgr.stop()
 
     signal.signal(signal.SIGINT, signal_handler)
-    while mgr.run:
-        pass
+    mgr.start()
+    if args.engine == "thread":
+        mgr.wait()
+        mgr.stop()
+    if seen_index is not None:
+        seen_index.close()
+    if work_queue is not None:
+        work_queue.close()
+    if session is not None:
+        session.close()
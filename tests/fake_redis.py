@@ -0,0 +1,108 @@
+import threading
+
+
+class FakeRedis:
+    """an in-memory stand-in of `redis.Redis(decode_responses=True)` with the commands of `RedisWorkQueue`
+
+    Every command is atomic, like on a real server.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.__lock = threading.RLock()
+
+    def __get(self, key, factory):
+        value = self.data.get(key)
+        if value is None:
+            value = factory()
+            self.data[key] = value
+        return value
+
+    def hsetnx(self, key, field, value):
+        with self.__lock:
+            hash_ = self.__get(key, dict)
+            if field in hash_:
+                return 0
+            hash_[field] = str(value)
+            return 1
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        with self.__lock:
+            hash_ = self.__get(key, dict)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = sum(1 for k in items if k not in hash_)
+            hash_.update({k: str(v) for k, v in items.items()})
+            return added
+
+    def hget(self, key, field):
+        with self.__lock:
+            return self.data.get(key, {}).get(field)
+
+    def hincrby(self, key, field, amount=1):
+        with self.__lock:
+            hash_ = self.__get(key, dict)
+            value = int(hash_.get(field, 0)) + amount
+            hash_[field] = str(value)
+            return value
+
+    def sadd(self, key, *members):
+        with self.__lock:
+            set_ = self.__get(key, set)
+            added = sum(1 for m in members if m not in set_)
+            set_.update(members)
+            return added
+
+    def srem(self, key, *members):
+        with self.__lock:
+            set_ = self.data.get(key, set())
+            removed = sum(1 for m in members if m in set_)
+            set_.difference_update(members)
+            return removed
+
+    def sismember(self, key, member):
+        with self.__lock:
+            return member in self.data.get(key, set())
+
+    def smembers(self, key):
+        with self.__lock:
+            return set(self.data.get(key, set()))
+
+    def scard(self, key):
+        with self.__lock:
+            return len(self.data.get(key, set()))
+
+    def zadd(self, key, mapping, nx=False, xx=False):
+        with self.__lock:
+            zset = self.__get(key, dict)
+            added = 0
+            for member, score in mapping.items():
+                exists = member in zset
+                if (nx and exists) or (xx and not exists):
+                    continue
+                if not exists:
+                    added += 1
+                zset[member] = float(score)
+            return added
+
+    def zrem(self, key, *members):
+        with self.__lock:
+            zset = self.data.get(key, {})
+            removed = 0
+            for member in members:
+                if zset.pop(member, None) is not None:
+                    removed += 1
+            return removed
+
+    def zcard(self, key):
+        with self.__lock:
+            return len(self.data.get(key, {}))
+
+    def zrangebyscore(self, key, min, max, start=None, num=None):
+        with self.__lock:
+            members = sorted((score, member) for member, score in self.data.get(key, {}).items() if float(min) <= score <= float(max))
+            members = [member for _, member in members]
+            if start is not None:
+                members = members[start:start + num]
+            return members
@@ -0,0 +1,210 @@
+"""An offline stand-in for the twitter endpoints used by the crawler
+
+The payload builders produce the minimal subset of the twitter json
+consumed by `tweet_crawler.tweet_parser`.
+"""
+import json
+import threading
+from urllib.parse import urlsplit
+
+from tweet_crawler.storages.framework import Storage
+
+
+TOKENS = {"access_token": "access", "csrf_token": "csrf", "guest_token": "guest"}
+
+
+def _tweet_item(tweet_id):
+    return {"item": {"content": {"tweet": {"id": tweet_id}}}}
+
+
+def _cursor_item(cursor):
+    return {"item": {"content": {"timelineCursor": {"value": cursor}}}}
+
+
+def _tweet_object(tweet):
+    """the tweet object of a (tweet_id, text) or a (tweet_id, text, author_id)
+    """
+    obj = {"full_text": tweet[1]}
+    if len(tweet) > 2:
+        obj["user_id_str"] = tweet[2]
+    return obj
+
+
+def tweet_page(main=None, modules=(), next_cursor=None):
+    """build a conversation page
+
+    Args:
+        main: a tuple of (tweet_id, text) of the main tweet, or (tweet_id, text, author_id).
+        modules: a list of (replies, cursor). replies is a list of tuples like `main`.
+        next_cursor: the cursor of the next batch of timelines.
+    """
+    tweets = {}
+    entries = []
+    if main is not None:
+        tweets[main[0]] = _tweet_object(main)
+        entries.append({"content": _tweet_item(main[0])})
+    for replies, cursor in modules:
+        items = []
+        for reply in replies:
+            tweets[reply[0]] = _tweet_object(reply)
+            items.append(_tweet_item(reply[0]))
+        if cursor is not None:
+            items.append(_cursor_item(cursor))
+        entries.append({"content": {"timelineModule": {"items": items}}})
+    if next_cursor is not None:
+        entries.append({"content": {"operation": {"cursor": {"value": next_cursor}}}})
+    return {
+        "globalObjects": {"tweets": tweets},
+        "timeline": {"instructions": [{"addEntries": {"entries": entries}}]},
+    }
+
+
+def module_page(replies, cursor=None):
+    """build a page fetched with the cursor of a timeline module
+    """
+    tweets = {}
+    items = []
+    for reply in replies:
+        tweets[reply[0]] = _tweet_object(reply)
+        items.append(_tweet_item(reply[0]))
+    if cursor is not None:
+        items.append(_cursor_item(cursor))
+    return {
+        "globalObjects": {"tweets": tweets},
+        "timeline": {"instructions": [{"addToModule": {"moduleItems": items}}]},
+    }
+
+
+def search_page(ids, next_cursor=None):
+    """build a page of search results
+    """
+    entries = [{"content": {"item": {"content": {"tweet": {"id": tweet_id}}}}} for tweet_id in ids]
+    if next_cursor is not None:
+        entries.append({"content": {"operation": {"cursor": {"value": next_cursor}}}})
+    return {"timeline": {"instructions": [{"addEntries": {"entries": entries}}]}}
+
+
+def conversation_routes(tweet_id):
+    """build the routes of a conversation with two pages and a module cursor
+    """
+    return {
+        ("conversation", tweet_id, None): tweet_page(
+            main=(tweet_id, "tweet {}".format(tweet_id)),
+            modules=[([(tweet_id + "-1", "reply 1")], "m1")],
+            next_cursor="p2"),
+        ("conversation", tweet_id, "m1"): module_page([(tweet_id + "-1-1", "reply 1-1")]),
+        ("conversation", tweet_id, "p2"): tweet_page(modules=[([(tweet_id + "-2", "reply 2")], None)]),
+    }
+
+
+class MemoryStorage(Storage):
+    """keep every saved tweet in a dictionary
+    """
+
+    def __init__(self):
+        self.tweets = {}
+        self.__lock = threading.Lock()
+
+    def save_tweet(self, parsed_tweet):
+        with self.__lock:
+            self.tweets[parsed_tweet["tweet_id"]] = parsed_tweet
+
+    def append_timeline(self, tweet_id, timeline):
+        with self.__lock:
+            self.tweets[tweet_id]["timelines"] += timeline
+
+
+class FakeRequest:
+    def __init__(self, url, headers):
+        self.url = url
+        self.headers = headers if headers is not None else {}
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, content=b"", headers=None, url=None, request_headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+        self.url = url
+        self.request = FakeRequest(url, request_headers)
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+
+class FakeTwitter:
+    """route requests to canned payloads
+
+    Routes are keyed by ("conversation", tweet_id, cursor) or ("search", cursor).
+    A route value may be a payload, an int status code, or a list consumed in order.
+    """
+
+    def __init__(self, routes=None, headers=None):
+        self.routes = dict(routes or {})
+        self.headers = dict(headers or {})
+        self.calls = []
+        self.guest_tokens = []
+        self.__lock = threading.Lock()
+        self.__hooks = []
+
+    def add_response_hook(self, hook):
+        self.__hooks.append(hook)
+
+    def remove_response_hook(self, hook):
+        if hook in self.__hooks:
+            self.__hooks.remove(hook)
+
+    def _dispatch(self, response):
+        for hook in list(self.__hooks):
+            hook(response)
+        return response
+
+    def _key(self, url, params):
+        params = dict(params or [])
+        path = urlsplit(url).path
+        cursor = params.get("cursor")
+        if path.startswith("/2/timeline/conversation/"):
+            return ("conversation", path[len("/2/timeline/conversation/"):-len(".json")], cursor)
+        if path == "/2/search/adaptive.json":
+            return ("search", cursor)
+        return (path,)
+
+    def _resolve(self, key):
+        with self.__lock:
+            self.calls.append(key)
+            value = self.routes.get(key, 404)
+            if isinstance(value, list):
+                value = value.pop(0) if len(value) > 1 else value[0]
+        return value
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        key = self._key(url, params)
+        value = self._resolve(key)
+        if isinstance(value, int):
+            return self._dispatch(FakeResponse(value, b"", dict(self.headers), url, headers))
+        return self._dispatch(FakeResponse(200, json.dumps(value).encode("utf-8"), dict(self.headers), url, headers))
+
+    def post(self, url, headers=None, **kwargs):
+        with self.__lock:
+            self.calls.append(("post", url))
+            token = "gt-{}".format(len(self.guest_tokens) + 1)
+            self.guest_tokens.append(token)
+        return self._dispatch(FakeResponse(200, json.dumps({"guest_token": token}).encode("utf-8"), {}, url, headers))
+
+
+class AsyncFakeTwitter:
+    """awaitable wrapper of `FakeTwitter`
+    """
+
+    def __init__(self, fake):
+        self.fake = fake
+
+    async def get(self, url, **kwargs):
+        return self.fake.get(url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return self.fake.post(url, **kwargs)
+
+    async def close(self):
+        pass
@@ -0,0 +1,165 @@
+import unittest
+
+import time
+import threading
+
+from tweet_crawler.records import ConversationRecord, TimelineRecord
+from tweet_crawler.storages.buffered_storage import BufferedStorage
+from tests.fake_twitter import MemoryStorage
+
+
+def parsed_tweet(tweet_id, timelines):
+    return {"tweet": "tweet {}".format(tweet_id), "tweet_id": tweet_id, "timelines": timelines}
+
+
+class RecordingStorage(MemoryStorage):
+    """record every call and block the writes until `gate` is set
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.flushed = 0
+        self.closed = False
+
+    def save_tweet(self, parsed_tweet):
+        self.gate.wait()
+        self.calls.append(("save", parsed_tweet["tweet_id"], len(parsed_tweet["timelines"])))
+        super().save_tweet(parsed_tweet)
+
+    def append_timeline(self, tweet_id, timeline):
+        self.gate.wait()
+        self.calls.append(("append", tweet_id, len(timeline)))
+        super().append_timeline(tweet_id, timeline)
+
+    def flush(self):
+        self.flushed += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestBufferedStorage(unittest.TestCase):
+    def test_coalesce_writes(self):
+        inner = RecordingStorage()
+        # "2" was saved before
+        inner.tweets["2"] = parsed_tweet("2", [])
+        storage = BufferedStorage(inner, flush_interval=60)
+        self.addCleanup(storage.close)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        storage.append_timeline("1", [["b"]])
+        storage.append_timeline("2", [["c"]])
+        storage.append_timeline("2", [["d"], ["e"]])
+        self.assertEqual(inner.calls, [])
+
+        storage.flush()
+        self.assertEqual(sorted(inner.calls), [("append", "2", 3), ("save", "1", 2)])
+        self.assertEqual(inner.tweets["1"]["timelines"], [["a"], ["b"]])
+        self.assertEqual(inner.flushed, 1)
+
+    def test_save_tweet_replaces_pending_writes(self):
+        inner = RecordingStorage()
+        storage = BufferedStorage(inner, flush_interval=60)
+        self.addCleanup(storage.close)
+        saved = parsed_tweet("1", [["a"]])
+        storage.save_tweet(saved)
+        storage.append_timeline("1", [["b"]])
+        storage.save_tweet(parsed_tweet("1", [["x"]]))
+        storage.flush()
+
+        self.assertEqual(inner.tweets["1"]["timelines"], [["x"]])
+        # the caller's object is never modified
+        self.assertEqual(saved["timelines"], [["a"]])
+
+    def test_flush_by_size_and_interval(self):
+        inner = RecordingStorage()
+        storage = BufferedStorage(inner, flush_size=2, flush_interval=60)
+        self.addCleanup(storage.close)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        deadline = time.time() + 5
+        while len(inner.calls) == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(inner.calls, [("save", "1", 1)])
+
+        storage = BufferedStorage(RecordingStorage(), flush_interval=0.05)
+        self.addCleanup(storage.close)
+        storage.save_tweet(parsed_tweet("2", []))
+        time.sleep(0.5)
+        self.assertIn("2", storage.storage.tweets)
+
+    def test_backpressure(self):
+        inner = RecordingStorage()
+        inner.gate.clear()
+        storage = BufferedStorage(inner, flush_size=1, flush_interval=60, max_pending=2)
+        storage.save_tweet(parsed_tweet("1", []))
+        # the writer thread is blocked on "1", so "2" and "3" fill the buffer
+        time.sleep(0.1)
+        storage.save_tweet(parsed_tweet("2", []))
+        storage.save_tweet(parsed_tweet("3", []))
+
+        blocked = threading.Thread(target=storage.save_tweet, args=(parsed_tweet("4", []),), daemon=True)
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+
+        inner.gate.set()
+        blocked.join(5)
+        self.assertFalse(blocked.is_alive())
+        storage.close()
+        self.assertEqual(sorted(inner.tweets), ["1", "2", "3", "4"])
+
+    def test_close(self):
+        inner = RecordingStorage()
+        storage = BufferedStorage(inner, flush_interval=60)
+        storage.save_tweet(parsed_tweet("1", []))
+        storage.close()
+        storage.close()
+
+        self.assertTrue(inner.closed)
+        self.assertIn("1", inner.tweets)
+        self.assertRaises(ValueError, storage.save_tweet, parsed_tweet("2", []))
+
+    def test_failed_write_is_reported(self):
+        inner = RecordingStorage()
+        storage = BufferedStorage(inner, flush_interval=60)
+        # the wrapped storage fails to append to a tweet it has never saved
+        storage.append_timeline("1", [["a"]])
+        storage.save_tweet(parsed_tweet("2", []))
+
+        self.assertRaises(KeyError, storage.flush)
+        self.assertIn("2", inner.tweets)
+        self.assertRaises(KeyError, storage.flush)
+        self.assertRaises(KeyError, storage.close)
+        self.assertTrue(inner.closed)
+
+    def test_forward_records(self):
+        inner = RecordingStorage()
+        records = []
+        inner.save_record = lambda record: records.append(("save", record))
+        inner.append_records = lambda tweet_id, timelines: records.append(("append", tweet_id, timelines))
+        storage = BufferedStorage(inner, flush_interval=60)
+        self.addCleanup(storage.close)
+        first = TimelineRecord(["1-1"], ["a"], ["u2"])
+        second = TimelineRecord(["1-2"], ["b"], ["u3"])
+        third = TimelineRecord(["2-1"], ["c"], ["u4"])
+        storage.save_record(ConversationRecord("1", "tweet 1", "u1", [first]))
+        storage.append_records("1", [second])
+        storage.append_records("2", [third])
+
+        storage.flush()
+        self.assertEqual(sorted(records, key=repr), [
+            ("append", "2", [third]),
+            ("save", ConversationRecord("1", "tweet 1", "u1", [first, second])),
+        ])
+
+    def test_delegate_attributes(self):
+        inner = RecordingStorage()
+        storage = BufferedStorage(inner)
+        self.addCleanup(storage.close)
+        self.assertIs(storage.tweets, inner.tweets)
+
+
+if __name__ == '__main__':
+    unittest.main()
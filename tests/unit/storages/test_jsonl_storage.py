@@ -0,0 +1,68 @@
+import unittest
+
+import os
+import json
+import tempfile
+
+from tweet_crawler.storages.jsonl_storage import JsonlStorage, list_segments, read_tweets, compact
+
+
+def parsed_tweet(tweet_id, timelines):
+    return {"tweet": "tweet {}".format(tweet_id), "tweet_id": tweet_id, "timelines": timelines}
+
+
+class TestJsonlStorage(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "segments")
+
+    def test_append_and_read(self):
+        storage = JsonlStorage(self.path)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        storage.save_tweet(parsed_tweet("2", [["x"]]))
+        storage.append_timeline("1", [["b", "c"]])
+        storage.append_timeline("1", [["d"]])
+        storage.close()
+
+        tweets = read_tweets(self.path)
+        self.assertEqual(tweets["1"]["timelines"], [["a"], ["b", "c"], ["d"]])
+        self.assertEqual(tweets["2"], parsed_tweet("2", [["x"]]))
+
+    def test_rotation_and_restart(self):
+        storage = JsonlStorage(self.path, segment_size=1)
+        storage.save_tweet(parsed_tweet("1", []))
+        storage.append_timeline("1", [["a"]])
+        storage.close()
+        self.assertEqual(len(list_segments(self.path)), 2)
+
+        # a new process continues with a new segment
+        storage = JsonlStorage(self.path)
+        storage.append_timeline("1", [["b"]])
+        storage.close()
+        self.assertEqual([os.path.basename(p) for p in list_segments(self.path)], ["segment-000001.jsonl", "segment-000002.jsonl", "segment-000003.jsonl"])
+        self.assertEqual(read_tweets(self.path)["1"]["timelines"], [["a"], ["b"]])
+
+    def test_truncated_line_is_skipped(self):
+        storage = JsonlStorage(self.path)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        storage.close()
+        with open(list_segments(self.path)[-1], "ab") as f:
+            f.write(b'{"type": "timeline", "tweet_id": "1", "timel')
+
+        self.assertEqual(read_tweets(self.path)["1"]["timelines"], [["a"]])
+
+    def test_compact(self):
+        storage = JsonlStorage(self.path)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        storage.append_timeline("1", [["b"]])
+        storage.close()
+
+        output = os.path.join(self.folder.name, "json")
+        self.assertEqual(compact(self.path, output), 1)
+        with open(os.path.join(output, "1.json"), "r", encoding="utf-8") as f:
+            self.assertEqual(json.loads(f.read()), parsed_tweet("1", [["a"], ["b"]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
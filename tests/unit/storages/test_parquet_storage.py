@@ -0,0 +1,93 @@
+import unittest
+
+import os
+import json
+import tempfile
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from tweet_crawler.storages.parquet_storage import ParquetStorage, read_table, export
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestParquetStorage(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "parquet")
+
+    def test_rows(self):
+        storage = ParquetStorage(self.path, row_group_size=1, part_row_groups=2)
+        storage.save_tweet({"tweet": "t1", "tweet_id": "1", "timelines": [["a", "b"]]})
+        storage.save_tweet({"tweet": "t2", "tweet_id": "2", "timelines": []})
+        storage.append_timeline("1", [["c"], ["d", "e"]])
+        storage.close()
+
+        self.assertGreater(len(os.listdir(self.path)), 1)
+        table = read_table(self.path)
+        rows = list(zip(*[table.column(name).to_pylist() for name in ["tweet_id", "tweet", "timeline_index", "reply_position", "reply"]]))
+        self.assertEqual(rows, [
+            ("1", "t1", 0, 0, "a"),
+            ("1", "t1", 0, 1, "b"),
+            ("2", "t2", -1, -1, None),
+            ("1", "t1", 1, 0, "c"),
+            ("1", "t1", 2, 0, "d"),
+            ("1", "t1", 2, 1, "e"),
+        ])
+
+        replies = read_table(self.path, columns=["reply"])
+        self.assertEqual(replies.column_names, ["reply"])
+
+    def test_max_tweets(self):
+        storage = ParquetStorage(self.path, max_tweets=2)
+        for tweet_id in ["1", "2", "3"]:
+            storage.save_tweet({"tweet": "t" + tweet_id, "tweet_id": tweet_id, "timelines": [["a"]]})
+        storage.append_timeline("3", [["b"]])
+        # "1" is the least recently written, it's text and count are dropped
+        storage.append_timeline("1", [["c"]])
+        storage.close()
+
+        table = read_table(self.path)
+        rows = list(zip(*[table.column(name).to_pylist() for name in ["tweet_id", "tweet", "timeline_index", "reply"]]))
+        self.assertEqual(rows[3:], [("3", "t3", 1, "b"), ("1", None, 0, "c")])
+
+    def test_flush_keeps_the_part_open(self):
+        storage = ParquetStorage(self.path)
+        for i in range(5):
+            storage.save_tweet({"tweet": "t{}".format(i), "tweet_id": str(i), "timelines": [["a"]]})
+            storage.flush()
+        self.assertIsNone(read_table(self.path))
+        storage.close()
+
+        self.assertEqual(os.listdir(self.path), ["part-000001.parquet"])
+        self.assertEqual(sorted(read_table(self.path).column("tweet_id").to_pylist()), ["0", "1", "2", "3", "4"])
+
+    def test_recover_after_crash(self):
+        storage = ParquetStorage(self.path)
+        storage.save_tweet({"tweet": "t1", "tweet_id": "1", "timelines": [["a", "b"]]})
+        storage.flush()
+        storage.save_tweet({"tweet": "t2", "tweet_id": "2", "timelines": [["c"]]})
+        # the process dies without closing the storage
+
+        storage = ParquetStorage(self.path)
+        self.assertEqual(sorted(os.listdir(self.path)), ["part-000001.parquet"])
+        self.assertEqual(read_table(self.path).column("reply").to_pylist(), ["a", "b"])
+        storage.save_tweet({"tweet": "t3", "tweet_id": "3", "timelines": []})
+        storage.close()
+        self.assertEqual(sorted(os.listdir(self.path)), ["part-000001.parquet", "part-000002.parquet"])
+
+    def test_export(self):
+        source = os.path.join(self.folder.name, "json")
+        os.makedirs(source)
+        with open(os.path.join(source, "1.json"), "w", encoding="utf-8") as f:
+            f.write(json.dumps({"tweet": "t1", "tweet_id": "1", "timelines": [["a"]]}))
+
+        self.assertEqual(export(source, self.path), 1)
+        self.assertEqual(read_table(self.path).column("reply").to_pylist(), ["a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import threading
+
+from tweet_crawler.records import ConversationRecord, TimelineRecord
+from tweet_crawler.storages.queue_storage import QueueStorage, QueueInterrupted
+
+
+class TestQueueStorage(unittest.TestCase):
+    def test_records(self):
+        storage = QueueStorage()
+        record = ConversationRecord("1", "tweet 1", "u1", [TimelineRecord(["2"], ["reply 1"], ["u2"])])
+        storage.save_record(record)
+        storage.append_timeline("1", [["reply 2"]])
+        storage.close()
+
+        self.assertIs(storage.get(), record)
+        self.assertEqual(storage.get(), ConversationRecord("1", None, timelines=[TimelineRecord([None], ["reply 2"])]))
+        self.assertIsNone(storage.get())
+
+    def test_full_queue_blocks_the_writer(self):
+        storage = QueueStorage(max_size=1)
+        storage.save_tweet({"tweet": "tweet 1", "tweet_id": "1", "timelines": []})
+        writer = threading.Thread(target=storage.save_tweet, args=({"tweet": "tweet 2", "tweet_id": "2", "timelines": []},))
+        writer.start()
+        writer.join(timeout=0.2)
+        self.assertTrue(writer.is_alive())
+
+        self.assertEqual(storage.get().tweet_id, "1")
+        writer.join(timeout=10)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(storage.get().tweet_id, "2")
+
+    def test_interrupt(self):
+        storage = QueueStorage(max_size=1)
+        storage.append_records("1", [])
+        errors = []
+
+        def write():
+            try:
+                storage.append_records("1", [])
+            except QueueInterrupted as e:
+                errors.append(e)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        storage.interrupt()
+        writer.join(timeout=10)
+        self.assertEqual(len(errors), 1)
+        self.assertIsNone(storage.get())
+
+
+if __name__ == '__main__':
+    unittest.main()
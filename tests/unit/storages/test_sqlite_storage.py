@@ -0,0 +1,116 @@
+import unittest
+
+import os
+import sqlite3
+import tempfile
+import threading
+
+from tweet_crawler.storages.sqlite_storage import SqliteStorage
+
+
+def parsed_tweet(tweet_id, timelines):
+    return {"tweet": "tweet {}".format(tweet_id), "tweet_id": tweet_id, "timelines": timelines}
+
+
+class TestSqliteStorage(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "db", "tweets.sqlite3")
+
+    def test_save_and_append(self):
+        storage = SqliteStorage(self.path)
+        self.addCleanup(storage.close)
+        storage.save_tweet(parsed_tweet("1", [["a"], ["b"]]))
+        storage.append_timeline("1", [["c", "d"]])
+        storage.flush()
+
+        self.assertTrue(storage.has_tweet("1"))
+        self.assertFalse(storage.has_tweet("2"))
+        self.assertEqual(storage.get_conversation("1"), parsed_tweet("1", [["a"], ["b"], ["c", "d"]]))
+        self.assertIsNone(storage.get_conversation("2"))
+
+    def test_save_tweet_replaces(self):
+        storage = SqliteStorage(self.path)
+        self.addCleanup(storage.close)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        storage.append_timeline("1", [["b"]])
+        storage.save_tweet(parsed_tweet("1", [["x"]]))
+        storage.append_timeline("1", [["y"]])
+        storage.flush()
+
+        self.assertEqual(storage.get_conversation("1")["timelines"], [["x"], ["y"]])
+
+    def test_concurrent_writers_and_reopen(self):
+        storage = SqliteStorage(self.path, batch_size=7)
+
+        def worker(tweet_id):
+            storage.save_tweet(parsed_tweet(tweet_id, []))
+            for i in range(20):
+                storage.append_timeline(tweet_id, [[str(i)]])
+
+        threads = [threading.Thread(target=worker, args=(str(i),)) for i in range(8)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        storage.close()
+
+        # the next process appends after the saved timelines
+        storage = SqliteStorage(self.path)
+        self.addCleanup(storage.close)
+        storage.append_timeline("3", [["20"]])
+        storage.flush()
+
+        self.assertEqual(sorted(storage.iter_tweet_ids()), [str(i) for i in range(8)])
+        self.assertEqual(storage.get_conversation("3")["timelines"], [[str(i)] for i in range(21)])
+
+    def test_failed_write_is_reported(self):
+        storage = SqliteStorage(self.path, batch_interval=60)
+        storage.save_tweet(parsed_tweet("1", [["a"]]))
+        # a text sqlite can not bind fails the whole batch
+        storage.save_tweet({"tweet": ["not", "a", "text"], "tweet_id": "2", "timelines": []})
+        storage.save_tweet(parsed_tweet("3", [["c"]]))
+        storage.append_timeline("1", [["b"]])
+
+        self.assertRaises(sqlite3.Error, storage.flush)
+        # the other writes of the batch are committed one by one
+        self.assertEqual(sorted(storage.iter_tweet_ids()), ["1", "3"])
+        self.assertEqual(storage.get_conversation("1")["timelines"], [["a"], ["b"]])
+        self.assertRaises(sqlite3.Error, storage.close)
+
+    def test_flush_after_close(self):
+        storage = SqliteStorage(self.path)
+        storage.close()
+        self.assertRaises(ValueError, storage.flush)
+
+    def test_flush_after_the_writer_stopped(self):
+        storage = SqliteStorage(self.path)
+        # a timeline which can not be serialized stops the writer thread
+        storage.save_tweet(parsed_tweet("1", [[object()]]))
+        self.assertRaises(TypeError, storage.flush)
+        # the next flush does not wait for the stopped writer
+        storage.append_timeline("1", [["a"]])
+        self.assertRaises(TypeError, storage.flush)
+        self.assertRaises(TypeError, storage.close)
+
+    def test_close_every_reader(self):
+        storage = SqliteStorage(self.path)
+        storage.save_tweet(parsed_tweet("1", []))
+        storage.flush()
+        readers = []
+
+        def read():
+            self.assertTrue(storage.has_tweet("1"))
+            readers.append(storage._reader())
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        storage.close()
+
+        self.assertRaises(sqlite3.ProgrammingError, readers[0].execute, "SELECT 1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+
+import asyncio
+import time
+from unittest import mock
+
+from crawler import AsyncCrawlerManager
+from tweet_crawler.async_parser import AsyncTweet
+from tweet_crawler.async_parser import AsyncTwitterSearch
+from tweet_crawler.retry import AsyncRetryPolicy, TransientError
+from tests.fake_twitter import FakeTwitter, AsyncFakeTwitter, MemoryStorage, TOKENS, conversation_routes, search_page
+
+
+class TestAsyncCrawler(unittest.TestCase):
+    def test_async_tweet(self):
+        session = AsyncFakeTwitter(FakeTwitter(conversation_routes("1")))
+        tweet = AsyncTweet("1", session=session, **TOKENS)
+
+        async def run():
+            main = await tweet.get_main_tweet()
+            timelines = await tweet.get_next_timelines()
+            return main, timelines
+
+        main, timelines = asyncio.run(run())
+        self.assertEqual(main["tweet"], "tweet 1")
+        self.assertEqual(main["timelines"], [["reply 1", "reply 1-1"]])
+        self.assertEqual(timelines, [["reply 2"]])
+        self.assertIsNone(tweet.get_next_cursor())
+
+    def test_async_search(self):
+        fake = FakeTwitter({("search", None): search_page(["1", "2"], next_cursor="scroll:2")})
+        search = AsyncTwitterSearch("spacex", session=AsyncFakeTwitter(fake), **TOKENS)
+        ids = asyncio.run(search.get_next_ids())
+        self.assertEqual(ids, ["1", "2"])
+        self.assertEqual(search.next_cursor, "scroll:2")
+
+    def test_crawl(self):
+        routes = {
+            ("search", None): search_page(["1", "2"], next_cursor="scroll:2"),
+            ("search", "scroll:2"): search_page(["3"], next_cursor="scroll:3"),
+        }
+        for tweet_id in ["1", "2", "3"]:
+            routes.update(conversation_routes(tweet_id))
+        storage = MemoryStorage()
+        mgr = AsyncCrawlerManager("spacex", storage, max_result=3, max_thread=2, sleep_duration=0, session=AsyncFakeTwitter(FakeTwitter(routes)))
+        mgr.tokens = TOKENS
+        mgr.last_token_refresh = time.time()
+
+        mgr.start()
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2", "3"])
+        self.assertEqual(storage.tweets["3"]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+        self.assertFalse(mgr.run)
+
+    def test_retry_policy(self):
+        fake = FakeTwitter({("search", None): [500, 503, search_page(["1"])]})
+        search = AsyncTwitterSearch("spacex", session=AsyncFakeTwitter(fake), retry_policy=AsyncRetryPolicy(max_retries=2, base_delay=0.01), **TOKENS)
+        self.assertEqual(asyncio.run(search.get_next_ids()), ["1"])
+        self.assertEqual(len(fake.calls), 3)
+
+        fake = FakeTwitter({("search", None): 500})
+        search = AsyncTwitterSearch("spacex", session=AsyncFakeTwitter(fake), **TOKENS)
+        self.assertRaises(TransientError, asyncio.run, search.get_next_ids())
+
+    def test_crawl_goes_on_after_a_failed_search_page(self):
+        routes = {
+            ("search", None): search_page(["1"], next_cursor="scroll:2"),
+            ("search", "scroll:2"): [500, search_page(["2"], next_cursor="scroll:3")],
+        }
+        for tweet_id in ["1", "2"]:
+            routes.update(conversation_routes(tweet_id))
+        storage = MemoryStorage()
+        mgr = AsyncCrawlerManager("spacex", storage, max_result=2, sleep_duration=0, session=AsyncFakeTwitter(FakeTwitter(routes)), max_retries=0)
+        mgr.tokens = TOKENS
+        mgr.last_token_refresh = time.time()
+
+        mgr.start()
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2"])
+
+    def test_auth_error_refreshes_tokens(self):
+        routes = {
+            ("search", None): search_page(["1"], next_cursor="scroll:2"),
+            ("search", "scroll:2"): search_page([], next_cursor="scroll:2"),
+        }
+        routes.update(conversation_routes("1"))
+        routes[("conversation", "1", None)] = [401, routes[("conversation", "1", None)]]
+        fake = FakeTwitter(routes)
+        storage = MemoryStorage()
+        mgr = AsyncCrawlerManager("spacex", storage, max_result=1, sleep_duration=0, session=AsyncFakeTwitter(fake))
+        mgr.tokens = TOKENS
+        mgr.last_token_refresh = time.time()
+
+        with mock.patch("tweet_crawler.tweet_fetcher.get_tokens", return_value=dict(TOKENS, guest_token="guest-2")):
+            mgr.start()
+
+        self.assertEqual(sorted(storage.tweets), ["1"])
+        # the rejected tokens are not sent again
+        self.assertEqual(fake.calls.count(("conversation", "1", None)), 2)
+        self.assertEqual(mgr.tokens["guest_token"], "guest-2")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+import os
+import gzip
+import tempfile
+from unittest import mock
+
+from crawler import CrawlerManager
+from tweet_crawler import tweet_fetcher
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.cassette import RecordingSession, ReplaySession, CassetteMiss, request_key, load_cassette
+from tests.fake_twitter import FakeTwitter, MemoryStorage, TOKENS, conversation_routes
+from tests.unit.test_crawler_manager import search_routes
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def path(self, name="cassette.jsonl.gz"):
+        return os.path.join(self.folder.name, name)
+
+    def record(self, routes, path, fetch):
+        session = RecordingSession(path, FakeTwitter(routes))
+        fetch(session)
+        session.close()
+        return session
+
+    def crawl(self, session):
+        token_pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        storage = MemoryStorage()
+        mgr = CrawlerManager("spacex", storage, max_result=3, max_thread=2, sleep_duration=0, progress_interval=0, session=session, token_pool=token_pool)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+        return storage.tweets
+
+    def test_replay_a_crawl(self):
+        routes = search_routes([["1", "2"], ["3"]])
+        recorded = {}
+        session = self.record(routes, self.path(), lambda session: recorded.update(self.crawl(session)))
+        self.assertGreater(session.recorded, 0)
+
+        replayed = self.crawl(ReplaySession(self.path()))
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(sorted(replayed), ["1", "2", "3"])
+
+    def test_compressed(self):
+        fetch = lambda session: [tweet_fetcher.fetch_tweet("1", cursor=cursor, session=session, **TOKENS) for cursor in [None, "m1", "p2"]]
+        self.record(conversation_routes("1"), self.path("cassette.jsonl.gz"), fetch)
+        self.record(conversation_routes("1"), self.path("cassette.jsonl"), fetch)
+
+        with gzip.open(self.path("cassette.jsonl.gz"), "rb") as f:
+            self.assertEqual(len(f.read().splitlines()), 3)
+        self.assertEqual(load_cassette(self.path("cassette.jsonl.gz")).keys(), load_cassette(self.path("cassette.jsonl")).keys())
+        self.assertLess(os.path.getsize(self.path("cassette.jsonl.gz")), os.path.getsize(self.path("cassette.jsonl")))
+
+    def test_request_key(self):
+        url = "https://api.twitter.com/2/timeline/conversation/1.json"
+        self.assertEqual(request_key("get", url, [("b", "2"), ("a", "1")]), request_key("GET", url + "?a=1", {"b": "2"}))
+        self.assertNotEqual(request_key("GET", url, {"cursor": "p2"}), request_key("GET", url))
+
+    def test_replay_in_order(self):
+        routes = {("conversation", "1", None): [500, 500, conversation_routes("1")[("conversation", "1", None)]]}
+
+        def fetch(session):
+            for _ in range(3):
+                tweet_fetcher.fetch_tweet("1", session=session, **TOKENS)
+
+        self.record(routes, self.path(), fetch)
+        session = ReplaySession(self.path())
+        url, _, params = tweet_fetcher._build_tweet_request("1", **TOKENS)
+        statuses = [session.get(url, params=params).status_code for _ in range(4)]
+        self.assertEqual(statuses, [500, 500, 200, 200])
+
+        with self.assertRaises(CassetteMiss):
+            tweet_fetcher.fetch_tweet("2", session=session, **TOKENS)
+
+    def test_latency(self):
+        self.record(conversation_routes("1"), self.path(), lambda session: tweet_fetcher.fetch_tweet("1", session=session, **TOKENS))
+
+        delays = []
+        for _ in range(2):
+            session = ReplaySession(self.path(), latency=0.5, jitter=0.5, seed=1)
+            with mock.patch("tweet_crawler.cassette.time.sleep") as sleep:
+                for _ in range(3):
+                    self.assertIsNotNone(tweet_fetcher.fetch_tweet("1", session=session, **TOKENS))
+            delays.append([call.args[0] for call in sleep.call_args_list])
+
+        self.assertEqual(delays[0], delays[1])
+        self.assertEqual(len(set(delays[0])), 3)
+        self.assertTrue(all(0.5 <= delay <= 1 for delay in delays[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+import os
+import time
+import shutil
+import tempfile
+
+from crawler import CrawlerManager
+from tweet_crawler.checkpoint import Checkpoint
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.search_prefetcher import SearchPrefetcher
+from tests.fake_twitter import FakeTwitter, MemoryStorage, search_page
+from tests.unit.test_crawler_manager import search_routes
+from tests.unit.test_search_prefetcher import FakeSearch
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.checkpoint = Checkpoint(os.path.join(self.folder, "state", "checkpoint.json"))
+
+    def create_manager(self, session, storage, **kwargs):
+        token_pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        return CrawlerManager("spacex", storage, max_thread=1, sleep_duration=0, progress_interval=0, session=session, token_pool=token_pool, checkpoint=self.checkpoint, **kwargs)
+
+    def test_save_and_load(self):
+        self.assertIsNone(self.checkpoint.load())
+        self.checkpoint.save({"keywords": {"spacex": {"cursor": "scroll:1", "fetched_ids": 1, "pending": ["1"], "tweets": {}}}})
+        state = self.checkpoint.load()["keywords"]["spacex"]
+        self.assertEqual(state["cursor"], "scroll:1")
+        self.assertEqual(state["pending"], ["1"])
+        self.assertFalse(os.path.exists(self.checkpoint.path + ".tmp"))
+
+        self.checkpoint.clear()
+        self.assertIsNone(self.checkpoint.load())
+
+    def test_broken_file_is_ignored(self):
+        os.makedirs(os.path.dirname(self.checkpoint.path))
+        with open(self.checkpoint.path, "w") as f:
+            f.write("{\"version\": 1, \"curs")
+        self.assertIsNone(self.checkpoint.load())
+
+    def test_prefetcher_snapshot(self):
+        prefetcher = SearchPrefetcher(FakeSearch(page_size=3), max_result=6, prefetch_pages=1)
+        prefetcher.restore("scroll:1", ["a", "b"], 2)
+        prefetcher.start()
+        self.addCleanup(prefetcher.close)
+
+        self.assertEqual(prefetcher.get(timeout=5), "a")
+        self.assertEqual(prefetcher.snapshot()["pending"][:2], ["a", "b"])
+        prefetcher.task_done("a")
+        self.assertEqual(prefetcher.snapshot()["pending"][0], "b")
+
+    def test_resume(self):
+        self.checkpoint.save({"keywords": {
+            "spacex": {
+                "cursor": "scroll:1",
+                "fetched_ids": 2,
+                "pending": ["1", "2"],
+                "tweets": {"1": {"cursor": "p2", "timelines": 1}}
+            }
+        }})
+        storage = MemoryStorage()
+        storage.save_tweet({"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1", "reply 1-1"]]})
+        session = FakeTwitter(search_routes([["1", "2"], ["3", "4"]]))
+
+        mgr = self.create_manager(session, storage, max_result=3, resume=True)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2", "3"])
+        self.assertEqual(storage.tweets["1"]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+        self.assertNotIn(("search", None), session.calls)
+        self.assertNotIn(("conversation", "1", None), session.calls)
+        # a complete crawl leaves no checkpoint
+        self.assertIsNone(self.checkpoint.load())
+
+    def test_resume_another_keyword(self):
+        self.checkpoint.save({"keywords": {"nasa": {"cursor": None, "fetched_ids": 0, "pending": [], "tweets": {}}}})
+        with self.assertRaises(ValueError):
+            self.create_manager(FakeTwitter({}), MemoryStorage(), resume=True)
+
+    def test_stop_saves_checkpoint(self):
+        storage = MemoryStorage()
+        routes = search_routes([["1"]])
+        # the cursor keeps moving, the search is still going on when it is stopped
+        routes[("search", "scroll:1")] = search_page([], next_cursor="scroll:2")
+        routes[("search", "scroll:2")] = search_page([], next_cursor="scroll:1")
+        mgr = self.create_manager(FakeTwitter(routes), storage, max_result=-1)
+        mgr.start()
+        deadline = time.time() + 10
+        while mgr.scheduler.snapshot()["spacex"]["pending"] != [] or mgr.fetched_ids == 0:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        mgr.stop()
+
+        state = self.checkpoint.load()["keywords"]["spacex"]
+        self.assertEqual(state["cursor"], "scroll:1")
+        self.assertEqual(state["fetched_ids"], 1)
+        self.assertEqual(state["pending"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
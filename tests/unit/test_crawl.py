@@ -0,0 +1,61 @@
+import unittest
+
+import time
+import asyncio
+
+from crawler import crawl, crawl_async
+from tweet_crawler.token_pool import TokenPool
+from tests.fake_twitter import FakeTwitter
+from tests.unit.test_crawler_manager import search_routes
+
+
+class TestCrawl(unittest.TestCase):
+    def options(self, routes, **kwargs):
+        self.session = FakeTwitter(routes)
+        token_pool = TokenPool(size=1, access_token="access", session=self.session)
+        self.addCleanup(token_pool.close)
+        return dict(sleep_duration=0, progress_interval=0, session=self.session, token_pool=token_pool, **kwargs)
+
+    def first_pages(self):
+        return [call for call in self.session.calls if call[0] == "conversation" and call[2] is None]
+
+    def test_records(self):
+        records = list(crawl("spacex", **self.options(search_routes([["1", "2"]]), max_result=2, max_thread=2)))
+
+        self.assertEqual(sorted((r.tweet_id, r.text or "") for r in records), [("1", ""), ("1", "tweet 1"), ("2", ""), ("2", "tweet 2")])
+        for record in records:
+            if record.text is None:
+                self.assertEqual([t.texts for t in record.timelines], [["reply 2"]])
+            else:
+                self.assertEqual([t.texts for t in record.timelines], [["reply 1", "reply 1-1"]])
+                self.assertEqual(record.timelines[0].tweet_ids, [record.tweet_id + "-1", record.tweet_id + "-1-1"])
+
+    def test_backpressure(self):
+        records = crawl("spacex", queue_size=1, **self.options(search_routes([["1", "2", "3", "4"]]), max_result=4, max_thread=1))
+        next(records)
+        time.sleep(0.3)
+        # one record taken, one queued, and the worker waits with the first page of the next tweet
+        self.assertEqual(len(self.first_pages()), 2)
+
+        self.assertEqual(len(list(records)), 7)
+        self.assertEqual(len(self.first_pages()), 4)
+
+    def test_leave_early(self):
+        records = crawl("spacex", queue_size=1, **self.options(search_routes([["1", "2", "3", "4"]]), max_result=-1, max_thread=2))
+        next(records)
+        records.close()
+        calls = len(self.session.calls)
+        time.sleep(0.2)
+        self.assertEqual(len(self.session.calls), calls)
+
+    def test_async(self):
+        options = self.options(search_routes([["1", "2"]]), max_result=2, max_thread=2)
+
+        async def collect():
+            return [record async for record in crawl_async("spacex", **options)]
+
+        self.assertEqual(sorted(r.tweet_id for r in asyncio.run(collect())), ["1", "1", "2", "2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
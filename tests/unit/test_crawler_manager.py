@@ -0,0 +1,120 @@
+import unittest
+
+from crawler import CrawlerManager
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.storages.buffered_storage import BufferedStorage
+from tests.fake_twitter import FakeTwitter, MemoryStorage, conversation_routes, search_page
+
+
+def search_routes(pages):
+    routes = {}
+    cursor = None
+    for i, ids in enumerate(pages):
+        next_cursor = "scroll:{}".format(i + 1)
+        routes[("search", cursor)] = search_page(ids, next_cursor=next_cursor)
+        cursor = next_cursor
+        for tweet_id in ids:
+            routes.update(conversation_routes(tweet_id))
+    routes[("search", cursor)] = search_page([], next_cursor=cursor)
+    return routes
+
+
+class DuckStorage:
+    """a storage which does not subclass `Storage`
+    """
+
+    def __init__(self):
+        self.storage = MemoryStorage()
+        self.closed = False
+
+    def __getattr__(self, name):
+        if name == "storage":
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    def close(self):
+        self.closed = True
+
+
+class TestCrawlerManager(unittest.TestCase):
+    def create_manager(self, routes, storage, **kwargs):
+        session = FakeTwitter(routes)
+        token_pool = TokenPool(size=2, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        return CrawlerManager("spacex", storage, sleep_duration=0, progress_interval=0, session=session, token_pool=token_pool, **kwargs)
+
+    def test_download_until_max_result(self):
+        storage = MemoryStorage()
+        mgr = self.create_manager(search_routes([["1", "2"], ["3", "4"]]), storage, max_result=3, max_thread=2, buffer_size=1)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertFalse(mgr.run)
+        self.assertEqual(sorted(storage.tweets), ["1", "2", "3"])
+        self.assertEqual(storage.tweets["1"]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+
+    def test_duck_typed_storage(self):
+        storage = DuckStorage()
+        mgr = self.create_manager(search_routes([["1", "2"]]), storage, max_result=2, max_thread=1)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2"])
+        self.assertTrue(storage.closed)
+
+    def test_failed_download_does_not_kill_worker(self):
+        routes = search_routes([["1", "2"]])
+        routes[("conversation", "1", None)] = 500
+        storage = MemoryStorage()
+        mgr = self.create_manager(routes, storage, max_result=2, max_thread=1)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(sorted(storage.tweets), ["2"])
+
+    def test_stop_unlimited(self):
+        storage = MemoryStorage()
+        mgr = self.create_manager(search_routes([["1"]]), storage, max_result=-1, max_thread=3)
+        mgr.start()
+        mgr.stop()
+        self.assertTrue(mgr.wait(timeout=10))
+
+    def test_stop_flushes_buffered_storage(self):
+        storage = MemoryStorage()
+        mgr = self.create_manager(search_routes([["1", "2"]]), BufferedStorage(storage, flush_interval=60), max_result=2, max_thread=2)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2"])
+        self.assertEqual(storage.tweets["2"]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+
+    def test_max_timelines(self):
+        routes = search_routes([["1"]])
+        session = FakeTwitter(routes)
+        token_pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        storage = MemoryStorage()
+        mgr = CrawlerManager("spacex", storage, max_result=1, max_thread=1, max_timelines=1, sleep_duration=0, progress_interval=0, session=session, token_pool=token_pool)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(storage.tweets["1"]["timelines"], [["reply 1", "reply 1-1"]])
+        self.assertNotIn(("conversation", "1", "p2"), session.calls)
+
+    def test_parse_workers(self):
+        storage = MemoryStorage()
+        mgr = self.create_manager(search_routes([["1", "2"]]), storage, max_result=2, max_thread=2, parse_workers=1)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(storage.tweets["1"], {"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1", "reply 1-1"], ["reply 2"]]})
+
+
+if __name__ == '__main__':
+    unittest.main()
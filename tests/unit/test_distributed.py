@@ -0,0 +1,137 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from tweet_crawler.distributed import DistributedCrawler, seed, open_work_queue, conversation_task_id
+from tweet_crawler.token_pool import TokenPool, CONVERSATION
+from tweet_crawler.work_queues.redis_queue import RedisWorkQueue
+from tweet_crawler.storages.buffered_storage import BufferedStorage
+from tests.fake_redis import FakeRedis
+from tests.fake_twitter import FakeTwitter, MemoryStorage
+from tests.unit.test_crawler_manager import DuckStorage, search_routes
+
+
+class TestDistributedCrawler(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.queue_url = "sqlite:///" + os.path.join(self.folder, "queue.sqlite3")
+
+    def create_crawler(self, session, storage, queue=None, **kwargs):
+        if queue is None:
+            queue = open_work_queue(self.queue_url)
+            self.addCleanup(queue.close)
+        token_pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        return DistributedCrawler(queue, storage, sleep_duration=0, poll_interval=0.05, session=session, token_pool=token_pool, **kwargs)
+
+    def run_crawlers(self, crawlers):
+        for crawler in crawlers:
+            crawler.start()
+        for crawler in crawlers:
+            self.assertTrue(crawler.wait(timeout=10))
+            crawler.stop()
+
+    def test_processes_share_the_work(self):
+        queue = open_work_queue(self.queue_url)
+        self.addCleanup(queue.close)
+        self.assertEqual(seed(queue, ["spacex"], max_result=3), 1)
+        self.assertEqual(seed(queue, ["spacex"], max_result=3), 0)
+
+        session = FakeTwitter(search_routes([["1", "2"], ["3", "4"]]))
+        storage = MemoryStorage()
+        # two "processes", each with it's own connection to the queue
+        self.run_crawlers([self.create_crawler(session, storage, max_thread=2) for _ in range(2)])
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2", "3"])
+        self.assertEqual(storage.tweets["3"]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+        for tweet_id in ["1", "2", "3"]:
+            self.assertEqual(session.calls.count(("conversation", tweet_id, None)), 1)
+        self.assertEqual(queue.stats(), {"pending": 0, "leased": 0, "done": 5, "failed": 0})
+
+    def test_search_ends_before_max_result(self):
+        queue = RedisWorkQueue(FakeRedis())
+        seed(queue, "spacex", max_result=10)
+        session = FakeTwitter(search_routes([["1", "2"], ["3"]]))
+        storage = MemoryStorage()
+
+        self.run_crawlers([self.create_crawler(session, storage, queue=queue, max_thread=2)])
+
+        self.assertEqual(sorted(storage.tweets), ["1", "2", "3"])
+        self.assertEqual(queue.stats(), {"pending": 0, "leased": 0, "done": 6, "failed": 0})
+
+    def test_continue_a_conversation_left_halfway(self):
+        queue = RedisWorkQueue(FakeRedis())
+        queue.put(CONVERSATION, conversation_task_id("1"), {"keyword": "spacex", "tweet_id": "1", "cursor": "p2", "timelines": 1, "started": True})
+        storage = MemoryStorage()
+        storage.save_tweet({"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1", "reply 1-1"]]})
+        session = FakeTwitter(search_routes([["1"]]))
+
+        self.run_crawlers([self.create_crawler(session, storage, queue=queue, max_thread=1)])
+
+        self.assertEqual(storage.tweets["1"]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+        self.assertNotIn(("conversation", "1", None), session.calls)
+
+    def test_flush_before_saving_the_progress(self):
+        memory = MemoryStorage()
+        saved = []
+
+        class CheckedQueue(RedisWorkQueue):
+            def extend(self, lease, lease_duration, payload=None):
+                # the timelines counted by the payload are in the wrapped storage
+                saved.append((payload["timelines"], len(memory.tweets[payload["tweet_id"]]["timelines"])))
+                return super().extend(lease, lease_duration, payload)
+
+        queue = CheckedQueue(FakeRedis())
+        seed(queue, "spacex", max_result=1)
+        # a write-behind storage holding the writes longer than the crawl
+        storage = BufferedStorage(memory, flush_interval=60)
+
+        self.run_crawlers([self.create_crawler(FakeTwitter(search_routes([["1"]])), storage, queue=queue, max_thread=1)])
+
+        self.assertEqual(saved, [(1, 1), (2, 2)])
+
+    def test_deleted_tweet_is_failed(self):
+        queue = open_work_queue(self.queue_url)
+        self.addCleanup(queue.close)
+        seed(queue, "spacex", max_result=2)
+        routes = search_routes([["1", "2"]])
+        routes[("conversation", "1", None)] = 404
+        storage = MemoryStorage()
+
+        self.run_crawlers([self.create_crawler(FakeTwitter(routes), storage, max_thread=1)])
+
+        self.assertEqual(sorted(storage.tweets), ["2"])
+        self.assertEqual(queue.stats()["failed"], 1)
+
+    def test_route_keywords(self):
+        queue = RedisWorkQueue(FakeRedis())
+        seed(queue, ["spacex", "nasa"], max_result=1)
+        storages = {"spacex": MemoryStorage(), "nasa": MemoryStorage()}
+        session = FakeTwitter(search_routes([["1", "2"]]))
+
+        self.run_crawlers([self.create_crawler(session, storages.__getitem__, queue=queue, max_thread=2)])
+
+        # the tweet is found by both keywords and downloaded once
+        self.assertEqual(session.calls.count(("conversation", "1", None)), 1)
+        self.assertEqual(len(storages["spacex"].tweets) + len(storages["nasa"].tweets), 1)
+
+    def test_duck_typed_storage(self):
+        queue = RedisWorkQueue(FakeRedis())
+        seed(queue, "spacex", max_result=1)
+        storage = DuckStorage()
+
+        self.run_crawlers([self.create_crawler(FakeTwitter(search_routes([["1"]])), storage, queue=queue, max_thread=1)])
+
+        self.assertEqual(sorted(storage.tweets), ["1"])
+        self.assertTrue(storage.closed)
+
+    def test_unknown_queue_url(self):
+        with self.assertRaises(ValueError):
+            open_work_queue("amqp://localhost")
+
+
+if __name__ == '__main__':
+    unittest.main()
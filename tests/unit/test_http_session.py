@@ -0,0 +1,71 @@
+import unittest
+
+import threading
+import json
+
+from tweet_crawler import http_session
+from tweet_crawler import tweet_fetcher
+from tweet_crawler.http_session import HttpSession
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.text = json.dumps(body) if body is not None else ""
+        self.content = self.text.encode("utf-8")
+        self.headers = {}
+
+
+class FakeSession:
+    def __init__(self, body):
+        self.body = body
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(("GET", url))
+        return FakeResponse(body=self.body)
+
+    def post(self, url, **kwargs):
+        self.calls.append(("POST", url))
+        return FakeResponse(body=self.body)
+
+
+class TestHttpSession(unittest.TestCase):
+    def test_adapter_shared_between_threads(self):
+        session = HttpSession(pool_size=4, pool_sizes={"api.twitter.com": 16})
+        adapters = []
+
+        def worker():
+            s = session._get_session("https://api.twitter.com/2/search/adaptive.json")
+            adapters.append(s.get_adapter("https://api.twitter.com/2/search/adaptive.json"))
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+
+        self.assertEqual(len(set(id(a) for a in adapters)), 1)
+        self.assertEqual(adapters[0]._pool_maxsize, 16)
+        self.assertEqual(session._get_adapter("twitter.com")._pool_maxsize, 4)
+        session.close()
+
+    def test_inject_session_per_call(self):
+        fake = FakeSession({"guest_token": "123"})
+        token = tweet_fetcher.fetch_guest_token("access", "csrf", session=fake)
+        self.assertEqual(token, "123")
+        self.assertEqual(fake.calls, [("POST", "https://api.twitter.com/1.1/guest/activate.json")])
+
+    def test_inject_default_session(self):
+        fake = FakeSession({"timeline": {}})
+        previous = http_session.set_default_session(fake)
+        try:
+            result = tweet_fetcher.fetch_tweet("1", "access", "csrf", "guest")
+        finally:
+            http_session.set_default_session(previous)
+        self.assertEqual(result, {"timeline": {}})
+        self.assertEqual(fake.calls[0][1], "https://api.twitter.com/2/timeline/conversation/1.json")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+import asyncio
+from unittest import mock
+
+from tweet_crawler.tweet_parser import Tweet
+from tweet_crawler.async_parser import AsyncTweet
+from tests.fake_twitter import FakeTwitter, TOKENS, tweet_page, module_page
+from tests.unit.test_module_workers import AsyncSlowTwitter
+
+
+def routes(pages=3):
+    """a conversation of `pages` pages of two timelines, the first expanded by a module page
+    """
+    routes = {}
+    for page in range(pages):
+        cursor = "p{}".format(page) if page > 0 else None
+        next_cursor = "p{}".format(page + 1) if page + 1 < pages else None
+        modules = [([("{}-{}".format(page, i), "reply {}-{}".format(page, i))], "m{}".format(page) if i == 0 else None) for i in range(2)]
+        routes[("conversation", "1", cursor)] = tweet_page(main=("1", "tweet 1") if page == 0 else None, modules=modules, next_cursor=next_cursor)
+        routes[("conversation", "1", "m{}".format(page))] = module_page([("{}-0-1".format(page), "reply {}-0-1".format(page))])
+    return routes
+
+
+def texts(pages):
+    return [[timeline.texts for timeline in timelines] for timelines in pages]
+
+
+class TestIterTimelines(unittest.TestCase):
+    def test_every_page(self):
+        session = FakeTwitter(routes())
+        tweet = Tweet("1", session=session, **TOKENS)
+        pages = tweet.iter_timelines()
+
+        first = next(pages)
+        self.assertEqual(tweet.record.to_dict(), {"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 0-0", "reply 0-0-1"], ["reply 0-1"]]})
+        self.assertEqual(texts([first] + list(pages)), [
+            [["reply 0-0", "reply 0-0-1"], ["reply 0-1"]],
+            [["reply 1-0", "reply 1-0-1"], ["reply 1-1"]],
+            [["reply 2-0", "reply 2-0-1"], ["reply 2-1"]],
+        ])
+        self.assertIsNone(tweet.get_next_cursor())
+
+    def test_pages_are_fetched_lazily(self):
+        session = FakeTwitter(routes())
+        pages = Tweet("1", session=session, **TOKENS).iter_timelines()
+        next(pages)
+        self.assertNotIn(("conversation", "1", "p1"), session.calls)
+        next(pages)
+        self.assertIn(("conversation", "1", "p1"), session.calls)
+
+    def test_max_timelines(self):
+        session = FakeTwitter(routes())
+        tweet = Tweet("1", session=session, **TOKENS)
+        self.assertEqual(texts(tweet.iter_timelines(max_timelines=3, timeline_length=1)), [[["reply 0-0"], ["reply 0-1"]], [["reply 1-0"]]])
+        # the last page is never fetched
+        self.assertNotIn(("conversation", "1", "p2"), session.calls)
+
+    def test_main_tweet_without_timelines(self):
+        tweet = Tweet("1", session=FakeTwitter(routes()), **TOKENS)
+        self.assertEqual(texts(tweet.iter_timelines(max_timelines=0)), [[]])
+        self.assertEqual(tweet.record.to_dict()["tweet"], "tweet 1")
+
+    def test_resume(self):
+        session = FakeTwitter(routes())
+        tweet = Tweet("1", session=session, **TOKENS)
+        tweet.set_next_cursor("p2")
+        self.assertEqual(texts(tweet.iter_timelines()), [[["reply 2-0", "reply 2-0-1"], ["reply 2-1"]]])
+        self.assertNotIn(("conversation", "1", None), session.calls)
+
+    def test_single_parser(self):
+        tweet = Tweet("1", session=FakeTwitter(routes()), **TOKENS)
+        with mock.patch.object(Tweet, "__init__", side_effect=AssertionError("a new parser is created")):
+            self.assertEqual(len(list(tweet.iter_timelines())), 3)
+
+    def test_async(self):
+        tweet = AsyncTweet("1", session=AsyncSlowTwitter(FakeTwitter(routes())), **TOKENS)
+
+        async def collect():
+            return [timelines async for timelines in tweet.iter_timelines(max_timelines=5)]
+
+        self.assertEqual([len(timelines) for timelines in asyncio.run(collect())], [2, 2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
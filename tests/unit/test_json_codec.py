@@ -0,0 +1,65 @@
+import unittest
+
+import os
+import json
+import shutil
+import tempfile
+
+from tweet_crawler import json_codec
+from tweet_crawler.storages.json_storage import JsonStorage
+
+
+DOCUMENT = {"tweet": "ロケット 🚀 \"quoted\"", "tweet_id": "1", "timelines": [["reply 1", "reply 1-1"], []]}
+
+
+class TestJsonCodec(unittest.TestCase):
+    def codecs(self):
+        codecs = [json_codec.JsonCodec()]
+        try:
+            codecs.append(json_codec.OrjsonCodec())
+        except ImportError:
+            pass
+        return codecs
+
+    def test_round_trip(self):
+        for codec in self.codecs():
+            data = codec.dumps(DOCUMENT)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(json.loads(data.decode("utf-8")), DOCUMENT)
+            self.assertEqual(codec.loads(data), DOCUMENT)
+            self.assertEqual(codec.loads(json.dumps(DOCUMENT)), DOCUMENT)
+
+    def test_same_bytes(self):
+        self.assertEqual(len({codec.dumps(DOCUMENT) for codec in self.codecs()}), 1)
+
+    def test_broken_document(self):
+        for codec in self.codecs():
+            with self.assertRaises(ValueError):
+                codec.loads(b'{"tweet": ')
+
+    def test_get_codec(self):
+        self.assertEqual(json_codec.get_codec("json").name, "json")
+        with self.assertRaises(ValueError):
+            json_codec.get_codec("yaml")
+
+    def test_set_codec(self):
+        previous = json_codec.current_codec()
+        self.addCleanup(json_codec.set_codec, previous.name)
+        self.assertEqual(json_codec.set_codec("json").name, "json")
+        self.assertEqual(json_codec.loads(json_codec.dumps(DOCUMENT)), DOCUMENT)
+
+    def test_json_storage(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        storage = JsonStorage(folder)
+        storage.save_tweet(dict(DOCUMENT, timelines=[["reply 1"]]))
+        storage.append_timeline("1", [["reply 2"]])
+
+        with open(os.path.join(folder, "1.json"), "r", encoding="utf-8") as f:
+            obj = json.load(f)
+        self.assertEqual(obj["tweet"], DOCUMENT["tweet"])
+        self.assertEqual(obj["timelines"], [["reply 1"], ["reply 2"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+import os
+import shutil
+import tempfile
+
+from crawler import CrawlerManager
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.search_prefetcher import SearchPrefetcher
+from tweet_crawler.keyword_scheduler import KeywordScheduler, KeywordTask, load_keywords, to_keyword_tasks
+from tests.fake_twitter import FakeTwitter, MemoryStorage
+from tests.unit.test_crawler_manager import search_routes
+from tests.unit.test_search_prefetcher import FakeSearch
+
+
+class TestKeywordScheduler(unittest.TestCase):
+    def create(self, keywords):
+        scheduler = KeywordScheduler()
+        self.addCleanup(scheduler.close)
+        for keyword, weight, ids in keywords:
+            prefetcher = SearchPrefetcher(FakeSearch(), condition=scheduler.condition)
+            prefetcher.restore(None, ids, len(ids))
+            scheduler.add(keyword, prefetcher, weight)
+        return scheduler
+
+    def test_load_keywords(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        path = os.path.join(folder, "keywords.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# topics\nspacex\n\nstarship\t2\nfalcon 9\t1\t500\n")
+
+        tasks = load_keywords(path)
+        self.assertEqual([task.keyword for task in tasks], ["spacex", "starship", "falcon 9"])
+        self.assertEqual([task.weight for task in tasks], [1, 2, 1])
+        self.assertEqual([task.max_result for task in tasks], [None, None, 500])
+
+    def test_to_keyword_tasks(self):
+        self.assertEqual([task.keyword for task in to_keyword_tasks("spacex")], ["spacex"])
+        self.assertEqual([task.weight for task in to_keyword_tasks(["a", KeywordTask("b", weight=3)])], [1, 3])
+        with self.assertRaises(ValueError):
+            to_keyword_tasks(["a", "a"])
+        with self.assertRaises(ValueError):
+            KeywordTask("a", weight=0)
+
+    def test_weighted_round_robin(self):
+        scheduler = self.create([("a", 2, [str(i) for i in range(10)]), ("b", 1, [str(i) for i in range(10)])])
+        keywords = [scheduler.get(timeout=1)[0] for _ in range(9)]
+        self.assertEqual(keywords.count("a"), 6)
+        self.assertEqual(keywords.count("b"), 3)
+        # smooth, never three of "a" in a row
+        self.assertNotIn("a,a,a", ",".join(keywords))
+
+    def test_idle_keyword_gives_its_share(self):
+        scheduler = self.create([("a", 1, ["1", "2", "3"]), ("b", 5, [])])
+        self.assertEqual([scheduler.get(timeout=1) for _ in range(3)], [("a", "1"), ("a", "2"), ("a", "3")])
+
+    def test_every_search_exhausted(self):
+        scheduler = KeywordScheduler()
+        self.addCleanup(scheduler.close)
+        for keyword in ["a", "b"]:
+            scheduler.add(keyword, SearchPrefetcher(FakeSearch(), max_result=2, condition=scheduler.condition))
+        scheduler.start()
+
+        items = []
+        while True:
+            item = scheduler.get(timeout=5)
+            if item is None:
+                break
+            items.append(item)
+        self.assertEqual(sorted(items), [("a", "0"), ("a", "1"), ("b", "0"), ("b", "1")])
+        self.assertEqual(scheduler.fetched_ids, 4)
+
+    def test_crawler_routes_keywords(self):
+        session = FakeTwitter(search_routes([["1", "2"]]))
+        token_pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        storages = {"spacex": MemoryStorage(), "nasa": MemoryStorage()}
+        keywords = [KeywordTask("spacex", max_result=1), KeywordTask("nasa", weight=2)]
+
+        mgr = CrawlerManager(keywords, storages.__getitem__, max_result=2, max_thread=2, sleep_duration=0, progress_interval=0, session=session, token_pool=token_pool)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+
+        self.assertEqual(sorted(storages["spacex"].tweets), ["1"])
+        self.assertEqual(sorted(storages["nasa"].tweets), ["1", "2"])
+        self.assertEqual(mgr.fetched_ids, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+
+import time
+import asyncio
+
+from tweet_crawler.tweet_parser import Tweet
+from tweet_crawler.async_parser import AsyncTweet
+from tests.fake_twitter import FakeTwitter, TOKENS, tweet_page, module_page
+
+
+DELAY = 0.1
+
+
+def module_routes(count):
+    """a page with `count` modules, each expanded by two more pages
+    """
+    modules = [([("r{}".format(i), "reply {}".format(i))], "m{}".format(i)) for i in range(count)]
+    routes = {("conversation", "1", None): tweet_page(main=("1", "tweet 1"), modules=modules)}
+    for i in range(count):
+        routes[("conversation", "1", "m{}".format(i))] = module_page([("r{}-1".format(i), "reply {}-1".format(i))], cursor="n{}".format(i))
+        routes[("conversation", "1", "n{}".format(i))] = module_page([("r{}-2".format(i), "reply {}-2".format(i))])
+    return routes
+
+
+def expected_timelines(count):
+    return [["reply {}".format(i), "reply {}-1".format(i), "reply {}-2".format(i)] for i in range(count)]
+
+
+class SlowTwitter(FakeTwitter):
+    """delay every module page by `DELAY` seconds. later modules answer first.
+    """
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        cursor = dict(params or []).get("cursor")
+        if cursor is not None:
+            time.sleep(DELAY * (1 if cursor[1:] == "0" else 0.5))
+        return super().get(url, headers=headers, params=params, **kwargs)
+
+
+class AsyncSlowTwitter:
+    def __init__(self, fake):
+        self.fake = fake
+
+    async def get(self, url, params=None, **kwargs):
+        cursor = dict(params or []).get("cursor")
+        if cursor is not None:
+            await asyncio.sleep(DELAY * (1 if cursor[1:] == "0" else 0.5))
+        return self.fake.get(url, params=params, **kwargs)
+
+
+class TestModuleWorkers(unittest.TestCase):
+    def test_serial(self):
+        tweet = Tweet("1", session=FakeTwitter(module_routes(3)), **TOKENS)
+        self.assertEqual(tweet.get_main_tweet()["timelines"], expected_timelines(3))
+
+    def test_concurrent_modules_keep_order(self):
+        session = SlowTwitter(module_routes(4))
+        tweet = Tweet("1", session=session, module_workers=4, **TOKENS)
+
+        started = time.time()
+        out = tweet.get_main_tweet()
+        elapsed = time.time() - started
+
+        self.assertEqual(out["tweet"], "tweet 1")
+        self.assertEqual(out["timelines"], expected_timelines(4))
+        # 4 modules of 2 pages each: 2 rounds instead of 8
+        self.assertLess(elapsed, DELAY * 4)
+
+    def test_timeline_length(self):
+        tweet = Tweet("1", session=FakeTwitter(module_routes(3)), module_workers=2, **TOKENS)
+        self.assertEqual(tweet.get_main_tweet(timeline_length=2)["timelines"], [t[:2] for t in expected_timelines(3)])
+
+    def test_async_concurrent_modules_keep_order(self):
+        session = AsyncSlowTwitter(FakeTwitter(module_routes(4)))
+        tweet = AsyncTweet("1", session=session, module_workers=4, **TOKENS)
+
+        started = time.time()
+        out = asyncio.run(tweet.get_main_tweet())
+        elapsed = time.time() - started
+
+        self.assertEqual(out["timelines"], expected_timelines(4))
+        self.assertLess(elapsed, DELAY * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+
+import json
+import asyncio
+
+from tweet_crawler.tweet_parser import Tweet
+from tweet_crawler.async_parser import AsyncTweet
+from tweet_crawler.parse_pool import ParsePool, parse_conversation_page, parse_module_page
+from tweet_crawler.records import TimelineRecord
+from tests.fake_twitter import FakeTwitter, TOKENS, tweet_page, module_page, conversation_routes
+from tests.unit.test_module_workers import AsyncSlowTwitter, module_routes, expected_timelines
+
+
+class TestParsePages(unittest.TestCase):
+    def test_conversation_page(self):
+        page = tweet_page(main=("1", "tweet 1", "u1"), modules=[([("2", "reply 1", "u2"), ("3", "reply 1-1", "u1")], "m1"), ([("4", "reply 2")], None)], next_cursor="p2")
+        self.assertEqual(parse_conversation_page(json.dumps(page).encode()), {
+            "tweet": "tweet 1",
+            "author_id": "u1",
+            "modules": [
+                [TimelineRecord(["2", "3"], ["reply 1", "reply 1-1"], ["u2", "u1"]), "m1"],
+                [TimelineRecord(["4"], ["reply 2"]), None],
+            ],
+            "next_cursor": "p2",
+        })
+
+    def test_missing_text(self):
+        page = tweet_page(modules=[([("2", "reply 1")], None)])
+        del page["globalObjects"]["tweets"]["2"]
+        self.assertEqual(parse_conversation_page(json.dumps(page).encode())["modules"], [[TimelineRecord(["2"], ["[ERROR]"]), None]])
+
+    def test_module_page(self):
+        content = json.dumps(module_page([("2", "reply 1-1")], cursor="n1")).encode()
+        self.assertEqual(parse_module_page(content), (TimelineRecord(["2"], ["reply 1-1"]), "n1"))
+
+
+class TestParsePool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ParsePool(processes=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_same_output_as_in_thread(self):
+        routes = conversation_routes("1")
+        results = []
+        for parse_pool in [None, self.pool]:
+            tweet = Tweet("1", session=FakeTwitter(routes), parse_pool=parse_pool, **TOKENS)
+            out = tweet.get_main_tweet()
+            out["timelines"] += tweet.get_next_timelines()
+            self.assertIsNone(tweet.get_next_cursor())
+            results.append(out)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1]["timelines"], [["reply 1", "reply 1-1"], ["reply 2"]])
+
+    def test_concurrent_modules(self):
+        tweet = Tweet("1", session=FakeTwitter(module_routes(3)), module_workers=3, parse_pool=self.pool, **TOKENS)
+        self.assertEqual(tweet.get_main_tweet(timeline_length=2)["timelines"], [t[:2] for t in expected_timelines(3)])
+
+    def test_async(self):
+        session = AsyncSlowTwitter(FakeTwitter(module_routes(3)))
+        tweet = AsyncTweet("1", session=session, module_workers=3, parse_pool=self.pool, **TOKENS)
+        out = asyncio.run(tweet.get_main_tweet())
+        self.assertEqual(out["tweet"], "tweet 1")
+        self.assertEqual(out["timelines"], expected_timelines(3))
+
+
+if __name__ == '__main__':
+    unittest.main()
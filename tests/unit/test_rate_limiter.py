@@ -0,0 +1,85 @@
+import unittest
+
+import time
+
+from tweet_crawler.rate_limiter import RateLimiter
+from tweet_crawler.token_pool import TokenPool, CONVERSATION, SEARCH
+from tweet_crawler.tweet_parser import Tweet
+from tests.fake_twitter import FakeTwitter, FakeResponse, conversation_routes
+
+
+CONVERSATION_URL = "https://api.twitter.com/2/timeline/conversation/1.json"
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_unknown_limit_is_not_delayed(self):
+        limiter = RateLimiter()
+        for _ in range(5):
+            self.assertEqual(limiter.reserve(CONVERSATION, "gt-1"), 0)
+
+    def test_spread_remaining_until_reset(self):
+        limiter = RateLimiter()
+        limiter.update(CONVERSATION, "gt-1", 10, time.time() + 10)
+
+        self.assertEqual(limiter.reserve(CONVERSATION, "gt-1"), 0)
+        delays = [limiter.reserve(CONVERSATION, "gt-1") for _ in range(3)]
+        # one request per second, reserved back to back
+        for expected, delay in zip([1, 2, 3], delays):
+            self.assertAlmostEqual(delay, expected, delta=0.1)
+
+        # every endpoint and guest token has it's own bucket
+        self.assertEqual(limiter.reserve(CONVERSATION, "gt-2"), 0)
+        self.assertEqual(limiter.reserve(SEARCH, "gt-1"), 0)
+
+    def test_wait_for_reset_when_used_up(self):
+        limiter = RateLimiter()
+        limiter.update(CONVERSATION, "gt-1", 0, time.time() + 30)
+        self.assertAlmostEqual(limiter.reserve(CONVERSATION, "gt-1"), 30, delta=0.1)
+
+        limiter.update(CONVERSATION, "gt-1", 0, time.time() - 1)
+        self.assertEqual(limiter.reserve(CONVERSATION, "gt-1"), 0)
+
+    def test_burst(self):
+        limiter = RateLimiter(burst=3)
+        limiter.update(CONVERSATION, "gt-1", 100, time.time() + 100)
+        self.assertEqual([limiter.reserve(CONVERSATION, "gt-1") for _ in range(3)], [0, 0, 0])
+        self.assertGreater(limiter.reserve(CONVERSATION, "gt-1"), 0)
+
+    def test_observe(self):
+        limiter = RateLimiter(retry_after=60)
+        reset = time.time() + 20
+        limiter.observe(FakeResponse(200, headers={"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset)}, url=CONVERSATION_URL, request_headers={"x-guest-token": "gt-1"}))
+        self.assertAlmostEqual(limiter.reserve(CONVERSATION, "gt-1"), 20, delta=0.1)
+
+        limiter.observe(FakeResponse(429, url=CONVERSATION_URL, request_headers={"x-guest-token": "gt-2"}))
+        self.assertAlmostEqual(limiter.reserve(CONVERSATION, "gt-2"), 60, delta=0.1)
+
+        # responses without a guest token are ignored
+        limiter.observe(FakeResponse(429, url=CONVERSATION_URL))
+        self.assertEqual(limiter.reserve(CONVERSATION, None), 0)
+
+    def test_observe_malformed_headers(self):
+        limiter = RateLimiter(retry_after=60)
+        limiter.observe(FakeResponse(200, headers={"x-rate-limit-remaining": "n/a", "x-rate-limit-reset": "n/a"}, url=CONVERSATION_URL, request_headers={"x-guest-token": "gt-1"}))
+        limiter.observe(FakeResponse(429, headers={"x-rate-limit-reset": "n/a"}, url=CONVERSATION_URL, request_headers={"x-guest-token": "gt-1"}))
+        self.assertEqual(limiter.reserve(CONVERSATION, "gt-1"), 0)
+
+    def test_token_pool_paces_requests(self):
+        reset = time.time() + 1
+        session = FakeTwitter(conversation_routes("1"), headers={"x-rate-limit-remaining": "4", "x-rate-limit-reset": str(reset)})
+        limiter = RateLimiter()
+        session.add_response_hook(limiter.observe)
+        pool = TokenPool(size=1, access_token="access", session=session, rate_limiter=limiter)
+        self.addCleanup(pool.close)
+        pool.fill()
+
+        start = time.time()
+        tweet = Tweet("1", None, None, None, session=session, token_pool=pool)
+        tweet.get_main_tweet()
+        tweet.get_next_timelines()
+        # 4 requests left within a second: the next requests are spaced
+        self.assertGreater(time.time() - start, 0.2)
+
+
+if __name__ == '__main__':
+    unittest.main()
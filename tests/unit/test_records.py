@@ -0,0 +1,69 @@
+import unittest
+
+import pickle
+
+from tweet_crawler.records import ConversationRecord, TimelineRecord, ReplyRecord
+from tweet_crawler.tweet_parser import Tweet
+from tests.fake_twitter import FakeTwitter, TOKENS, tweet_page, module_page
+
+
+def routes():
+    return {
+        ("conversation", "1", None): tweet_page(
+            main=("1", "tweet 1", "u1"),
+            modules=[([("2", "reply 1", "u2")], "m1")],
+            next_cursor="p2"),
+        ("conversation", "1", "m1"): module_page([("3", "reply 1-1", "u1")]),
+        ("conversation", "1", "p2"): tweet_page(modules=[([("4", "reply 2", "u3")], None)]),
+    }
+
+
+class TestRecords(unittest.TestCase):
+    def test_timeline(self):
+        timeline = TimelineRecord()
+        timeline.append("2", "reply 1", "u2")
+        timeline.extend(TimelineRecord(["3", "4"], ["reply 1-1", "reply 1-2"], ["u1", None]))
+        self.assertEqual(len(timeline), 3)
+        self.assertEqual(timeline[1], ReplyRecord("3", "reply 1-1", "u1"))
+        timeline.truncate(2)
+        self.assertEqual(list(timeline), [ReplyRecord("2", "reply 1", "u2"), ReplyRecord("3", "reply 1-1", "u1")])
+
+    def test_no_instance_dict(self):
+        for record in [ReplyRecord("1", "text"), TimelineRecord(), ConversationRecord("1")]:
+            self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_to_dict_shares_the_texts(self):
+        timeline = TimelineRecord(["2"], ["reply 1"], ["u2"])
+        record = ConversationRecord("1", "tweet 1", "u1", [timeline])
+        parsed_tweet = record.to_dict()
+        self.assertEqual(parsed_tweet, {"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1"]]})
+        self.assertIs(parsed_tweet["timelines"][0], timeline.texts)
+
+    def test_from_dict(self):
+        parsed_tweet = {"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1", "reply 1-1"]]}
+        record = ConversationRecord.from_dict(parsed_tweet)
+        self.assertEqual(record.to_dict(), parsed_tweet)
+        self.assertEqual(record.timelines[0][0], ReplyRecord(None, "reply 1"))
+
+    def test_pickle(self):
+        record = ConversationRecord("1", "tweet 1", "u1", [TimelineRecord(["2"], ["reply 1"], ["u2"])])
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+
+class TestTweetRecords(unittest.TestCase):
+    def test_get_main_record(self):
+        for streaming in [False, True]:
+            tweet = Tweet("1", session=FakeTwitter(routes()), streaming=streaming, **TOKENS)
+            record = tweet.get_main_record()
+            self.assertEqual(record, ConversationRecord("1", "tweet 1", "u1", [TimelineRecord(["2", "3"], ["reply 1", "reply 1-1"], ["u2", "u1"])]))
+            self.assertEqual(tweet.get_next_timeline_records(), [TimelineRecord(["4"], ["reply 2"], ["u3"])])
+            self.assertIsNone(tweet.get_next_timeline_records())
+
+    def test_get_main_tweet_is_unchanged(self):
+        tweet = Tweet("1", session=FakeTwitter(routes()), **TOKENS)
+        self.assertEqual(tweet.get_main_tweet(timeline_length=1), {"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1"]]})
+        self.assertEqual(tweet.get_next_timelines(), [["reply 2"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+
+import time
+
+from tweet_crawler import retry
+from tweet_crawler.retry import RetryPolicy, CircuitBreaker
+from tweet_crawler.token_pool import TokenPool, CONVERSATION
+from tweet_crawler.tweet_parser import Tweet, TwitterSearch
+from tests.fake_twitter import FakeTwitter, FakeResponse, conversation_routes
+
+
+class TestRetry(unittest.TestCase):
+    def test_error_from_response(self):
+        reset = time.time() + 60
+        error = retry.error_from_response(FakeResponse(429, headers={"x-rate-limit-reset": str(reset)}))
+        self.assertIsInstance(error, retry.RateLimitError)
+        self.assertAlmostEqual(error.retry_after, reset)
+        self.assertIsNone(retry.error_from_response(FakeResponse(429, headers={"x-rate-limit-reset": "n/a"})).retry_after)
+        self.assertIsInstance(retry.error_from_response(FakeResponse(401)), retry.AuthError)
+        self.assertIsInstance(retry.error_from_response(FakeResponse(403)), retry.AuthError)
+        self.assertIsInstance(retry.error_from_response(FakeResponse(503)), retry.TransientError)
+        self.assertFalse(retry.error_from_response(FakeResponse(404)).retryable)
+        self.assertFalse(retry.error_from_response(FakeResponse(400)).retryable)
+
+    def test_backoff(self):
+        policy = RetryPolicy(base_delay=1, max_delay=5)
+        for attempt in range(10):
+            delay = policy.backoff(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(5, 2 ** attempt))
+
+    def test_retry_transient_errors(self):
+        policy = RetryPolicy(max_retries=2, base_delay=0.01)
+        results = [retry.TransientError("503"), OSError("reset"), "ok"]
+
+        def fetch():
+            result = results.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        self.assertEqual(policy.call(CONVERSATION, fetch), "ok")
+
+        def failing():
+            raise retry.TransientError("503")
+        self.assertRaises(retry.TransientError, policy.call, CONVERSATION, failing)
+
+    def test_not_found_is_not_retried(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            raise retry.NotFoundError("404", 404)
+
+        self.assertRaises(retry.NotFoundError, RetryPolicy(max_retries=3, base_delay=0.01).call, CONVERSATION, fetch)
+        self.assertEqual(len(calls), 1)
+
+    def test_circuit_breaker(self):
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10)
+        now = time.time()
+        breaker.record_failure(now)
+        self.assertEqual(breaker.wait_time(now), 0)
+        breaker.record_failure(now)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertAlmostEqual(breaker.wait_time(now + 4), 6)
+
+        # a single probe after the recovery timeout
+        self.assertEqual(breaker.wait_time(now + 10), 0)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertGreater(breaker.wait_time(now + 10), 0)
+        breaker.record_failure(now + 10)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        self.assertEqual(breaker.wait_time(now + 20), 0)
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.wait_time(now + 20), 0)
+
+    def test_open_circuit_waits(self):
+        policy = RetryPolicy(max_retries=0, failure_threshold=1, recovery_timeout=0.2)
+
+        def failing():
+            raise retry.TransientError("503")
+        self.assertRaises(retry.TransientError, policy.call, CONVERSATION, failing)
+
+        started = time.time()
+        self.assertEqual(policy.call(CONVERSATION, lambda: "ok"), "ok")
+        self.assertGreaterEqual(time.time() - started, 0.1)
+
+        policy.breaker(CONVERSATION).record_failure()
+        policy.close()
+        self.assertRaises(retry.CircuitOpenError, policy.call, CONVERSATION, lambda: "ok")
+
+    def test_tweet_recovers_from_errors(self):
+        routes = conversation_routes("1")
+        routes[("conversation", "1", None)] = [503, routes[("conversation", "1", None)]]
+        session = FakeTwitter(routes)
+        tweet = Tweet("1", "access", "csrf", "guest", session=session, retry_policy=RetryPolicy(base_delay=0.01))
+        self.assertEqual(tweet.get_main_tweet()["tweet"], "tweet 1")
+
+        # without a policy the error is raised instead of parsing None
+        session = FakeTwitter({("conversation", "1", None): 503, ("search", None): 503})
+        self.assertRaises(retry.TransientError, Tweet("1", "access", "csrf", "guest", session=session).get_main_tweet)
+        self.assertRaises(retry.TransientError, TwitterSearch("spacex", "access", "csrf", "guest", session=session).get_next_ids)
+        self.assertRaises(retry.FetchError, Tweet("1", None, None, None)._load_source, None)
+
+    def test_auth_error_replaces_token(self):
+        routes = conversation_routes("1")
+        routes[("conversation", "1", None)] = [403, routes[("conversation", "1", None)]]
+        session = FakeTwitter(routes)
+        pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(pool.close)
+        pool.fill()
+
+        tweet = Tweet("1", None, None, None, session=session, token_pool=pool, retry_policy=RetryPolicy(base_delay=0.01))
+        self.assertEqual(tweet.get_main_tweet()["tweet"], "tweet 1")
+        self.assertEqual([t.guest_token for t in pool.tokens()], ["gt-2"])
+
+    def test_rate_limit_parks_token(self):
+        reset = time.time() + 60
+        session = FakeTwitter({("conversation", "1", None): 429}, headers={"x-rate-limit-reset": str(reset)})
+        pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(pool.close)
+        pool.fill()
+
+        self.assertRaises(retry.RateLimitError, Tweet("1", None, None, None, session=session, token_pool=pool).get_main_tweet)
+        token = pool.tokens()[0]
+        self.assertEqual(token.remaining(CONVERSATION), 0)
+        self.assertAlmostEqual(token.available_at(CONVERSATION), reset)
+
+
+if __name__ == '__main__':
+    unittest.main()
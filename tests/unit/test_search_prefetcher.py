@@ -0,0 +1,127 @@
+import unittest
+
+import time
+import threading
+
+from tweet_crawler.search_prefetcher import SearchPrefetcher
+
+
+class FakeSearch:
+    """return pages of `page_size` increasing ids
+    """
+
+    keyword = "spacex"
+
+    def __init__(self, page_size=5, fail_first=False):
+        self.page_size = page_size
+        self.pages = 0
+        self.next_cursor = None
+        self.fail_first = fail_first
+
+    def get_next_ids(self):
+        if self.fail_first:
+            self.fail_first = False
+            raise RuntimeError("search failed")
+        start = self.pages * self.page_size
+        self.pages += 1
+        self.next_cursor = "scroll:{}".format(self.pages)
+        return [str(i) for i in range(start, start + self.page_size)]
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSearchPrefetcher(unittest.TestCase):
+    def create(self, search, **kwargs):
+        prefetcher = SearchPrefetcher(search, **kwargs)
+        self.addCleanup(prefetcher.close)
+        prefetcher.start()
+        return prefetcher
+
+    def test_max_result(self):
+        prefetcher = self.create(FakeSearch(), max_result=12)
+        ids = []
+        while True:
+            tweet_id = prefetcher.get(timeout=5)
+            if tweet_id is None:
+                break
+            ids.append(tweet_id)
+        self.assertEqual(ids, [str(i) for i in range(12)])
+        self.assertEqual(prefetcher.fetched_ids, 12)
+
+    def test_watermarks(self):
+        search = FakeSearch()
+        prefetcher = self.create(search, prefetch_pages=10, high_watermark=10, low_watermark=3)
+
+        self.assertTrue(wait_until(lambda: prefetcher.qsize() == 10))
+        time.sleep(0.1)
+        # paused at the high watermark
+        self.assertEqual(search.pages, 2)
+
+        for _ in range(6):
+            prefetcher.get()
+        time.sleep(0.1)
+        self.assertEqual(search.pages, 2)
+
+        # resumed at the low watermark until the high watermark
+        prefetcher.get()
+        self.assertTrue(wait_until(lambda: search.pages == 4))
+        time.sleep(0.1)
+        self.assertEqual(prefetcher.qsize(), 13)
+        self.assertEqual(search.pages, 4)
+
+    def test_prefetch_pages(self):
+        search = FakeSearch()
+        prefetcher = self.create(search, prefetch_pages=2, high_watermark=100, low_watermark=0)
+        self.assertTrue(wait_until(lambda: search.pages == 2))
+        time.sleep(0.1)
+        self.assertEqual(search.pages, 2)
+
+        # the next page is fetched once the first page is consumed
+        for _ in range(5):
+            prefetcher.get()
+        self.assertTrue(wait_until(lambda: search.pages == 3))
+
+    def test_failed_search_is_retried(self):
+        prefetcher = self.create(FakeSearch(fail_first=True), max_result=1)
+        self.assertEqual(prefetcher.get(timeout=5), "0")
+
+    def test_unlimited_search_ends(self):
+        search = FakeSearch(page_size=2)
+        get_next_ids = search.get_next_ids
+
+        def end_after_two_pages():
+            if search.pages == 2:
+                # the end of the results, an empty page with the cursor it was asked
+                return []
+            return get_next_ids()
+
+        search.get_next_ids = end_after_two_pages
+        prefetcher = self.create(search)
+        self.assertEqual([prefetcher.get(timeout=5) for _ in range(5)], ["0", "1", "2", "3", None])
+        self.assertTrue(prefetcher.exhausted())
+
+    def test_failing_search_is_given_up(self):
+        search = FakeSearch()
+        search.get_next_ids = lambda: 1 / 0
+        prefetcher = self.create(search, max_failures=2, sleep_duration=0)
+        self.assertIsNone(prefetcher.get(timeout=5))
+        self.assertTrue(prefetcher.exhausted())
+
+    def test_close_wakes_consumers(self):
+        search = FakeSearch(page_size=0)
+        prefetcher = self.create(search)
+        results = []
+        consumer = threading.Thread(target=lambda: results.append(prefetcher.get()))
+        consumer.start()
+        prefetcher.close()
+        consumer.join(5)
+        self.assertEqual(results, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
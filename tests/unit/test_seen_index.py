@@ -0,0 +1,155 @@
+import unittest
+
+import os
+import shutil
+import struct
+import tempfile
+
+from crawler import CrawlerManager
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.seen_index import BloomFilter, SeenIndex, open_seen_index
+from tweet_crawler.storages.json_storage import JsonStorage
+from tests.fake_twitter import FakeTwitter, MemoryStorage
+from tests.unit.test_crawler_manager import search_routes
+
+
+class TestSeenIndex(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.index_folder = os.path.join(self.folder, "index")
+
+    def open(self, **kwargs):
+        index = SeenIndex(self.index_folder, capacity=1000, **kwargs)
+        self.addCleanup(index.close)
+        return index
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(i)
+        self.assertTrue(all(i in bloom for i in range(1000)))
+        false_positives = sum(1 for i in range(1000, 11000) if i in bloom)
+        self.assertLess(false_positives, 300)
+
+    def test_add_and_contains(self):
+        index = self.open()
+        self.assertTrue(index.is_new)
+        self.assertTrue(index.add("1585"))
+        self.assertFalse(index.add(1585))
+        self.assertIn("1585", index)
+        self.assertNotIn("1586", index)
+        self.assertEqual(index.update(["1", "2", "1585"]), 2)
+        self.assertEqual(len(index), 3)
+
+    def test_persist_across_runs(self):
+        index = SeenIndex(self.index_folder, capacity=1000)
+        index.update(str(i) for i in range(0, 100, 2))
+        index.close()
+
+        index = self.open()
+        self.assertFalse(index.is_new)
+        self.assertEqual(len(index), 50)
+        self.assertTrue(all(str(i) in index for i in range(0, 100, 2)))
+        self.assertFalse(any(str(i) in index for i in range(1, 100, 2)))
+
+    def test_compact_threshold(self):
+        index = self.open(compact_threshold=10)
+        index.update(str(i) for i in range(25))
+        self.assertEqual(os.path.getsize(index.ids_path), 20 * 8)
+        self.assertEqual(os.path.getsize(index.log_path), 5 * 8)
+        self.assertTrue(all(str(i) in index for i in range(25)))
+
+    def test_recover_log_cut_by_crash(self):
+        index = SeenIndex(self.index_folder, capacity=1000)
+        index.update(["1", "2", "3"])
+        # crash before close: the log is not compacted and the last record is cut
+        index._SeenIndex__log.write(b"\x01\x02")
+        index._SeenIndex__log.close()
+
+        index = self.open()
+        self.assertEqual(len(index), 3)
+        self.assertIn("3", index)
+        index.add("4")
+        index.close()
+        self.assertIn("4", self.open())
+
+    def test_compact_merges_sorted(self):
+        index = SeenIndex(self.index_folder, capacity=1000)
+        index.update(["10", "30", "50"])
+        index.compact()
+        index.update(["40", "20", "60"])
+        # crash after the compaction replaced the sorted file: the log still holds a merged id
+        index._SeenIndex__log.write(struct.pack("<Q", 30))
+        index._SeenIndex__log.close()
+
+        index = self.open()
+        index.compact()
+        with open(index.ids_path, "rb") as f:
+            data = f.read()
+        self.assertEqual([value for (value,) in struct.iter_unpack("<Q", data)], [10, 20, 30, 40, 50, 60])
+        self.assertEqual(len(index), 6)
+
+    def test_build_from_storage(self):
+        storage = JsonStorage(os.path.join(self.folder, "data"))
+        for tweet_id in ["11", "12"]:
+            storage.save_tweet({"tweet_id": tweet_id, "content": "", "timelines": []})
+
+        index = open_seen_index(self.index_folder, storage, capacity=1000)
+        self.assertEqual(len(index), 2)
+        index.close()
+
+        # the storage is only read the first time
+        storage.save_tweet({"tweet_id": "13", "content": "", "timelines": []})
+        index = open_seen_index(self.index_folder, storage, capacity=1000)
+        self.addCleanup(index.close)
+        self.assertEqual(len(index), 2)
+
+    def test_build_skips_foreign_files(self):
+        folder = os.path.join(self.folder, "data")
+        storage = JsonStorage(folder)
+        storage.save_tweet({"tweet_id": "11", "content": "", "timelines": []})
+        with open(os.path.join(folder, ".checkpoint.json"), "w") as f:
+            f.write("{}")
+
+        self.assertEqual(list(storage.iter_tweet_ids()), ["11"])
+        index = open_seen_index(self.index_folder, storage, capacity=1000)
+        self.addCleanup(index.close)
+        self.assertEqual(len(index), 1)
+
+    def test_build_skips_ids_not_numbers(self):
+        storage = MemoryStorage()
+        storage.tweets = {"11": {}, ".checkpoint": {}}
+        storage.iter_tweet_ids = lambda: iter(storage.tweets)
+        index = open_seen_index(self.index_folder, storage, capacity=1000)
+        self.addCleanup(index.close)
+        self.assertEqual(len(index), 1)
+
+    def run_manager(self, index, **kwargs):
+        session = FakeTwitter(search_routes([["1", "2"], ["3", "4"]]))
+        token_pool = TokenPool(size=1, access_token="access", session=session)
+        self.addCleanup(token_pool.close)
+        storage = MemoryStorage()
+        mgr = CrawlerManager("spacex", storage, max_result=2, max_thread=1, sleep_duration=0, progress_interval=0, session=session, token_pool=token_pool, seen_index=index, **kwargs)
+        mgr.start()
+        self.assertTrue(mgr.wait(timeout=10))
+        mgr.stop()
+        return storage
+
+    def test_crawler_skips_seen_tweets(self):
+        index = self.open()
+        index.update(["1", "3"])
+        storage = self.run_manager(index)
+        self.assertEqual(sorted(storage.tweets), ["2", "4"])
+        self.assertEqual(len(index), 4)
+
+    def test_crawler_refresh_seen_tweets(self):
+        index = self.open()
+        index.update(["1", "3"])
+        storage = self.run_manager(index, refresh_seen=True)
+        self.assertEqual(sorted(storage.tweets), ["1", "2"])
+        self.assertIn("2", index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+import json
+import asyncio
+from unittest import mock
+
+from tweet_crawler import stream_parser
+from tweet_crawler import parse_pool
+from tweet_crawler.tweet_parser import Tweet
+from tweet_crawler.records import TimelineRecord
+from tweet_crawler.async_parser import AsyncTweet
+from tests.fake_twitter import FakeTwitter, TOKENS, tweet_page, module_page, conversation_routes
+from tests.unit.test_module_workers import AsyncSlowTwitter, module_routes, expected_timelines
+
+
+def conversation_body():
+    page = tweet_page(
+        main=("1", "tweet \"1\" 🚀", "u1"),
+        modules=[([("2", "reply 1", "u2"), ("3", "reply 1-1")], "m1"), ([("4", "reply 2", "u1")], None), ([], "m3")],
+        next_cursor="p2")
+    # a reply without it's text, and an unused object
+    page["timeline"]["instructions"][0]["addEntries"]["entries"][2]["content"]["timelineModule"]["items"].append({"item": {"content": {"tweet": {"id": "5"}}}})
+    page["globalObjects"]["users"] = {"9": {"name": "user"}}
+    return json.dumps(page).encode("utf-8")
+
+
+class TestStreamParser(unittest.TestCase):
+    @unittest.skipIf(not stream_parser.has_ijson(), "ijson is not installed")
+    def test_same_as_decoded(self):
+        content = conversation_body()
+        self.assertEqual(stream_parser.parse_conversation_page(content), parse_pool.parse_conversation_page(content))
+        self.assertEqual(stream_parser.parse_conversation_page(content)["modules"][1], [TimelineRecord(["4", "5"], ["reply 2", "[ERROR]"], ["u1", None]), None])
+
+        content = json.dumps(module_page([("6", "reply 1-2", "u3")], cursor="n1")).encode("utf-8")
+        self.assertEqual(stream_parser.parse_module_page(content), (TimelineRecord(["6"], ["reply 1-2"], ["u3"]), "n1"))
+        content = json.dumps(module_page([])).encode("utf-8")
+        self.assertEqual(stream_parser.parse_module_page(content), (TimelineRecord(), None))
+
+    @unittest.skipIf(not stream_parser.has_ijson(), "ijson is not installed")
+    def test_page_without_main_tweet(self):
+        content = json.dumps(tweet_page(modules=[([("2", "reply 2")], None)])).encode("utf-8")
+        self.assertEqual(stream_parser.parse_conversation_page(content), {"tweet": None, "author_id": None, "modules": [[TimelineRecord(["2"], ["reply 2"]), None]], "next_cursor": None})
+
+    def test_fallback(self):
+        content = conversation_body()
+        with mock.patch.object(stream_parser, "_ijson", None):
+            self.assertFalse(stream_parser.has_ijson())
+            self.assertEqual(stream_parser.parse_conversation_page(content), parse_pool.parse_conversation_page(content))
+
+    def test_tweet(self):
+        tweet = Tweet("1", session=FakeTwitter(conversation_routes("1")), streaming=True, **TOKENS)
+        out = tweet.get_main_tweet()
+        self.assertEqual(out, {"tweet": "tweet 1", "tweet_id": "1", "timelines": [["reply 1", "reply 1-1"]]})
+        self.assertEqual(tweet.get_next_timelines(), [["reply 2"]])
+        self.assertIsNone(tweet.get_next_cursor())
+        # nothing of the json documents is kept
+        self.assertFalse(hasattr(tweet, "source"))
+        self.assertFalse(hasattr(tweet, "tweets"))
+
+    def test_async_tweet(self):
+        tweet = AsyncTweet("1", session=AsyncSlowTwitter(FakeTwitter(module_routes(2))), module_workers=2, streaming=True, **TOKENS)
+        out = asyncio.run(tweet.get_main_tweet())
+        self.assertEqual(out["timelines"], expected_timelines(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
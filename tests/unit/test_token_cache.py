@@ -0,0 +1,82 @@
+import unittest
+
+import os
+import tempfile
+
+from tweet_crawler import tweet_fetcher
+from tweet_crawler.token_cache import AccessTokenCache
+from tests.fake_twitter import FakeResponse
+
+
+TEST_DATA_FOLDER = os.path.join(os.path.dirname(__file__), '../data/')
+MAIN_JS_URL = "https://abs.twimg.com/responsive-web/web/main.6ad4f064.js"
+ACCESS_TOKEN = "AAAAAAAAAAAAAAAAAAAAANRILgAAAAAAnNwIzUejRCOuH5E6I8xnZz4puTs%3D1Zv7ttfk8LF81IUq16cHjhLTvJu4FA33AGWWjCpTnA"
+
+
+class StaticSession:
+    """serve the home page and main.*.js fixtures with an ETag
+    """
+
+    def __init__(self):
+        with open(os.path.join(TEST_DATA_FOLDER, 'homepage.html'), 'rb') as f:
+            self.homepage = f.read()
+        with open(os.path.join(TEST_DATA_FOLDER, 'main.6ad4f064.js'), 'rb') as f:
+            self.main_js = f.read()
+        self.calls = []
+
+    def get(self, url, headers=None, **kwargs):
+        headers = headers or {}
+        if url == MAIN_JS_URL:
+            if headers.get('If-None-Match') == '"v1"':
+                self.calls.append(("main_js", 304))
+                return FakeResponse(304, b"", {"ETag": '"v1"'})
+            self.calls.append(("main_js", 200))
+            return FakeResponse(200, self.main_js, {"ETag": '"v1"', "Last-Modified": "Wed, 18 Mar 2020 05:00:00 GMT"})
+        self.calls.append(("home", 200))
+        return FakeResponse(200, self.homepage)
+
+
+class TestAccessTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.path = os.path.join(self.folder.name, "cache", "access_token.json")
+
+    def test_cache_within_ttl(self):
+        session = StaticSession()
+        cache = AccessTokenCache(self.path, ttl=60)
+        self.assertEqual(cache.get_access_token(session=session), ACCESS_TOKEN)
+        self.assertEqual(session.calls, [("home", 200), ("main_js", 200)])
+        self.assertTrue(os.path.isfile(self.path))
+
+        # a new process reads the file without any request
+        session.calls = []
+        self.assertEqual(AccessTokenCache(self.path, ttl=60).get_access_token(session=session), ACCESS_TOKEN)
+        self.assertEqual(session.calls, [])
+
+    def test_revalidate_after_ttl(self):
+        session = StaticSession()
+        cache = AccessTokenCache(self.path, ttl=0)
+        cache.get_access_token(session=session)
+
+        session.calls = []
+        self.assertEqual(cache.get_access_token(session=session), ACCESS_TOKEN)
+        self.assertEqual(session.calls, [("home", 200), ("main_js", 304)])
+        self.assertEqual(cache.load()["entries"][MAIN_JS_URL]["etag"], '"v1"')
+
+    def test_get_tokens_with_cache(self):
+        session = StaticSession()
+        session.post = lambda url, **kwargs: FakeResponse(200, b'{"guest_token": "gt"}')
+        tokens = tweet_fetcher.get_tokens(session=session, token_cache=AccessTokenCache(self.path))
+        self.assertEqual(tokens["access_token"], ACCESS_TOKEN)
+        self.assertEqual(tokens["guest_token"], "gt")
+
+    def test_broken_cache_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{")
+        self.assertEqual(AccessTokenCache(self.path).get_access_token(session=StaticSession()), ACCESS_TOKEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+import time
+import threading
+
+from tweet_crawler.token_pool import TokenPool, CONVERSATION, SEARCH, endpoint_of
+from tweet_crawler.tweet_parser import Tweet
+from tests.fake_twitter import FakeTwitter, conversation_routes
+
+
+class TestTokenPool(unittest.TestCase):
+    def create_pool(self, size=2, **kwargs):
+        session = FakeTwitter(conversation_routes("1"))
+        pool = TokenPool(size=size, access_token="access", session=session, **kwargs)
+        self.addCleanup(pool.close)
+        return pool, session
+
+    def test_fill(self):
+        pool, session = self.create_pool(size=3)
+        self.assertEqual(pool.fill(), 3)
+        self.assertEqual([t.guest_token for t in pool.tokens()], ["gt-1", "gt-2", "gt-3"])
+
+    def test_concurrent_fills_do_not_overfill(self):
+        pool, session = self.create_pool(size=3)
+        new_token = pool._new_token
+
+        def slow_new_token():
+            time.sleep(0.05)
+            return new_token()
+
+        pool._new_token = slow_new_token
+        threads = [threading.Thread(target=pool.fill) for _ in range(4)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertEqual(len(pool), 3)
+        self.assertEqual(len(session.guest_tokens), 3)
+
+    def test_endpoint_of(self):
+        self.assertEqual(endpoint_of("https://api.twitter.com/2/timeline/conversation/1.json"), CONVERSATION)
+        self.assertEqual(endpoint_of("https://api.twitter.com/2/search/adaptive.json"), SEARCH)
+
+    def test_acquire_rotates_by_remaining_quota(self):
+        pool, _ = self.create_pool(size=2)
+        pool.fill()
+        pool.update_rate_limit("gt-1", CONVERSATION, 10, time.time() + 60)
+        pool.update_rate_limit("gt-2", CONVERSATION, 50, time.time() + 60)
+
+        token = pool.acquire(CONVERSATION)
+        self.assertEqual(token.guest_token, "gt-2")
+        self.assertEqual(token.remaining(CONVERSATION), 49)
+        pool.release(token)
+
+        # the search quota is tracked apart from the conversation quota
+        pool.update_rate_limit("gt-2", SEARCH, 0, time.time() + 60)
+        self.assertEqual(pool.acquire(SEARCH).guest_token, "gt-1")
+
+    def test_acquire_waits_for_reset(self):
+        pool, _ = self.create_pool(size=1)
+        pool.fill()
+        pool.update_rate_limit("gt-1", CONVERSATION, 0, time.time() + 0.2)
+
+        self.assertIsNone(pool.acquire(CONVERSATION, timeout=0.05))
+        started = time.time()
+        self.assertEqual(pool.acquire(CONVERSATION, timeout=2).guest_token, "gt-1")
+        self.assertGreaterEqual(time.time() - started, 0.1)
+
+    def test_refresh_replaces_expired_and_invalid_tokens(self):
+        pool, _ = self.create_pool(size=2, ttl=100, refresh_margin=10)
+        pool.fill()
+        tokens = pool.tokens()
+        tokens[0].expires_at = time.time() + 5
+        pool.invalidate(tokens[1])
+
+        pool.refresh()
+        self.assertEqual(sorted(t.guest_token for t in pool.tokens()), ["gt-3", "gt-4"])
+
+    def test_observe_rate_limit_headers(self):
+        pool, session = self.create_pool(size=1)
+        session.headers = {"x-rate-limit-remaining": "7", "x-rate-limit-reset": str(time.time() + 60)}
+        session.add_response_hook(pool.observe)
+        pool.fill()
+
+        tweet = Tweet("1", None, None, None, session=session, token_pool=pool)
+        self.assertEqual(tweet.get_main_tweet()["tweet"], "tweet 1")
+        token = pool.tokens()[0]
+        self.assertEqual(token.remaining(CONVERSATION), 7)
+        self.assertEqual(token.in_flight, 0)
+
+    def test_observe_ignores_malformed_headers(self):
+        pool, session = self.create_pool(size=1)
+        session.headers = {"x-rate-limit-remaining": "many", "x-rate-limit-reset": "soon"}
+        session.add_response_hook(pool.observe)
+        pool.fill()
+
+        tweet = Tweet("1", None, None, None, session=session, token_pool=pool)
+        self.assertEqual(tweet.get_main_tweet()["tweet"], "tweet 1")
+        self.assertIsNone(pool.tokens()[0].remaining(CONVERSATION))
+
+
+if __name__ == '__main__':
+    unittest.main()
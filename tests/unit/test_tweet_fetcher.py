@@ -23,6 +23,21 @@ class TestTweetFetcher(unittest.TestCase):
         self.assertEqual(url, "https://abs.twimg.com/responsive-web/web/main.6ad4f064.js")
 
 
+    def test_get_main_js_url_markup(self):
+        html = """
+            <link href='https://abs.twimg.com/web/vendors~main.1.js' as='script' rel=preload>
+            <LINK rel=preload AS=script href=https://abs.twimg.com/web/main.2.js?a=1&amp;b=2>
+            <link rel="preload" as="script" href="https://abs.twimg.com/web/main.3.js">
+        """
+        url = tweet_fetcher.get_main_js_url(html)
+        self.assertEqual(url, "https://abs.twimg.com/web/main.2.js?a=1&b=2")
+
+
+    def test_get_main_js_url_not_found(self):
+        html = '<link rel="preload" as="style" href="https://abs.twimg.com/web/main.1.js">'
+        self.assertIsNone(tweet_fetcher.get_main_js_url(html))
+
+
     def test_fetch_main_js(self):
         url = "https://abs.twimg.com/responsive-web/web/main.6ad4f064.js"
         result = tweet_fetcher.fetch_main_js(url)
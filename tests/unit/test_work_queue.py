@@ -0,0 +1,149 @@
+import unittest
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from tweet_crawler.work_queues.sqlite_queue import SqliteWorkQueue
+from tweet_crawler.work_queues.redis_queue import RedisWorkQueue
+from tests.fake_redis import FakeRedis
+
+
+class WorkQueueTests:
+    """the behaviour every `WorkQueue` shares. `create_queue()` returns a new queue on the same backend.
+    """
+
+    def test_put_is_idempotent(self):
+        queue = self.create_queue()
+        self.assertTrue(queue.put("search", "search:a:0", {"page": 0}))
+        self.assertFalse(queue.put("search", "search:a:0", {"page": 1}))
+        lease = queue.claim(["search"], 10)
+        self.assertEqual(lease.payload, {"page": 0})
+        self.assertTrue(queue.complete(lease))
+        # a task done is never added again
+        self.assertFalse(queue.put("search", "search:a:0", {"page": 0}))
+        self.assertEqual(queue.stats(), {"pending": 0, "leased": 0, "done": 1, "failed": 0})
+
+    def test_claim_by_kind_priority(self):
+        queue = self.create_queue()
+        queue.put("search", "s", {})
+        queue.put("conversation", "c", {})
+        self.assertEqual(queue.claim(["conversation", "search"], 10).task_id, "c")
+        self.assertEqual(queue.claim(["conversation", "search"], 10).task_id, "s")
+        self.assertIsNone(queue.claim(["conversation", "search"], 10))
+
+    def test_delay(self):
+        queue = self.create_queue()
+        queue.put("search", "s", {}, delay=60)
+        self.assertIsNone(queue.claim(["search"], 10))
+        self.assertEqual(queue.stats()["pending"], 1)
+
+    def test_expired_lease_is_claimed_again(self):
+        queue = self.create_queue()
+        queue.put("conversation", "c", {"timelines": 0})
+        first = queue.claim(["conversation"], 0.05)
+        self.assertTrue(queue.extend(first, 0.05, {"timelines": 3}))
+        self.assertIsNone(queue.claim(["conversation"], 10))
+
+        time.sleep(0.1)
+        second = self.create_queue().claim(["conversation"], 10)
+        self.assertEqual(second.task_id, "c")
+        self.assertEqual(second.attempts, 2)
+        # the progress saved by the first worker is kept
+        self.assertEqual(second.payload, {"timelines": 3})
+
+        # the first worker lost it's lease
+        self.assertFalse(queue.extend(first, 10))
+        self.assertFalse(queue.release(first))
+        self.assertTrue(queue.extend(second, 10))
+
+        # completion is idempotent, whoever finishes first
+        self.assertTrue(queue.complete(first))
+        self.assertFalse(queue.complete(second))
+        self.assertEqual(queue.stats()["done"], 1)
+        self.assertEqual(queue.stats()["leased"], 0)
+
+    def test_release(self):
+        queue = self.create_queue()
+        queue.put("conversation", "c", {"cursor": None})
+        lease = queue.claim(["conversation"], 10)
+        self.assertTrue(queue.release(lease, payload={"cursor": "p2"}))
+        lease = queue.claim(["conversation"], 10)
+        self.assertEqual(lease.payload, {"cursor": "p2"})
+
+    def test_max_attempts(self):
+        queue = self.create_queue(max_attempts=2)
+        queue.put("conversation", "c", {})
+        for _ in range(2):
+            queue.release(queue.claim(["conversation"], 10), count_attempt=True)
+        self.assertIsNone(queue.claim(["conversation"], 10))
+        self.assertEqual(queue.stats()["failed"], 1)
+
+    def test_release_on_purpose_is_not_an_attempt(self):
+        queue = self.create_queue(max_attempts=2)
+        queue.put("search", "search:spacex:0", {})
+        # an empty search page, polled again and again
+        for _ in range(5):
+            lease = queue.claim(["search"], 10)
+            self.assertEqual(lease.attempts, 1)
+            self.assertTrue(queue.release(lease))
+        self.assertEqual(queue.stats(), {"pending": 1, "leased": 0, "done": 0, "failed": 0})
+
+        # an expired lease still counts
+        queue.claim(["search"], 0.01)
+        time.sleep(0.05)
+        self.assertEqual(queue.claim(["search"], 10).attempts, 2)
+
+    def test_fail(self):
+        queue = self.create_queue()
+        queue.put("conversation", "c", {})
+        queue.fail(queue.claim(["conversation"], 10))
+        self.assertIsNone(queue.claim(["conversation"], 10))
+        self.assertEqual(queue.stats(), {"pending": 0, "leased": 0, "done": 0, "failed": 1})
+
+    def test_concurrent_claims(self):
+        queue = self.create_queue()
+        for i in range(50):
+            queue.put("conversation", str(i), {})
+
+        claimed = []
+        def work():
+            own = self.create_queue()
+            while True:
+                lease = own.claim(["conversation"], 10)
+                if lease is None:
+                    break
+                claimed.append(lease.task_id)
+                own.complete(lease)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(claimed, key=int), [str(i) for i in range(50)])
+
+
+class TestSqliteWorkQueue(WorkQueueTests, unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def create_queue(self, **kwargs):
+        queue = SqliteWorkQueue(os.path.join(self.folder, "queue.sqlite3"), **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+
+class TestRedisWorkQueue(WorkQueueTests, unittest.TestCase):
+    def setUp(self):
+        self.client = FakeRedis()
+
+    def create_queue(self, **kwargs):
+        return RedisWorkQueue(self.client, **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+from tweet_crawler import tweet_fetcher
+
+
+def _import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("The asyncio engine requires aiohttp. Install it with `pip install aiohttp`.")
+    return aiohttp
+
+
+class AsyncResponse:
+    """A fully read HTTP response returned by `AsyncHttpSession`
+    """
+
+    def __init__(self, status_code, content, headers=None, encoding="utf-8"):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {}
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+
+class AsyncHttpSession:
+    """An aiohttp based session with keep-alive connection pooling
+
+    The `aiohttp.ClientSession` is created lazily inside the running event loop.
+    """
+
+    def __init__(self, pool_size=100, pool_size_per_host=0):
+        """
+        Args:
+            pool_size: the maximum amount of simultaneous connections. 0 for unlimited.
+            pool_size_per_host: the maximum amount of simultaneous connections to one host. 0 for unlimited.
+        """
+        self.pool_size = pool_size
+        self.pool_size_per_host = pool_size_per_host
+        self.__session = None
+
+    def _get_session(self):
+        if self.__session is None:
+            aiohttp = _import_aiohttp()
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size_per_host)
+            self.__session = aiohttp.ClientSession(connector=connector)
+        return self.__session
+
+    async def request(self, method, url, headers=None, params=None):
+        """send a request and read the whole body
+
+        Args:
+            method: the http method, e.g. "GET".
+            url: the full url.
+            headers: a dictionary of request headers.
+            params: a list of (key, value) query parameters. parameters with None value are dropped.
+
+        Returns: an `AsyncResponse`. the names of the headers are lower case.
+
+        Raises:
+            ConnectionError: the request failed without a response. it is retried like any `OSError`, see `retry.RetryPolicy`.
+        """
+        if params is not None:
+            params = [(k, v) for k, v in params if v is not None]
+        session = self._get_session()
+        try:
+            async with session.request(method, url, headers=headers, params=params) as response:
+                content = await response.read()
+                response_headers = {name.lower(): value for name, value in response.headers.items()}
+                return AsyncResponse(response.status, content, response_headers, response.charset)
+        except _import_aiohttp().ClientError as e:
+            raise ConnectionError("{} {} failed: {}".format(method, url, e)) from e
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+
+async def fetch_tweet(tweet_id, access_token, csrf_token, guest_token, cursor=None, session=None, raise_errors=False, raw=False):
+    """Fetch tweets by id. the asyncio version of `tweet_fetcher.fetch_tweet`
+
+
+    Args:
+        tweet_id: the target tweet id
+        access_token: the access token to pass the oauth
+        csrf_token: the csrf_token hidden in twitter page or cookie
+        guest_token: the guest_token is calculate by twitter server. see `tweet_fetcher.fetch_guest_token()`.
+        cursor: getting more response tweet start from this cursor
+        session: an `AsyncHttpSession` or any object with an awaitable `get(url, headers, params)`.
+        raise_errors: raise a classified `retry.FetchError` instead of returning None. see `tweet_fetcher.fetch_tweet`.
+        raw: return the body as bytes instead of decoding it. see `tweet_crawler.parse_pool`.
+
+    Returns:
+        the json object return from twitter server (which is parsed as a python dictionary).
+        if the request is faild, return None.
+    """
+    if session is None:
+        raise ValueError("An async session is required. see `AsyncHttpSession`.")
+    url, headers, params = tweet_fetcher._build_tweet_request(tweet_id, access_token, csrf_token, guest_token, cursor=cursor)
+    response = await session.get(url, headers=headers, params=params)
+    return tweet_fetcher._decode_json(response, raise_errors, raw=raw)
+
+
+async def fetch_search_result(keyword, access_token, csrf_token, guest_token, cursor=None, session=None, raise_errors=False):
+    """Fetch search results by keyword. the asyncio version of `tweet_fetcher.fetch_search_result`
+
+
+    Args:
+        keyword: the keyword to search
+        access_token: the access token to pass the oauth
+        csrf_token: the csrf_token hidden in twitter page or cookie
+        cursor: getting more response tweet start from this cursor
+        session: an `AsyncHttpSession` or any object with an awaitable `get(url, headers, params)`.
+        raise_errors: raise a classified `retry.FetchError` instead of returning None. see `tweet_fetcher.fetch_search_result`.
+
+    Returns:
+        the json object return from twitter server (which is parsed as a python dictionary).
+        if the request is faild, return None.
+    """
+    if session is None:
+        raise ValueError("An async session is required. see `AsyncHttpSession`.")
+    url, headers, params = tweet_fetcher._build_search_request(keyword, access_token, csrf_token, guest_token, cursor=cursor)
+    response = await session.get(url, headers=headers, params=params)
+    return tweet_fetcher._decode_json(response, raise_errors)
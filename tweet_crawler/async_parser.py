@@ -0,0 +1,229 @@
+import asyncio
+
+from tweet_crawler import async_fetcher
+from tweet_crawler import stream_parser
+from tweet_crawler import logger
+from tweet_crawler.records import TimelineRecord
+from tweet_crawler.token_pool import CONVERSATION, SEARCH
+from tweet_crawler.tweet_parser import Tweet, _check_source
+from tweet_crawler.tweet_parser import TwitterSearch
+
+
+async def _fetch_with_retry(retry_policy, endpoint, fetch):
+    """await `fetch()` under `retry_policy`, a `retry.AsyncRetryPolicy`, or once if it is None
+    """
+    if retry_policy is None:
+        return await fetch()
+    return await retry_policy.call(endpoint, fetch)
+
+
+class AsyncTweet(Tweet):
+    """The asyncio version of `tweet_parser.Tweet`
+
+    The parsing is shared with `Tweet`, only the requests are awaited.
+    """
+
+    def __init__(self, tweet_id, access_token, csrf_token, guest_token, cursor=None, session=None, retry_policy=None, module_workers=1, parse_pool=None, streaming=False):
+        """
+            Args:
+                tweet_id: the id of the target tweet
+                access_token: the access token to pass the oauth
+                csrf_token: the csrf_token hidden in twitter page or cookie
+                guest_token: the guest_token is calculate by twitter server. see `tweet_fetcher.fetch_guest_token()`.
+                session: an `async_fetcher.AsyncHttpSession`.
+                retry_policy: a `retry.AsyncRetryPolicy` retrying the failed requests. a failed request raises a `retry.FetchError` at once if None.
+                module_workers: the maximum amount of timeline modules of a page expanded concurrently.
+                parse_pool: a `parse_pool.ParsePool` decoding the pages in other processes, off the event loop.
+                streaming: parse the pages with `stream_parser`. see `Tweet`.
+        """
+        super().__init__(tweet_id, access_token, csrf_token, guest_token, cursor=cursor, session=session, retry_policy=retry_policy, module_workers=module_workers, parse_pool=parse_pool, streaming=streaming)
+        self.__is_first = True
+
+
+    async def __fetch(self, cursor, raw=False):
+        fetch = lambda: async_fetcher.fetch_tweet(self.tweet_id, self.access_token, self.csrf_token, self.guest_token, cursor=cursor, session=self.session, raise_errors=True, raw=raw)
+        return await _fetch_with_retry(self.retry_policy, CONVERSATION, fetch)
+
+
+    async def __prepare(self):
+        if self._parses_raw():
+            content = _check_source(await self.__fetch(self.cursor, raw=True), "async_parser.AsyncTweet.__prepare")
+            if self.parse_pool is not None:
+                self.page = await self.parse_pool.parse_conversation_async(content)
+            else:
+                self.page = stream_parser.parse_conversation_page(content)
+            self._init_record()
+            return
+        source = await self.__fetch(self.cursor)
+        self._load_source(source)
+
+
+    def set_next_cursor(self, cursor):
+        """continue a conversation from a cursor saved before. see `Tweet.set_next_cursor`
+        """
+        super().set_next_cursor(cursor)
+        self.__is_first = False
+
+
+    async def get_main_tweet(self, timeline_length=-1):
+        """get the tweet and it's first timelines. see `Tweet.get_main_tweet`
+        """
+        record = await self.get_main_record(timeline_length=timeline_length)
+        return record.to_dict()
+
+
+    async def get_main_record(self, timeline_length=-1):
+        """get the tweet and it's first timelines as a record. see `Tweet.get_main_record`
+        """
+        if self.__is_first:
+            await self.__prepare()
+            self.__is_first = False
+
+        self._init_record()
+        if self.page is not None:
+            await self.__parse_page(self.page, timeline_length=timeline_length)
+        elif self.entries is not None:
+            await self.__parse_entries(entries=self.entries, timeline_length=timeline_length)
+
+        return self.record
+
+
+    async def get_next_timelines(self, timeline_length=-1):
+        """get the next batch of timelines. see `Tweet.get_next_timelines`
+        """
+        timelines = await self.get_next_timeline_records(timeline_length=timeline_length)
+        if timelines is None:
+            return None
+        return [timeline.texts for timeline in timelines]
+
+
+    async def get_next_timeline_records(self, timeline_length=-1):
+        """get the next batch of timelines as records. see `Tweet.get_next_timeline_records`
+        """
+        if self._next_cursor is None:
+            return None
+        self._move_to_next_cursor()
+        self.__is_first = False
+        await self.__prepare()
+        record = await self.get_main_record(timeline_length=timeline_length)
+        return record.timelines
+
+
+    async def iter_timelines(self, max_timelines=-1, timeline_length=-1):
+        """iterate the timelines of the conversation, a page at a time. see `Tweet.iter_timelines`
+        """
+        count = 0
+        while True:
+            if self.__is_first:
+                timelines = (await self.get_main_record(timeline_length=timeline_length)).timelines
+            elif max_timelines != -1 and count >= max_timelines:
+                return
+            else:
+                timelines = await self.get_next_timeline_records(timeline_length=timeline_length)
+                if timelines is None:
+                    return
+            if max_timelines != -1:
+                del timelines[max(max_timelines - count, 0):]
+            count += len(timelines)
+            yield timelines
+
+
+    async def __parse_entries(self, entries, timeline_length=-1):
+        modules = []
+        for entry in entries:
+            content = entry["content"]
+            if "item" in content:
+                _, self.record.text, self.record.author_id = self._get_reply(content["item"]["content"])
+            elif "timelineModule" in content:
+                modules.append(content)
+            elif "operation" in content:
+                self.process_operation(content)
+            else:
+                logger.debug("at 'async_parser.AsyncTweet.__parse_entries' unknown entry. DUMP:\n{}".format(content))
+
+        semaphore = asyncio.Semaphore(max(self.module_workers, 1))
+
+        async def collect(content):
+            async with semaphore:
+                return await self._collect_timeline(content, timeline_length=timeline_length)
+
+        self.record.timelines += await asyncio.gather(*[collect(content) for content in modules])
+
+
+    async def __parse_page(self, page, timeline_length=-1):
+        """fill the record from a page parsed in the parse pool. see `Tweet._parse_page`
+        """
+        if page["tweet"] is not None:
+            self.record.text = page["tweet"]
+            self.record.author_id = page["author_id"]
+        if page["next_cursor"] is not None:
+            self._next_cursor = page["next_cursor"]
+
+        semaphore = asyncio.Semaphore(max(self.module_workers, 1))
+
+        async def follow(timeline, cursor):
+            async with semaphore:
+                return await self._follow_timeline(timeline, cursor, timeline_length=timeline_length)
+
+        self.record.timelines += await asyncio.gather(*[follow(timeline, cursor) for timeline, cursor in page["modules"]])
+
+
+    async def process_timeline_module(self, content, timeline_length=-1):
+        """extract timeline from the json object of twitter. see `Tweet.process_timeline_module`
+        """
+        self.record.timelines.append(await self._collect_timeline(content, timeline_length=timeline_length))
+
+
+    async def _collect_timeline(self, content, timeline_length=-1):
+        """follow the cursors of a timeline module. see `Tweet._collect_timeline`
+        """
+        items = content["timelineModule"]["items"]
+        timeline, next_cursor = self._parse_timeline_items(items)
+        return await self._follow_timeline(timeline, next_cursor, timeline_length=timeline_length)
+
+
+    async def _follow_timeline(self, timeline, next_cursor, timeline_length=-1):
+        """fetch the rest of a timeline. see `Tweet._follow_timeline`
+        """
+        final_timeline = TimelineRecord()
+        final_timeline.extend(timeline)
+
+        while next_cursor is not None:
+            if self._parses_raw():
+                content = _check_source(await self.__fetch(next_cursor, raw=True), "async_parser.AsyncTweet._follow_timeline")
+                if self.parse_pool is not None:
+                    timeline, next_cursor = await self.parse_pool.parse_module_async(content)
+                else:
+                    timeline, next_cursor = stream_parser.parse_module_page(content)
+            else:
+                obj = await self.__fetch(next_cursor)
+                timeline, next_cursor = self._parse_module_response(obj)
+            final_timeline.extend(timeline)
+
+            if timeline_length != -1 and len(final_timeline) > timeline_length:
+                break
+
+        if timeline_length != -1:
+            final_timeline.truncate(timeline_length)
+
+        return final_timeline
+
+
+class AsyncTwitterSearch(TwitterSearch):
+    """The asyncio version of `tweet_parser.TwitterSearch`
+
+    `retry_policy` is a `retry.AsyncRetryPolicy`. `token_pool` is not supported.
+    """
+
+    async def get_next_ids(self):
+        """get the next batch of tweet ids
+
+        Args: None
+
+        Returns: a list of tweet id
+        """
+        cursor = self.next_cursor
+        fetch = lambda: async_fetcher.fetch_search_result(self.keyword, self.access_token, self.csrf_token, self.guest_token, cursor=cursor, session=self.session, raise_errors=True)
+        source = await _fetch_with_retry(self.retry_policy, SEARCH, fetch)
+        entries = self._get_entries(source)
+        return self._parse_data(entries)
@@ -0,0 +1,297 @@
+"""Record the http traffic of a crawl to a cassette and replay it offline
+
+`RecordingSession` wraps the session given to the fetchers (see
+`tweet_crawler.http_session`) and appends every request and it's response to
+a cassette. The token endpoints, the search pages and the conversation and
+cursor pages go through it, like any other request. `ReplaySession` answers
+the same requests from the cassette, without the network, so a whole
+`CrawlerManager` run can be repeated, timed and profiled.
+
+A cassette is a json lines file, gzip compressed if it's name ends with
+".gz". Each line is an interaction:
+
+    {"request": "GET https://api.twitter.com/2/search/adaptive.json?count=20&...",
+     "status": 200, "headers": {...}, "body": "...", "elapsed": 0.21}
+
+The request is keyed by it's method, url, sorted query and body. The
+headers of the request are left out, since they carry the tokens, which
+change every run. Only the response headers read by the crawler are kept.
+A body that is not UTF-8 is saved as {"base64": "..."}.
+"""
+import gzip
+import time
+import base64
+import random
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from tweet_crawler import logger
+from tweet_crawler import json_codec
+from tweet_crawler.http_session import HttpSession
+
+
+RECORDED_HEADERS = (
+    "content-type",
+    "etag",
+    "last-modified",
+    "retry-after",
+    "x-rate-limit-limit",
+    "x-rate-limit-remaining",
+    "x-rate-limit-reset",
+)
+
+
+class CassetteMiss(LookupError):
+    """raised by `ReplaySession` for a request missing from the cassette
+
+    It is not an `OSError`, so it is never retried. see `tweet_crawler.retry`.
+    """
+
+
+def request_key(method, url, params=None, data=None):
+    """the key of a request in a cassette
+
+    Args:
+        method: the http method, e.g. "GET".
+        url: the url, with or without a query.
+        params: the query parameters, as passed to `requests`.
+        data: the body, as passed to `requests`.
+
+    Returns: a string of the method, the url with a sorted query, and the body if any
+    """
+    prepared = requests.Request(method.upper(), url, params=params, data=data).prepare()
+    parts = urlsplit(prepared.url)
+    key = "{} {}://{}{}".format(prepared.method, parts.scheme, parts.netloc, parts.path)
+    if parts.query:
+        key += "?" + "&".join(sorted(parts.query.split("&")))
+    body = prepared.body
+    if body:
+        key += " " + (body.decode("utf-8", "replace") if isinstance(body, bytes) else body)
+    return key
+
+
+def _open(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def _encode_body(content):
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(body):
+    if isinstance(body, dict):
+        return base64.b64decode(body["base64"])
+    return body.encode("utf-8")
+
+
+def load_cassette(path):
+    """read the interactions of a cassette
+
+    Args:
+        path: the path of the cassette
+
+    Returns: a dictionary of request key -> the list of it's interactions, in the recorded order
+    """
+    interactions = {}
+    with _open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            interaction = json_codec.loads(line)
+            interactions.setdefault(interaction["request"], []).append(interaction)
+    return interactions
+
+
+class RecordingSession:
+    """Send the requests through another session and record them to a cassette
+
+    Other attributes (e.g. `add_response_hook`) are delegated to the wrapped
+    session, so the hooks see the live responses.
+    """
+
+    def __init__(self, path, session=None, pool_size=None):
+        """
+        Args:
+            path: the cassette to write. it is replaced if it exists.
+            session: the wrapped session. a new `http_session.HttpSession` is created if None.
+            pool_size: the maximum kept-alive connections per host of the created session.
+        """
+        self.__own_session = session is None
+        if session is None:
+            session = HttpSession(pool_size=pool_size) if pool_size is not None else HttpSession()
+        self.path = path
+        self.session = session
+
+        self.__lock = threading.Lock()
+        self.__file = _open(path, "wb")
+        self.__recorded = 0
+
+    def __getattr__(self, name):
+        if name == "session":
+            raise AttributeError(name)
+        return getattr(self.session, name)
+
+    @property
+    def recorded(self):
+        """the amount of recorded interactions
+        """
+        return self.__recorded
+
+    def request(self, method, url, **kwargs):
+        """send a request through the wrapped session and record it's response
+
+        Args:
+            method: the http method, e.g. "GET".
+            url: the full url.
+            kwargs: passed to the wrapped session.
+
+        Returns: the response of the wrapped session
+        """
+        start = time.monotonic()
+        if method.upper() == "POST":
+            response = self.session.post(url, **kwargs)
+        else:
+            response = self.session.get(url, **kwargs)
+        elapsed = time.monotonic() - start
+
+        headers = {name: response.headers[name] for name in RECORDED_HEADERS if response.headers.get(name) is not None}
+        line = json_codec.dumps({
+            "request": request_key(method, url, kwargs.get("params"), kwargs.get("data")),
+            "status": response.status_code,
+            "headers": headers,
+            "body": _encode_body(response.content),
+            "elapsed": round(elapsed, 4),
+        })
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.write(line + b"\n")
+                self.__recorded += 1
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """write the rest of the cassette, and close the wrapped session if it was created here
+
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            f, self.__file = self.__file, None
+        if f is not None:
+            f.close()
+            logger.info("Recorded {} requests to {}.".format(self.__recorded, self.path))
+        if self.__own_session:
+            self.session.close()
+
+
+class ReplaySession:
+    """Answer the requests from a cassette, without the network
+
+    The interactions of a request are replayed in their recorded order, and
+    the last one is repeated once they run out, so a crawl refreshing it's
+    tokens or retrying a page more often than the recorded one still
+    completes. Each response is delayed by `latency` seconds and up to
+    `jitter` more. The jitter of a request depends only on `seed`, the
+    request and how many times it has been replayed, so two runs are delayed
+    alike whatever the order of the threads.
+    """
+
+    def __init__(self, path, latency=0, jitter=0, seed=0):
+        """
+        Args:
+            path: the cassette to replay
+            latency: the delay in seconds added to every response. set "recorded" to wait as long as the recorded request took.
+            jitter: the maximum random delay in seconds added to `latency`.
+            seed: the seed of the jitter
+        """
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+
+        self.__lock = threading.Lock()
+        self.__interactions = load_cassette(path)
+        self.__replayed = {}
+        self.__response_hooks = []
+
+    def add_response_hook(self, hook):
+        """register a callable invoked with every response. see `http_session.HttpSession.add_response_hook`
+        """
+        with self.__lock:
+            self.__response_hooks.append(hook)
+
+    def remove_response_hook(self, hook):
+        with self.__lock:
+            if hook in self.__response_hooks:
+                self.__response_hooks.remove(hook)
+
+    def __delay(self, key, count, interaction):
+        delay = interaction.get("elapsed", 0) if self.latency == "recorded" else self.latency
+        if self.jitter > 0:
+            delay += random.Random("{}#{}#{}".format(self.seed, key, count)).uniform(0, self.jitter)
+        return delay
+
+    def request(self, method, url, **kwargs):
+        """answer a request with the next recorded response
+
+        Args:
+            method: the http method, e.g. "GET".
+            url: the full url.
+            kwargs: as passed to `requests.Session.request`. the headers are set on `response.request`.
+
+        Returns: a `requests.Response` object
+        """
+        key = request_key(method, url, kwargs.get("params"), kwargs.get("data"))
+        with self.__lock:
+            interactions = self.__interactions.get(key)
+            if not interactions:
+                raise CassetteMiss("{} is not recorded in {}.".format(key, self.path))
+            count = self.__replayed.get(key, 0)
+            self.__replayed[key] = count + 1
+            hooks = list(self.__response_hooks)
+        interaction = interactions[min(count, len(interactions) - 1)]
+
+        delay = self.__delay(key, count, interaction)
+        if delay > 0:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.headers = CaseInsensitiveDict(interaction["headers"])
+        response._content = _decode_body(interaction["body"])
+        response.encoding = "utf-8"
+        response.request = requests.Request(method.upper(), url, headers=kwargs.get("headers"), params=kwargs.get("params"), data=kwargs.get("data")).prepare()
+        response.url = response.request.url
+        for hook in hooks:
+            hook(response)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def replayed(self):
+        """the amount of replayed responses, by request key
+        """
+        with self.__lock:
+            return dict(self.__replayed)
+
+    def close(self):
+        pass
@@ -0,0 +1,86 @@
+import os
+import json
+import time
+
+from tweet_crawler import logger
+
+
+VERSION = 2
+
+
+class Checkpoint:
+    """The state of a crawl saved to a json file, to resume it after a restart
+
+    The state holds, for every keyword, the search cursor, the ids searched
+    but not downloaded yet, and the continuation cursor and the amount of
+    saved timelines of the conversations downloaded halfway. The file is
+    replaced atomically, so a crash while saving leaves the previous
+    checkpoint.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: the json file to keep the state.
+        """
+        self.path = path
+
+    def load(self):
+        """read the checkpoint file
+
+        Args: None
+
+        Returns: a dictionary. None if there is no checkpoint. for example:
+            {
+                "version": 2,
+                "keywords": {
+                    "spacex": {
+                        "cursor": "scroll:thGAVUV0VFVBaAwL...",
+                        "fetched_ids": 30,
+                        "pending": ["1585", "1586", ......],
+                        "tweets": {
+                            "1585": {"cursor": "LBn2gICx...", "timelines": 20}
+                        }
+                    },
+                    ......
+                },
+                "saved_at": 1584508800.0
+            }
+        """
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.loads(f.read())
+        except (OSError, ValueError):
+            logger.warning("The checkpoint '{}' is broken. Ignored.".format(self.path))
+            return None
+        if state.get("version") != VERSION:
+            logger.warning("The checkpoint '{}' has an unknown version. Ignored.".format(self.path))
+            return None
+        return state
+
+    def save(self, state):
+        """write the checkpoint file atomically
+
+        Args:
+            state: see `load()`. "version" and "saved_at" are filled in.
+
+        Returns: None
+        """
+        state = dict(state, version=VERSION, saved_at=time.time())
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(state))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """remove the checkpoint file
+        """
+        if os.path.isfile(self.path):
+            os.remove(self.path)
@@ -0,0 +1,170 @@
+import contextlib
+
+from tweet_crawler import logger
+from tweet_crawler.http_session import HttpSession
+from tweet_crawler.token_pool import TokenPool
+from tweet_crawler.rate_limiter import RateLimiter
+from tweet_crawler.retry import RetryPolicy
+from tweet_crawler.parse_pool import ParsePool
+from tweet_crawler.tweet_parser import TwitterSearch, Tweet
+
+
+class CrawlContext:
+    """The session, the tokens and the pacing shared by the workers of a crawler
+
+    `CrawlerManager` and `distributed.DistributedCrawler` set up their
+    requests alike: one http session, a `TokenPool` observing it's responses,
+    a `RateLimiter` if the pacing is "auto", a `RetryPolicy` and an optional
+    `ParsePool`. The session and the token pool given by the caller are
+    neither started nor closed here.
+    """
+
+    def __init__(self, max_thread=3, sleep_duration=0.5, max_timelines=-1, timeline_length=-1, token_refresh_duration=300, session=None, pool_size=None, token_pool=None, token_pool_size=1, token_cache=None, max_retries=3, module_workers=1, parse_workers=0, streaming=False):
+        """
+        Args:
+            max_thread: the amount of worker threads, to size the created session.
+            sleep_duration: the cooldown for each request in a thread. set "auto" to pace the requests by the rate limit headers instead. see `tweet_crawler.rate_limiter`.
+            max_timelines: the maximum timelines (responses) of a tweet to download. set -1 to download the whole timelines.
+            timeline_length: the maximum response of a timeline to download. set -1 to download the whole responses.
+            token_refresh_duration: the time duration in seconds a guest token is used before it is replaced.
+            session: the http session shared by every request. a new `HttpSession` is created if None.
+            pool_size: the maximum kept-alive connections per host of the created session. default is `max_thread` * `module_workers` + 1.
+            token_pool: the `TokenPool` handing a guest token to each request. a new one is created if None.
+            token_pool_size: the amount of guest tokens of the created token pool.
+            token_cache: a `token_cache.AccessTokenCache` used by the created token pool.
+            max_retries: the maximum amount of retries of a failed request. see `tweet_crawler.retry.RetryPolicy`.
+            module_workers: the maximum amount of timeline modules of a page expanded concurrently in a conversation.
+            parse_workers: the amount of processes decoding the conversation pages. see `tweet_crawler.parse_pool`. set 0 to decode them in the worker threads.
+            streaming: parse the conversation pages with a streaming parser. see `tweet_crawler.stream_parser`.
+        """
+        self.max_timelines = max_timelines
+        self.timeline_length = timeline_length
+        self.module_workers = module_workers
+        self.parse_pool = ParsePool(parse_workers) if parse_workers > 0 else None
+        self.streaming = streaming
+
+        self.rate_limiter = None
+        if sleep_duration == "auto":
+            self.rate_limiter = RateLimiter()
+            sleep_duration = 0
+        self.sleep_duration = sleep_duration
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+
+        self.__own_session = session is None
+        if session is None:
+            session = HttpSession(pool_size=pool_size if pool_size is not None else max_thread * module_workers + 1)
+        self.session = session
+
+        self.__own_token_pool = token_pool is None
+        if token_pool is None:
+            token_pool = TokenPool(
+                size=token_pool_size,
+                ttl=token_refresh_duration,
+                refresh_margin=min(token_refresh_duration / 2, 30),
+                session=self.session,
+                token_cache=token_cache,
+                rate_limiter=self.rate_limiter)
+        elif self.rate_limiter is not None:
+            token_pool.rate_limiter = self.rate_limiter
+        self.token_pool = token_pool
+        if hasattr(self.session, "add_response_hook"):
+            self.session.add_response_hook(self.token_pool.observe)
+            if self.rate_limiter is not None:
+                self.session.add_response_hook(self.rate_limiter.observe)
+
+
+    def start(self):
+        """start refreshing the tokens in the background
+        """
+        self.token_pool.start()
+
+
+    def interrupt(self):
+        """wake the requests waiting for a retry or a token, before the workers are joined
+        """
+        self.retry_policy.close()
+        if self.__own_token_pool:
+            self.token_pool.close()
+
+
+    def close(self):
+        """remove the response hooks, and close the session and the parse pool created here. call it once the workers have exited.
+        """
+        if hasattr(self.session, "remove_response_hook"):
+            self.session.remove_response_hook(self.token_pool.observe)
+            if self.rate_limiter is not None:
+                self.session.remove_response_hook(self.rate_limiter.observe)
+        if self.__own_session:
+            self.session.close()
+        if self.parse_pool is not None:
+            self.parse_pool.close()
+
+
+    def new_search(self, keyword):
+        """a `TwitterSearch` of a keyword, fetching with the shared tokens
+        """
+        return TwitterSearch(keyword, None, None, None, session=self.session, token_pool=self.token_pool, retry_policy=self.retry_policy)
+
+
+    def new_tweet(self, tweet_id):
+        """a `Tweet`, fetching with the shared tokens
+        """
+        return Tweet(
+            tweet_id=tweet_id,
+            access_token=None,
+            csrf_token=None,
+            guest_token=None,
+            session=self.session,
+            token_pool=self.token_pool,
+            retry_policy=self.retry_policy,
+            module_workers=self.module_workers,
+            parse_pool=self.parse_pool,
+            streaming=self.streaming)
+
+
+    def download(self, tweet_id, storage, stop_event, progress=None, on_saved=None, lock=None):
+        """download a conversation page by page, or the rest of it
+
+        Args:
+            tweet_id: the tweet id
+            storage: the storage to write the pages to
+            stop_event: the `threading.Event` interrupting the download between two pages
+            progress: a dictionary of the "cursor" and the "timelines" saved by a download interrupted before. None to download from the top.
+            on_saved: a callable invoked with the next cursor and the amount of timelines saved, once a page is written. return False to give the conversation up.
+            lock: a lock held while a page is written and `on_saved` is invoked
+
+        Returns: True if the whole conversation is downloaded. False if it is interrupted or given up.
+        """
+        tweet = self.new_tweet(tweet_id)
+        lock = lock if lock is not None else contextlib.nullcontext()
+
+        started = progress is not None
+        timeline_ctn = 0
+        if started:
+            # the first pages are in the storage already
+            logger.info("Resume tweet {} after {} timelines.".format(tweet_id, progress["timelines"]))
+            tweet.set_next_cursor(progress["cursor"])
+            timeline_ctn = progress["timelines"]
+        else:
+            logger.info("Start download tweet {}.".format(tweet_id))
+
+        max_timelines = self.max_timelines if self.max_timelines == -1 else max(self.max_timelines - timeline_ctn, 0)
+        for timelines in tweet.iter_timelines(max_timelines=max_timelines, timeline_length=self.timeline_length):
+            timeline_ctn += len(timelines)
+            with lock:
+                if started:
+                    storage.append_records(tweet_id, timelines)
+                else:
+                    storage.save_record(tweet.record)
+                    started = True
+                if on_saved is not None and on_saved(tweet.get_next_cursor(), timeline_ctn) is False:
+                    return False
+
+            if tweet.get_next_cursor() is not None and stop_event.wait(self.sleep_duration):
+                break
+
+        if stop_event.is_set():
+            logger.info("Tweet {} interrupted.".format(tweet_id))
+            return False
+        logger.info("Tweet {} finished.".format(tweet_id))
+        return True
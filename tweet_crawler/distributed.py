@@ -0,0 +1,387 @@
+import time
+import threading
+
+from tweet_crawler import logger
+from tweet_crawler.crawl_context import CrawlContext
+from tweet_crawler.token_pool import CONVERSATION, SEARCH
+from tweet_crawler.retry import FetchError
+from tweet_crawler.keyword_scheduler import to_keyword_tasks
+from tweet_crawler.storages.framework import is_storage_factory
+from tweet_crawler.work_queues.framework import PENDING, LEASED
+
+
+def search_task_id(keyword, page):
+    """the id of the task searching a page of a keyword
+    """
+    return "search:{}:{}".format(keyword, page)
+
+
+def conversation_task_id(tweet_id):
+    """the id of the task downloading a conversation. a tweet found by two keywords is downloaded once.
+    """
+    return "conversation:{}".format(tweet_id)
+
+
+def seed(queue, keywords, max_result=-1):
+    """put the first search page of every keyword. seeding twice adds nothing.
+
+    Args:
+        queue: a `work_queues.framework.WorkQueue`
+        keywords: a keyword, or a list of keywords and `keyword_scheduler.KeywordTask`s
+        max_result: the maximum amount of tweets of a keyword, unless it's `KeywordTask` sets one. set -1 for infinity.
+
+    Returns: the amount of keywords added
+    """
+    added = 0
+    for task in to_keyword_tasks(keywords):
+        payload = {
+            "keyword": task.keyword,
+            "cursor": None,
+            "page": 0,
+            "fetched": 0,
+            "max_result": task.max_result if task.max_result is not None else max_result,
+        }
+        if queue.put(SEARCH, search_task_id(task.keyword, 0), payload):
+            added += 1
+    return added
+
+
+def open_work_queue(url, **kwargs):
+    """open a work queue by url
+
+    Args:
+        url: "sqlite:///path/to/queue.sqlite3" for a `SqliteWorkQueue`, or "redis://host:port/db" for a `RedisWorkQueue`
+        kwargs: passed to the queue
+
+    Returns: the `WorkQueue`
+    """
+    if url.startswith("sqlite:///"):
+        from tweet_crawler.work_queues.sqlite_queue import SqliteWorkQueue
+        return SqliteWorkQueue(url[len("sqlite:///"):], **kwargs)
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        from tweet_crawler.work_queues.redis_queue import RedisWorkQueue
+        return RedisWorkQueue.from_url(url, **kwargs)
+    raise ValueError("Unknown work queue '{}'. Expected sqlite:///... or redis://...".format(url))
+
+
+class DistributedCrawler:
+    """A crawler process taking it's work from a `WorkQueue` shared with other processes
+
+    A search task fetches one page of a keyword, puts a conversation task
+    for each id and the search task of the next page, then completes. A
+    conversation task saves the progress of the conversation in it's payload
+    after every page, while extending it's lease, so a worker which dies
+    halfway leaves the rest of the conversation to the next worker. The ids of
+    the tasks are derived from the keyword and the page, or the tweet id, so a
+    task repeated after a crash puts no duplicate work.
+
+    The crawler exits once no task is pending or leased in the queue.
+    """
+
+    def __init__(self, queue, storage, max_thread=3, sleep_duration=0.5, max_timelines=-1, timeline_length=-1, token_refresh_duration=300, session=None, pool_size=None, token_pool=None, token_pool_size=1, token_cache=None, max_retries=3, module_workers=1, lease_duration=120, poll_interval=1, empty_search_delay=30, parse_workers=0, streaming=False, max_empty_pages=5):
+        """
+        Args:
+            queue: a `work_queues.framework.WorkQueue`. see `seed()`.
+            storage: the storage method. see `tweet_crawler.storages.framework`. or a callable returning the storage of a keyword.
+            max_thread: the amount of worker threads.
+            sleep_duration: the cooldown for each request in a thread. set "auto" to pace the requests by the rate limit headers instead.
+            max_timelines: the maximum timelines (responses) of a tweet to download. set -1 to download the whole timelines.
+            timeline_length: the maximum response of a timeline to download. set -1 to download the whole responses.
+            token_refresh_duration: the time duration in seconds a guest token is used before it is replaced.
+            session: the http session shared by every request. a new `HttpSession` is created if None.
+            pool_size: the maximum kept-alive connections per host of the created session. default is `max_thread` * `module_workers` + 1.
+            token_pool: the `TokenPool` handing a guest token to each request. a new one is created if None.
+            token_pool_size: the amount of guest tokens of the created token pool.
+            token_cache: a `token_cache.AccessTokenCache` used by the created token pool.
+            max_retries: the maximum amount of retries of a failed request.
+            module_workers: the maximum amount of timeline modules of a page expanded concurrently in a conversation.
+            lease_duration: the visibility timeout in seconds. a task is claimed again if it's worker does not report for this long.
+            poll_interval: the time duration in seconds to wait when no task is visible.
+            empty_search_delay: the time duration in seconds before the page after an empty search page is searched.
+            parse_workers: the amount of processes decoding the conversation pages. see `tweet_crawler.parse_pool`. set 0 to decode them in the worker threads.
+            streaming: parse the conversation pages with a streaming parser. see `tweet_crawler.stream_parser`.
+            max_empty_pages: the amount of empty search pages in a row to end the search of a keyword.
+        """
+        self.queue = queue
+        self.storage = storage
+        self.max_thread = max_thread
+        self.max_timelines = max_timelines
+        self.timeline_length = timeline_length
+        self.module_workers = module_workers
+        self.streaming = streaming
+        self.lease_duration = lease_duration
+        self.poll_interval = poll_interval
+        self.empty_search_delay = empty_search_delay
+        self.max_empty_pages = max_empty_pages
+
+        self.context = CrawlContext(
+            max_thread=max_thread,
+            sleep_duration=sleep_duration,
+            max_timelines=max_timelines,
+            timeline_length=timeline_length,
+            token_refresh_duration=token_refresh_duration,
+            session=session,
+            pool_size=pool_size,
+            token_pool=token_pool,
+            token_pool_size=token_pool_size,
+            token_cache=token_cache,
+            max_retries=max_retries,
+            module_workers=module_workers,
+            parse_workers=parse_workers,
+            streaming=streaming)
+        self.session = self.context.session
+        self.token_pool = self.context.token_pool
+        self.rate_limiter = self.context.rate_limiter
+        self.retry_policy = self.context.retry_policy
+        self.parse_pool = self.context.parse_pool
+        self.sleep_duration = self.context.sleep_duration
+
+        self.__storages = {}
+        self.__storages_lock = threading.Lock()
+        self.completed = {SEARCH: 0, CONVERSATION: 0}
+
+        self.__stop_event = threading.Event()
+        self.__finished = threading.Event()
+        self.__stopped = False
+        self.__lock = threading.Lock()
+        self.__alive_workers = 0
+        self.__busy_workers = 0
+        self.__workers = []
+
+
+    @property
+    def run(self):
+        """True until every worker has exited
+        """
+        return not self.__finished.is_set()
+
+
+    def storage_of(self, keyword):
+        """the storage saving the tweets of a keyword
+        """
+        if not is_storage_factory(self.storage):
+            return self.storage
+        with self.__storages_lock:
+            storage = self.__storages.get(keyword)
+            if storage is None:
+                storage = self.storage(keyword)
+                self.__storages[keyword] = storage
+            return storage
+
+
+    def start(self):
+        """start the worker threads
+
+
+        Args: None
+
+        Returns: None
+        """
+        self.context.start()
+        self.__alive_workers = self.max_thread
+        for _ in range(self.max_thread):
+            thd = threading.Thread(target=self.__worker, args=(), daemon=True)
+            self.__workers.append(thd)
+            thd.start()
+
+
+    def wait(self, timeout=None):
+        """block until the queue is drained or the crawler is stopped
+
+
+        Args:
+            timeout: the maximum time in seconds to wait. None to wait forever.
+
+        Returns: True if the crawler has finished.
+        """
+        return self.__finished.wait(timeout)
+
+
+    def stop(self):
+        """stop the crawler. the leased tasks are given back to the queue with their progress.
+
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            if self.__stopped:
+                return
+            self.__stopped = True
+
+        logger.info("Stopping...")
+        self.__stop_event.set()
+        self.context.interrupt()
+        for thd in self.__workers:
+            thd.join()
+
+        self.context.close()
+        if not is_storage_factory(self.storage):
+            self.storage.close()
+        else:
+            for storage in self.__storages.values():
+                storage.close()
+
+
+    def __drained(self):
+        """True once no task is pending or leased, and no worker of this process is busy
+        """
+        with self.__lock:
+            if self.__busy_workers > 0:
+                return False
+        stats = self.queue.stats()
+        return stats[PENDING] == 0 and stats[LEASED] == 0
+
+
+    def __worker(self):
+        """claim and run tasks until the queue is drained or the crawler is stopped
+
+
+        Args: None
+
+        Returns: None
+        """
+        try:
+            while not self.__stop_event.is_set():
+                with self.__lock:
+                    self.__busy_workers += 1
+                try:
+                    # finish the conversations before searching more
+                    lease = self.queue.claim([CONVERSATION, SEARCH], self.lease_duration)
+                    if lease is not None:
+                        self.__run_task(lease)
+                except Exception:
+                    lease = None
+                    logger.error("Failed to use the work queue.", exc_info=True)
+                finally:
+                    with self.__lock:
+                        self.__busy_workers -= 1
+
+                if lease is None:
+                    if self.__drained():
+                        break
+                    self.__stop_event.wait(self.poll_interval)
+        finally:
+            with self.__lock:
+                self.__alive_workers -= 1
+                last = self.__alive_workers == 0
+            if last:
+                logger.info("The work queue is drained. Exit.")
+                self.__stop_event.set()
+                self.__finished.set()
+
+
+    def __run_task(self, lease):
+        """run a leased task, and complete, release or fail it
+
+
+        Args:
+            lease: the `work_queues.framework.Lease`
+
+        Returns: None
+        """
+        try:
+            if lease.kind == SEARCH:
+                done = self.__search(lease)
+            elif lease.kind == CONVERSATION:
+                done = self.__download_twitter(lease)
+            else:
+                logger.error("Unknown task kind '{}' of {}.".format(lease.kind, lease.task_id))
+                self.queue.fail(lease)
+                return
+        except FetchError as e:
+            if self.__stop_event.is_set():
+                self.queue.release(lease)
+            elif not e.retryable:
+                logger.warning("Give up task {}: {}".format(lease.task_id, e))
+                self.queue.fail(lease)
+            else:
+                logger.error("Failed to run task {}.".format(lease.task_id), exc_info=True)
+                self.queue.release(lease, delay=self.poll_interval, count_attempt=True)
+            return
+        except Exception:
+            if self.__stop_event.is_set():
+                self.queue.release(lease)
+            else:
+                logger.error("Failed to run task {}.".format(lease.task_id), exc_info=True)
+                self.queue.release(lease, delay=self.poll_interval, count_attempt=True)
+            return
+
+        if done and self.queue.complete(lease):
+            with self.__lock:
+                self.completed[lease.kind] += 1
+
+
+    def __search(self, lease):
+        """fetch a search page, put it's conversations and the next page
+
+
+        Args:
+            lease: the lease of a search task
+
+        Returns: True if the task is done
+        """
+        payload = lease.payload
+        keyword = payload["keyword"]
+        max_result = payload["max_result"]
+        search = self.context.new_search(keyword)
+        search.next_cursor = payload["cursor"]
+
+        ids = search.get_next_ids()
+        if len(ids) == 0:
+            empty = payload.get("empty", 0) + 1
+            if search.next_cursor is None or search.next_cursor == payload["cursor"] or empty >= self.max_empty_pages:
+                # twitter answers the end of the results with the cursor it was asked
+                logger.info("No more search results of '{}'. Stop searching.".format(keyword))
+                return True
+            logger.info("No search results of '{}' on this page. Search the next one later.".format(keyword))
+            self.queue.put(SEARCH, search_task_id(keyword, payload["page"] + 1), dict(payload, cursor=search.next_cursor, page=payload["page"] + 1, empty=empty), delay=self.empty_search_delay)
+            return True
+
+        if max_result != -1:
+            ids = ids[:max(max_result - payload["fetched"], 0)]
+        for tweet_id in ids:
+            self.queue.put(CONVERSATION, conversation_task_id(tweet_id), {"keyword": keyword, "tweet_id": tweet_id, "cursor": None, "timelines": 0, "started": False})
+        fetched = payload["fetched"] + len(ids)
+        logger.info("Fetch {} search results of '{}'.".format(len(ids), keyword))
+
+        if max_result == -1 or fetched < max_result:
+            self.queue.put(SEARCH, search_task_id(keyword, payload["page"] + 1), dict(payload, cursor=search.next_cursor, page=payload["page"] + 1, fetched=fetched, empty=0), delay=self.sleep_duration)
+        else:
+            logger.info("Reached max_result of '{}'.".format(keyword))
+        return True
+
+
+    def __download_twitter(self, lease):
+        """download a conversation, or the rest of it, saving the progress in the lease
+
+        The storage is flushed before the progress is saved, so the next
+        worker never skips a write the payload counts as done, even if this
+        process dies with writes buffered.
+
+        Args:
+            lease: the lease of a conversation task
+
+        Returns: True if the whole tweet is downloaded
+        """
+        payload = lease.payload
+        tweet_id = payload["tweet_id"]
+        storage = self.storage_of(payload["keyword"])
+        lost = []
+
+        def on_saved(cursor, timelines):
+            storage.flush()
+            if not self.queue.extend(lease, self.lease_duration, dict(lease.payload, cursor=cursor, timelines=timelines, started=True)):
+                logger.warning("Lost the lease of tweet {}.".format(tweet_id))
+                lost.append(True)
+                return False
+            return True
+
+        progress = {"cursor": payload["cursor"], "timelines": payload["timelines"]} if payload["started"] else None
+        if self.context.download(tweet_id, storage, self.__stop_event, progress=progress, on_saved=on_saved):
+            return True
+        if not lost:
+            # the progress is in the payload, the next worker continues
+            self.queue.release(lease)
+        return False
@@ -0,0 +1,147 @@
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_POOL_SIZE = 10
+
+
+class HttpSession:
+    """A thread-safe, keep-alive HTTP session shared by all fetchers
+
+    Every host gets its own `HTTPAdapter` (and therefore its own urllib3
+    connection pool). The adapters are shared by all threads, while each
+    thread owns a lightweight `requests.Session` that mounts them, so
+    connections to api.twitter.com are reused across every `Tweet` and
+    `TwitterSearch` instance.
+    """
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, pool_sizes=None, max_retries=0):
+        """
+        Args:
+            pool_size: the default maximum amount of kept-alive connections per host.
+            pool_sizes: a dictionary to override `pool_size` for specific hosts. for example:
+                {"api.twitter.com": 32}
+            max_retries: the `max_retries` passed to every `HTTPAdapter`.
+        """
+        self.pool_size = pool_size
+        self.pool_sizes = dict(pool_sizes or {})
+        self.max_retries = max_retries
+
+        self.__lock = threading.Lock()
+        self.__adapters = {}
+        self.__local = threading.local()
+        self.__sessions = []
+        self.__response_hooks = []
+
+    def _get_adapter(self, host):
+        with self.__lock:
+            adapter = self.__adapters.get(host)
+            if adapter is None:
+                size = self.pool_sizes.get(host, self.pool_size)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=self.max_retries)
+                self.__adapters[host] = adapter
+            return adapter
+
+    def _get_session(self, url):
+        session = getattr(self.__local, "session", None)
+        if session is None:
+            session = requests.Session()
+            with self.__lock:
+                self.__sessions.append(session)
+            self.__local.session = session
+
+        parts = urlsplit(url)
+        prefix = "{}://{}/".format(parts.scheme, parts.netloc)
+        if prefix not in session.adapters:
+            session.mount(prefix, self._get_adapter(parts.netloc))
+        return session
+
+    def add_response_hook(self, hook):
+        """register a callable invoked with every response
+
+        Args:
+            hook: a callable receiving the `requests.Response` object.
+
+        Returns: None
+        """
+        with self.__lock:
+            self.__response_hooks.append(hook)
+
+    def remove_response_hook(self, hook):
+        with self.__lock:
+            if hook in self.__response_hooks:
+                self.__response_hooks.remove(hook)
+
+    def _dispatch(self, response):
+        for hook in list(self.__response_hooks):
+            hook(response)
+        return response
+
+    def request(self, method, url, **kwargs):
+        """send a request through the pooled session of the current thread
+
+        Args:
+            method: the http method, e.g. "GET".
+            url: the full url.
+            kwargs: passed to `requests.Session.request`.
+
+        Returns: the `requests.Response` object
+        """
+        response = self._get_session(url).request(method, url, **kwargs)
+        return self._dispatch(response)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        """close every connection pool and thread-local session
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            sessions, self.__sessions = self.__sessions, []
+            adapters, self.__adapters = self.__adapters, {}
+        for session in sessions:
+            session.close()
+        for adapter in adapters.values():
+            adapter.close()
+        self.__local = threading.local()
+
+
+__default_session = None
+__default_session_lock = threading.Lock()
+
+
+def get_default_session():
+    """get the process-wide `HttpSession`, creating it on first use
+    """
+    global __default_session
+    with __default_session_lock:
+        if __default_session is None:
+            __default_session = HttpSession()
+        return __default_session
+
+
+def set_default_session(session):
+    """replace the process-wide session
+
+    Args:
+        session: any object providing `get(url, **kwargs)` and `post(url, **kwargs)`,
+            e.g. an `HttpSession` with other pool sizes or a fake transport in tests.
+            pass None to fall back to a fresh `HttpSession`.
+
+    Returns: the previous session (may be None)
+    """
+    global __default_session
+    with __default_session_lock:
+        previous = __default_session
+        __default_session = session
+        return previous
@@ -0,0 +1,112 @@
+"""The json codec of the responses and the storages
+
+Bodies are decoded straight from the bytes of the response, without decoding
+them to a string first, and documents are encoded to UTF-8 bytes ready to be
+written. orjson is used if it is installed, otherwise the standard `json`.
+
+    from tweet_crawler import json_codec
+    obj = json_codec.loads(response.content)
+    data = json_codec.dumps(obj)
+"""
+import json
+
+
+def _import_orjson():
+    try:
+        import orjson
+    except ImportError:
+        raise ImportError("OrjsonCodec requires orjson. Install it with `pip install orjson`.")
+    return orjson
+
+
+class JsonCodec:
+    """The standard `json` module
+    """
+    name = "json"
+
+    def loads(self, data):
+        """decode a document
+
+        Args:
+            data: the document, as bytes or string
+
+        Returns: the decoded object. raises a ValueError if the document is broken.
+        """
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """encode a document to compact UTF-8 bytes
+        """
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonCodec(JsonCodec):
+    """orjson, several times faster than `json` for both directions. requires orjson.
+    """
+    name = "orjson"
+
+    def __init__(self):
+        self.orjson = _import_orjson()
+
+    def loads(self, data):
+        # orjson.JSONDecodeError is a ValueError too
+        return self.orjson.loads(data)
+
+    def dumps(self, obj):
+        return self.orjson.dumps(obj)
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec,
+    OrjsonCodec.name: OrjsonCodec,
+}
+
+
+def get_codec(name=None):
+    """create a codec
+
+    Args:
+        name: "json" or "orjson". None for orjson if it is installed, otherwise json.
+
+    Returns: a `JsonCodec`
+    """
+    if name is not None:
+        if name not in CODECS:
+            raise ValueError("Unknown json codec '{}'. Choose from {}.".format(name, ", ".join(CODECS)))
+        return CODECS[name]()
+    try:
+        return OrjsonCodec()
+    except ImportError:
+        return JsonCodec()
+
+
+_codec = get_codec()
+
+
+def set_codec(name):
+    """replace the codec used by `loads` and `dumps`
+
+    Args:
+        name: see `get_codec`
+
+    Returns: the new codec
+    """
+    global _codec
+    _codec = get_codec(name)
+    return _codec
+
+
+def current_codec():
+    return _codec
+
+
+def loads(data):
+    """decode a document with the current codec. see `JsonCodec.loads`
+    """
+    return _codec.loads(data)
+
+
+def dumps(obj):
+    """encode a document with the current codec. see `JsonCodec.dumps`
+    """
+    return _codec.dumps(obj)
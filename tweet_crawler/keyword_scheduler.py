@@ -0,0 +1,198 @@
+import threading
+
+from tweet_crawler import logger
+
+
+class KeywordTask:
+    """A keyword to search, it's share of the download workers and it's budget
+    """
+
+    def __init__(self, keyword, weight=1, max_result=None):
+        """
+        Args:
+            keyword: the keyword to search
+            weight: the share of the workers relative to the other keywords. a keyword of weight 2 is served twice as often as one of weight 1.
+            max_result: the maximum amount of tweets to download for this keyword. None to use the default of the crawler. -1 for infinity.
+        """
+        if weight <= 0:
+            raise ValueError("The weight of '{}' must be positive.".format(keyword))
+        self.keyword = keyword
+        self.weight = weight
+        self.max_result = max_result
+
+    def __repr__(self):
+        return "KeywordTask({!r}, weight={}, max_result={})".format(self.keyword, self.weight, self.max_result)
+
+
+def load_keywords(path):
+    """read the keywords of a file
+
+    One keyword per line, optionally followed by it's weight and it's
+    `max_result`, separated by tabs. Blank lines and lines starting with `#`
+    are ignored. for example:
+
+        spacex
+        starship<TAB>2
+        falcon 9<TAB>1<TAB>500
+
+    Args:
+        path: the keyword file
+
+    Returns: a list of `KeywordTask`
+    """
+    tasks = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip("\r\n")
+            if line.strip() == "" or line.lstrip().startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) > 3:
+                raise ValueError("{}:{} expected 'keyword[<TAB>weight[<TAB>max_result]]'".format(path, line_no))
+            try:
+                weight = float(fields[1]) if len(fields) > 1 and fields[1] != "" else 1
+                max_result = int(fields[2]) if len(fields) > 2 and fields[2] != "" else None
+            except ValueError:
+                raise ValueError("{}:{} the weight and the max_result must be numbers".format(path, line_no))
+            tasks.append(KeywordTask(fields[0].strip(), weight=weight, max_result=max_result))
+    return tasks
+
+
+def to_keyword_tasks(keywords):
+    """normalize a keyword, a `KeywordTask` or a list of them
+
+    Args:
+        keywords: a keyword, a `KeywordTask`, or a list of keywords and `KeywordTask`s
+
+    Returns: a list of `KeywordTask`
+    """
+    if isinstance(keywords, (str, KeywordTask)):
+        keywords = [keywords]
+    tasks = [keyword if isinstance(keyword, KeywordTask) else KeywordTask(keyword) for keyword in keywords]
+    if len(tasks) == 0:
+        raise ValueError("No keyword to search.")
+    seen = set()
+    for task in tasks:
+        if task.keyword in seen:
+            raise ValueError("The keyword '{}' is given twice.".format(task.keyword))
+        seen.add(task.keyword)
+    return tasks
+
+
+class KeywordScheduler:
+    """Share the download workers between the searches of many keywords
+
+    Every keyword has it's own `SearchPrefetcher`, all notifying
+    `self.condition`. `get()` picks the keyword to serve by smooth weighted
+    round-robin over the keywords having ids queued, so the workers are
+    shared by the weights, a keyword never waits behind a long burst of
+    another one, and an idle keyword does not hold a share back.
+    """
+
+    def __init__(self):
+        # reentrant, the prefetchers take it again inside `get()`
+        self.condition = threading.Condition(threading.RLock())
+        self.prefetchers = {}
+        self.__weights = {}
+        self.__current = {}
+        self.__closed = False
+
+    def add(self, keyword, prefetcher, weight=1):
+        """add the prefetcher of a keyword. it must be created with `condition=self.condition`.
+
+        Args:
+            keyword: the keyword
+            prefetcher: a `search_prefetcher.SearchPrefetcher`
+            weight: see `KeywordTask`
+
+        Returns: None
+        """
+        with self.condition:
+            self.prefetchers[keyword] = prefetcher
+            self.__weights[keyword] = weight
+            self.__current[keyword] = 0
+
+    @property
+    def fetched_ids(self):
+        """the amount of searched ids of every keyword
+        """
+        return sum(prefetcher.fetched_ids for prefetcher in self.prefetchers.values())
+
+    def start(self):
+        """start every prefetcher
+
+        Args: None
+
+        Returns: None
+        """
+        for prefetcher in self.prefetchers.values():
+            prefetcher.start()
+
+    def close(self):
+        """stop every prefetcher and wake every waiting `get()`
+
+        Args: None
+
+        Returns: None
+        """
+        with self.condition:
+            self.__closed = True
+            self.condition.notify_all()
+        for prefetcher in self.prefetchers.values():
+            prefetcher.close()
+
+    def qsize(self):
+        """the amount of queued ids of every keyword
+        """
+        with self.condition:
+            return sum(prefetcher.qsize() for prefetcher in self.prefetchers.values())
+
+    def __ready(self):
+        return [keyword for keyword, prefetcher in self.prefetchers.items() if prefetcher.qsize() > 0]
+
+    def __exhausted(self):
+        return all(prefetcher.exhausted() for prefetcher in self.prefetchers.values())
+
+    def get(self, timeout=None):
+        """take the next tweet id of the keyword whose turn it is, blocking until one is fetched
+
+        Args:
+            timeout: the maximum time in seconds to wait. None to wait forever.
+
+        Returns: a tuple of the keyword and the tweet id. None once every search is done, the scheduler is closed or `timeout` is reached.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.__closed or len(self.__ready()) > 0 or self.__exhausted(), timeout)
+            if self.__closed:
+                return None
+            ready = self.__ready()
+            if len(ready) == 0:
+                return None
+
+            total = 0
+            for keyword in ready:
+                self.__current[keyword] += self.__weights[keyword]
+                total += self.__weights[keyword]
+            keyword = max(ready, key=lambda k: self.__current[k])
+            self.__current[keyword] -= total
+
+            tweet_id = self.prefetchers[keyword].get(timeout=0)
+            if tweet_id is None:
+                return None
+            logger.debug("Serve '{}' tweet {}.".format(keyword, tweet_id))
+            return keyword, tweet_id
+
+    def task_done(self, keyword, tweet_id):
+        """see `SearchPrefetcher.task_done()`
+        """
+        self.prefetchers[keyword].task_done(tweet_id)
+
+    def snapshot(self):
+        """the `SearchPrefetcher.snapshot()` of every keyword
+
+        Args: None
+
+        Returns: a dictionary keyed by keyword
+        """
+        with self.condition:
+            return {keyword: prefetcher.snapshot() for keyword, prefetcher in self.prefetchers.items()}
@@ -0,0 +1,148 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from tweet_crawler import json_codec
+from tweet_crawler.records import TimelineRecord
+
+
+def get_reply(tweets, content):
+    """the id, the text and the author id of a tweet of a page
+
+    Shared by `tweet_parser.Tweet` and the worker processes. It logs nothing,
+    the workers do not import `tweet_crawler.logger`.
+
+    Args:
+        tweets: the "globalObjects.tweets" object of the page
+        content: the "content" object of an item
+
+    Returns: a tuple of (tweet_id, text, author_id). the text is "[ERROR]" and the author None if the tweet is missing.
+    """
+    if "tweet" not in content:
+        return None, "[ERROR]", None
+    tweet_id = content["tweet"]["id"]
+    tweet = tweets.get(tweet_id)
+    if tweet is None:
+        return tweet_id, "[ERROR]", None
+    return tweet_id, tweet["full_text"], tweet.get("user_id_str")
+
+
+def parse_timeline_items(tweets, items):
+    """the replies of the items of a timeline module, and the cursor of the rest of it
+
+    Args:
+        tweets: the "globalObjects.tweets" object of the page
+        items: the items of the module
+
+    Returns:
+        timeline: a `records.TimelineRecord` of the replies
+        next_cursor: the cursor of the rest of the timeline. None if no cursor.
+    """
+    timeline = TimelineRecord()
+    cursor = None
+    for item in items:
+        content = item["item"]["content"]
+        if "tweet" in content:
+            timeline.append(*get_reply(tweets, content))
+        elif "timelineCursor" in content:
+            cursor = content["timelineCursor"]["value"]
+    return timeline, cursor
+
+
+def find_instruction(instructions, name):
+    """the first instruction of a page named `name`, e.g. "addEntries". None if the page has none.
+    """
+    for instruction in instructions:
+        if name in instruction:
+            return instruction[name]
+    return None
+
+
+def parse_conversation_page(content):
+    """decode a page of a conversation and keep only what `tweet_parser.Tweet` needs of it
+
+    Args:
+        content: the body of the response, as bytes. see `tweet_fetcher.fetch_tweet(raw=True)`.
+
+    Returns: a dictionary. for example:
+        {
+            "tweet": "the main tweet",  # None if the page has no main tweet
+            "author_id": "the id of the author of the main tweet",  # or None
+            "modules": [
+                [TimelineRecord(...), "the cursor of the rest of the timeline"],
+                ......
+            ],
+            "next_cursor": "the cursor of the next batch of timelines",  # or None
+        }
+    """
+    source = json_codec.loads(content)
+    tweets = source["globalObjects"]["tweets"]
+    add_entries = find_instruction(source["timeline"]["instructions"], "addEntries")
+    page = {"tweet": None, "author_id": None, "modules": [], "next_cursor": None}
+    if add_entries is None:
+        return page
+
+    for entry in add_entries["entries"]:
+        entry_content = entry["content"]
+        if "item" in entry_content:
+            _, page["tweet"], page["author_id"] = get_reply(tweets, entry_content["item"]["content"])
+        elif "timelineModule" in entry_content:
+            page["modules"].append(list(parse_timeline_items(tweets, entry_content["timelineModule"]["items"])))
+        elif "operation" in entry_content:
+            page["next_cursor"] = entry_content["operation"]["cursor"]["value"]
+    return page
+
+
+def parse_module_page(content):
+    """decode a page fetched with the cursor of a timeline module
+
+    Args:
+        content: the body of the response, as bytes.
+
+    Returns:
+        timeline: a `records.TimelineRecord` of the replies of the page
+        next_cursor: the cursor of the rest of the timeline, None if no cursor.
+    """
+    source = json_codec.loads(content)
+    add_to_module = find_instruction(source["timeline"]["instructions"], "addToModule")
+    if add_to_module is None:
+        return TimelineRecord(), None
+    return parse_timeline_items(source["globalObjects"]["tweets"], add_to_module["moduleItems"])
+
+
+class ParsePool:
+    """Decode and parse the pages of the conversations in worker processes
+
+    The threads only fetch the bytes of a page and get back a few texts and
+    cursors, so decoding the large json documents does not hold the GIL of
+    the crawling process.
+    """
+
+    def __init__(self, processes=None):
+        """
+        Args:
+            processes: the amount of worker processes. default is the amount of CPUs.
+        """
+        self.processes = processes or os.cpu_count() or 1
+        # spawn, a forked child could inherit a lock held by another thread
+        self.executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def parse_conversation(self, content):
+        """see `parse_conversation_page`
+        """
+        return self.executor.submit(parse_conversation_page, content).result()
+
+    def parse_module(self, content):
+        """see `parse_module_page`
+        """
+        return self.executor.submit(parse_module_page, content).result()
+
+    async def parse_conversation_async(self, content):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, parse_conversation_page, content)
+
+    async def parse_module_async(self, content):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, parse_module_page, content)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,166 @@
+import time
+import threading
+
+from tweet_crawler import logger
+from tweet_crawler.token_pool import endpoint_of
+
+
+class Bucket:
+    """The token bucket of one endpoint and guest token
+    """
+
+    def __init__(self, burst):
+        """
+        Args:
+            burst: the maximum amount of requests sent without spacing
+        """
+        self.burst = burst
+        self.tokens = float(burst)
+        self.rate = None
+        self.remaining = None
+        self.reset = None
+        self.updated_at = time.time()
+
+    def update(self, remaining, reset, now):
+        """spread the remaining requests evenly until the window is reset
+        """
+        self.remaining = remaining
+        self.reset = reset
+        self.refill(now)
+        if reset is None or reset <= now or remaining <= 0:
+            self.rate = None
+        else:
+            self.rate = remaining / (reset - now)
+        self.tokens = min(self.tokens, remaining)
+
+    def refill(self, now):
+        if self.reset is not None and now >= self.reset:
+            # the window is over, the limit is unknown until the next response
+            self.rate = None
+            self.remaining = None
+            self.reset = None
+        if self.rate is not None:
+            self.tokens = min(self.tokens + (now - self.updated_at) * self.rate, self.burst)
+        else:
+            self.tokens = max(self.tokens, float(self.burst))
+        self.updated_at = now
+
+    def reserve(self, now):
+        """take a request slot
+
+        Returns: the time duration in seconds to wait before sending the request
+        """
+        self.refill(now)
+        if self.remaining is not None and self.remaining <= 0 and self.reset is not None:
+            # wait for the reset, then the request belongs to the next window
+            return self.reset - now
+
+        delay = 0
+        if self.rate is not None and self.tokens < 1:
+            delay = (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        if self.remaining is not None:
+            self.remaining -= 1
+        return delay
+
+
+class RateLimiter:
+    """A token bucket per endpoint and guest token driven by the rate limit headers
+
+    Every response updates the bucket of it's endpoint and guest token with
+    `x-rate-limit-remaining` and `x-rate-limit-reset`: the remaining requests
+    are spread evenly until the reset, with bursts of up to `burst` requests.
+    A request waits until the reset once the remaining requests are used up.
+    Requests with an unknown limit are not delayed.
+    """
+
+    def __init__(self, burst=1, retry_after=60):
+        """
+        Args:
+            burst: the maximum amount of requests of a bucket sent without spacing
+            retry_after: the time duration in seconds to wait after a 429 without `x-rate-limit-reset`
+        """
+        self.burst = burst
+        self.retry_after = retry_after
+        self.__buckets = {}
+        self.__lock = threading.Lock()
+
+    def __bucket(self, endpoint, guest_token):
+        key = (endpoint, guest_token)
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            bucket = Bucket(self.burst)
+            self.__buckets[key] = bucket
+        return bucket
+
+    def update(self, endpoint, guest_token, remaining, reset):
+        """record the rate limit of an endpoint and guest token
+
+        Args:
+            endpoint: see `token_pool.endpoint_of()`
+            guest_token: the guest token string
+            remaining: the remaining requests
+            reset: the epoch time when the quota is reset
+
+        Returns: None
+        """
+        with self.__lock:
+            self.__bucket(endpoint, guest_token).update(remaining, reset, time.time())
+
+    def reserve(self, endpoint, guest_token):
+        """take a request slot without waiting
+
+        Args:
+            endpoint: see `token_pool.endpoint_of()`
+            guest_token: the guest token string
+
+        Returns: the time duration in seconds to wait before sending the request
+        """
+        with self.__lock:
+            return max(self.__bucket(endpoint, guest_token).reserve(time.time()), 0)
+
+    def wait(self, endpoint, guest_token, stop_event=None):
+        """block until a request can be sent
+
+        Args:
+            endpoint: see `token_pool.endpoint_of()`
+            guest_token: the guest token string
+            stop_event: a `threading.Event` to stop waiting
+
+        Returns: the time duration in seconds waited
+        """
+        delay = self.reserve(endpoint, guest_token)
+        if delay > 0:
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+        return delay
+
+    def observe(self, response):
+        """an `HttpSession` response hook reading the rate limit headers
+
+        Args:
+            response: the response of a request sent with a guest token
+
+        Returns: None
+        """
+        request = getattr(response, "request", None)
+        if request is None:
+            return
+        guest_token = request.headers.get("x-guest-token")
+        if guest_token is None:
+            return
+        remaining = response.headers.get("x-rate-limit-remaining")
+        reset = response.headers.get("x-rate-limit-reset")
+        try:
+            remaining = int(remaining) if remaining is not None else None
+            reset = float(reset) if reset is not None else None
+        except ValueError:
+            logger.debug("Ignore the malformed rate limit headers {!r} and {!r}.".format(remaining, reset))
+            return
+
+        if response.status_code == 429:
+            self.update(endpoint_of(request.url), guest_token, 0, reset or time.time() + self.retry_after)
+        elif remaining is not None:
+            self.update(endpoint_of(request.url), guest_token, remaining, reset)
@@ -0,0 +1,135 @@
+"""Compact records of the parsed conversations
+
+The parsers build these records instead of nested dictionaries. They have no
+`__dict__`, and a timeline keeps it's replies as three columns, so the list of
+texts of the dictionary shape expected by the storages is the column itself,
+shared without a copy. see `ConversationRecord.to_dict`.
+"""
+
+
+class ReplyRecord:
+    """A tweet of a timeline
+    """
+    __slots__ = ("tweet_id", "text", "author_id")
+
+    def __init__(self, tweet_id, text, author_id=None):
+        """
+        Args:
+            tweet_id: the id of the tweet
+            text: the full text of the tweet. "[ERROR]" if it is missing from the response.
+            author_id: the id of the user who wrote it, None if unknown.
+        """
+        self.tweet_id = tweet_id
+        self.text = text
+        self.author_id = author_id
+
+    def __eq__(self, other):
+        if not isinstance(other, ReplyRecord):
+            return NotImplemented
+        return (self.tweet_id, self.text, self.author_id) == (other.tweet_id, other.text, other.author_id)
+
+    def __repr__(self):
+        return "ReplyRecord({!r}, {!r}, {!r})".format(self.tweet_id, self.text, self.author_id)
+
+
+class TimelineRecord:
+    """A timeline, the replies to a tweet replying to each other
+
+    The replies are kept as the columns `tweet_ids`, `texts` and `author_ids`.
+    Iterating or indexing a timeline creates `ReplyRecord`s on demand.
+    """
+    __slots__ = ("tweet_ids", "texts", "author_ids")
+
+    def __init__(self, tweet_ids=None, texts=None, author_ids=None):
+        self.tweet_ids = tweet_ids if tweet_ids is not None else []
+        self.texts = texts if texts is not None else []
+        self.author_ids = author_ids if author_ids is not None else [None] * len(self.texts)
+
+    @classmethod
+    def from_texts(cls, texts):
+        """a timeline of the dictionary shape, with unknown ids
+        """
+        return cls([None] * len(texts), list(texts))
+
+    def append(self, tweet_id, text, author_id=None):
+        self.tweet_ids.append(tweet_id)
+        self.texts.append(text)
+        self.author_ids.append(author_id)
+
+    def extend(self, other):
+        """append the replies of another `TimelineRecord`
+        """
+        self.tweet_ids += other.tweet_ids
+        self.texts += other.texts
+        self.author_ids += other.author_ids
+
+    def truncate(self, length):
+        """keep the first `length` replies
+        """
+        del self.tweet_ids[length:]
+        del self.texts[length:]
+        del self.author_ids[length:]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        return ReplyRecord(self.tweet_ids[index], self.texts[index], self.author_ids[index])
+
+    def __iter__(self):
+        return map(ReplyRecord, self.tweet_ids, self.texts, self.author_ids)
+
+    def __eq__(self, other):
+        if not isinstance(other, TimelineRecord):
+            return NotImplemented
+        return (self.tweet_ids, self.texts, self.author_ids) == (other.tweet_ids, other.texts, other.author_ids)
+
+    def __repr__(self):
+        return "TimelineRecord({!r}, {!r}, {!r})".format(self.tweet_ids, self.texts, self.author_ids)
+
+
+class ConversationRecord:
+    """A tweet and the timelines downloaded with it
+    """
+    __slots__ = ("tweet_id", "text", "author_id", "timelines")
+
+    def __init__(self, tweet_id, text="", author_id=None, timelines=None):
+        """
+        Args:
+            tweet_id: the id of the tweet
+            text: the full text of the tweet
+            author_id: the id of the user who wrote it, None if unknown.
+            timelines: a list of `TimelineRecord`
+        """
+        self.tweet_id = tweet_id
+        self.text = text
+        self.author_id = author_id
+        self.timelines = timelines if timelines is not None else []
+
+    def to_dict(self):
+        """the dictionary shape of `tweet_parser.Tweet.get_main_tweet`, as saved by the storages
+
+        The lists of texts are the `texts` of the timelines, not copies.
+        """
+        return {
+            "tweet": self.text,
+            "tweet_id": self.tweet_id,
+            "timelines": [timeline.texts for timeline in self.timelines],
+        }
+
+    @classmethod
+    def from_dict(cls, parsed_tweet):
+        """a record of the dictionary shape, with unknown ids
+        """
+        return cls(
+            parsed_tweet["tweet_id"],
+            parsed_tweet["tweet"],
+            timelines=[TimelineRecord.from_texts(texts) for texts in parsed_tweet["timelines"]])
+
+    def __eq__(self, other):
+        if not isinstance(other, ConversationRecord):
+            return NotImplemented
+        return (self.tweet_id, self.text, self.author_id, self.timelines) == (other.tweet_id, other.text, other.author_id, other.timelines)
+
+    def __repr__(self):
+        return "ConversationRecord({!r}, {!r}, {!r}, {!r})".format(self.tweet_id, self.text, self.author_id, self.timelines)
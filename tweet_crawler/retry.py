@@ -0,0 +1,322 @@
+import time
+import asyncio
+import random
+import threading
+
+from tweet_crawler import logger
+
+
+class FetchError(Exception):
+    """A failed request to twitter
+
+    Attributes:
+        status_code: the response code. None if no response is received.
+        retry_after: the epoch time when the request may succeed again. None if unknown.
+    """
+
+    retryable = True
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimitError(FetchError):
+    """429, the quota of the guest token is used up"""
+
+
+class AuthError(FetchError):
+    """401/403, the bearer token or the guest token is no longer accepted"""
+
+
+class TransientError(FetchError):
+    """5xx, a network error or a broken body"""
+
+
+class NotFoundError(FetchError):
+    """404, the tweet is deleted or protected. never retried."""
+
+    retryable = False
+
+
+class CircuitOpenError(FetchError):
+    """the circuit breaker of the endpoint is open"""
+
+
+def error_from_response(response):
+    """classify a failed response
+
+    Args:
+        response: a response whose code is not 200
+
+    Returns: a `FetchError`
+    """
+    status_code = response.status_code
+    message = "HTTP {} from {}".format(status_code, getattr(getattr(response, "request", None), "url", "twitter"))
+    if status_code == 429:
+        try:
+            reset = float(response.headers.get("x-rate-limit-reset"))
+        except (TypeError, ValueError):
+            # missing or malformed, fall back to the backoff of the policy
+            reset = None
+        return RateLimitError(message, status_code, reset)
+    if status_code in (401, 403):
+        return AuthError(message, status_code)
+    if status_code == 404:
+        return NotFoundError(message, status_code)
+    if status_code >= 500 or status_code == 408:
+        return TransientError(message, status_code)
+    error = FetchError(message, status_code)
+    error.retryable = False
+    return error
+
+
+class CircuitBreaker:
+    """Stop sending requests to an endpoint failing again and again
+
+    The circuit opens after `failure_threshold` transient failures in a row.
+    Once `recovery_timeout` seconds have passed a single probe request is let
+    through: the circuit closes if it succeeds and opens again if it fails.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        """
+        Args:
+            failure_threshold: the amount of failures in a row to open the circuit
+            recovery_timeout: the time duration in seconds before a probe request is sent
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.__probing = False
+        self.__lock = threading.Lock()
+
+    def wait_time(self, now=None):
+        """ask to send a request
+
+        Args:
+            now: the current epoch time
+
+        Returns: the time duration in seconds to wait before asking again. 0 if the request can be sent.
+        """
+        now = now or time.time()
+        with self.__lock:
+            if self.state == self.CLOSED:
+                return 0
+            if self.state == self.OPEN:
+                reopen_at = self.opened_at + self.recovery_timeout
+                if now < reopen_at:
+                    return reopen_at - now
+                self.state = self.HALF_OPEN
+                self.__probing = False
+            if self.__probing:
+                return min(self.recovery_timeout, 1)
+            self.__probing = True
+            return 0
+
+    def record_success(self):
+        with self.__lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.__probing = False
+
+    def record_failure(self, now=None):
+        with self.__lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("Circuit opened after {} failures.".format(self.failures))
+                self.state = self.OPEN
+                self.opened_at = now or time.time()
+                self.__probing = False
+
+
+class RetryPolicy:
+    """Retry failed requests with exponential backoff and full jitter
+
+    Every endpoint has it's own `CircuitBreaker`. Only transient failures
+    count against the circuit. `NotFoundError` and unclassified client errors
+    are raised at once.
+    """
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=30, failure_threshold=5, recovery_timeout=30):
+        """
+        Args:
+            max_retries: the maximum amount of retries of a request
+            base_delay: the backoff in seconds of the first retry, doubled by every retry
+            max_delay: the maximum backoff in seconds
+            failure_threshold: see `CircuitBreaker`
+            recovery_timeout: see `CircuitBreaker`
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self.__breakers = {}
+        self.__lock = threading.Lock()
+        self.__stop_event = threading.Event()
+
+    def breaker(self, endpoint):
+        """the `CircuitBreaker` of an endpoint
+        """
+        with self.__lock:
+            breaker = self.__breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.recovery_timeout)
+                self.__breakers[endpoint] = breaker
+            return breaker
+
+    def backoff(self, attempt):
+        """the time duration in seconds to wait before a retry
+
+        Args:
+            attempt: the amount of failed attempts minus one
+
+        Returns: a random delay between 0 and `base_delay * 2 ** attempt`, capped by `max_delay`
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def close(self):
+        """interrupt every waiting retry. the last error of a request is raised.
+        """
+        self.__stop_event.set()
+
+    @property
+    def closed(self):
+        """True once `close()` is called
+        """
+        return self.__stop_event.is_set()
+
+    def _error_of(self, exception):
+        """the `FetchError` of an exception raised by a request. None if it is not a failed request.
+        """
+        if isinstance(exception, FetchError):
+            return exception
+        if isinstance(exception, OSError):
+            return TransientError(str(exception))
+        return None
+
+    def _record_failure(self, endpoint, breaker, error, attempt):
+        """count a failed attempt in the circuit of the endpoint, and raise the error if it is not retried
+
+        Args:
+            endpoint: the endpoint of the request
+            breaker: the `CircuitBreaker` of the endpoint
+            error: the `FetchError` of the attempt
+            attempt: the amount of failed attempts before this one
+
+        Returns: the time duration in seconds to wait before the next attempt
+        """
+        if isinstance(error, TransientError):
+            breaker.record_failure()
+        elif breaker.state == CircuitBreaker.HALF_OPEN:
+            # the probe got an answer, the endpoint is up
+            breaker.record_success()
+        if not error.retryable or attempt >= self.max_retries:
+            raise error
+
+        delay = self.backoff(attempt)
+        logger.info("Retry {} request in {:.2f}s after {}: {}".format(endpoint, delay, type(error).__name__, error))
+        return delay
+
+    def call(self, endpoint, fetch):
+        """call `fetch()` until it succeeds or the retries are used up
+
+        Args:
+            endpoint: the endpoint of the request. see `token_pool.endpoint_of()`.
+            fetch: a callable sending the request. it raises a `FetchError` (or an `OSError`) on failure.
+
+        Returns: the result of `fetch()`
+        """
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            wait = breaker.wait_time()
+            while wait > 0:
+                if self.__stop_event.wait(wait):
+                    raise CircuitOpenError("The circuit of {} is open.".format(endpoint))
+                wait = breaker.wait_time()
+
+            try:
+                result = fetch()
+            except (FetchError, OSError) as e:
+                error = self._error_of(e)
+            else:
+                breaker.record_success()
+                return result
+
+            delay = self._record_failure(endpoint, breaker, error, attempt)
+            attempt += 1
+            if self.__stop_event.wait(delay):
+                raise error
+
+
+class AsyncRetryPolicy(RetryPolicy):
+    """The asyncio version of `RetryPolicy`
+
+    The errors are classified and counted against the circuits alike, only
+    `fetch` is awaited and the backoff is waited without blocking the event
+    loop.
+    """
+
+    def _record_failure(self, endpoint, breaker, error, attempt):
+        """see `RetryPolicy._record_failure`. an `AuthError` is raised at once.
+        """
+        if isinstance(error, AuthError):
+            # the tokens of an async request are not replaced between the attempts,
+            # the caller refreshes them instead
+            attempt = self.max_retries
+        return super()._record_failure(endpoint, breaker, error, attempt)
+
+    async def __sleep(self, delay):
+        """wait `delay` seconds, or less once closed
+
+        Returns: True if closed
+        """
+        deadline = time.monotonic() + delay
+        while not self.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(remaining, 0.5))
+        return True
+
+    async def call(self, endpoint, fetch):
+        """await `fetch()` until it succeeds or the retries are used up. see `RetryPolicy.call`
+
+        Args:
+            endpoint: the endpoint of the request. see `token_pool.endpoint_of()`.
+            fetch: a callable returning an awaitable which sends the request. it raises a `FetchError` (or an `OSError`) on failure.
+
+        Returns: the result of `fetch()`
+        """
+        breaker = self.breaker(endpoint)
+        attempt = 0
+        while True:
+            wait = breaker.wait_time()
+            while wait > 0:
+                if await self.__sleep(wait):
+                    raise CircuitOpenError("The circuit of {} is open.".format(endpoint))
+                wait = breaker.wait_time()
+
+            try:
+                result = await fetch()
+            except (FetchError, OSError) as e:
+                error = self._error_of(e)
+            else:
+                breaker.record_success()
+                return result
+
+            delay = self._record_failure(endpoint, breaker, error, attempt)
+            attempt += 1
+            if await self.__sleep(delay):
+                raise error
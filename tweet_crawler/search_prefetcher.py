@@ -0,0 +1,228 @@
+import threading
+from collections import deque
+
+from tweet_crawler import logger
+
+
+class SearchPrefetcher:
+    """Fetch search pages ahead of the download workers
+
+    A background thread keeps up to `prefetch_pages` pages of tweet ids
+    buffered. It pauses once `high_watermark` ids are queued and resumes when
+    the workers have drained the queue down to `low_watermark`, so the next
+    page is already on its way before the workers run out of ids, and memory
+    stays bounded when the search is unlimited.
+
+    The ids taken by `get()` are tracked until `task_done()`, so `snapshot()`
+    can tell every id searched but not downloaded yet.
+
+    The search ends with `max_result`, with an empty page whose cursor does
+    not move (twitter answers the end of the results with the cursor it was
+    asked), or after `max_failures` failed pages in a row.
+    """
+
+    def __init__(self, search, max_result=-1, prefetch_pages=2, high_watermark=40, low_watermark=10, sleep_duration=0, skip=None, condition=None, max_failures=5):
+        """
+        Args:
+            search: a `tweet_parser.TwitterSearch`
+            max_result: the maximum amount of ids to fetch. set -1 for infinity.
+            prefetch_pages: the maximum amount of pages buffered ahead
+            high_watermark: the amount of queued ids to pause fetching
+            low_watermark: the amount of queued ids to resume fetching
+            sleep_duration: the cooldown in seconds between two search requests
+            skip: a callable returning True for the ids to drop, e.g. the ids crawled before. the dropped ids do not count to `max_result`.
+            condition: the `threading.Condition` notified when ids are queued. share one to wait on many prefetchers. see `keyword_scheduler.KeywordScheduler`.
+            max_failures: the amount of search pages failing in a row to give the search up.
+        """
+        self.search = search
+        self.max_result = max_result
+        self.skip = skip
+        self.prefetch_pages = max(prefetch_pages, 1)
+        self.high_watermark = max(high_watermark, 1)
+        self.low_watermark = min(low_watermark, self.high_watermark - 1)
+        self.sleep_duration = sleep_duration
+        self.max_failures = max_failures
+
+        self.fetched_ids = 0
+        self.skipped_ids = 0
+        self.__pages = deque()
+        self.__taken = {}
+        self.__cursor = None
+        self.__queued = 0
+        self.__paused = False
+        self.__finished = False
+        self.__condition = condition if condition is not None else threading.Condition()
+        self.__stop_event = threading.Event()
+        self.__thread_fetch = None
+
+    def start(self):
+        """start fetching in the background
+
+        Args: None
+
+        Returns: None
+        """
+        if self.__thread_fetch is None:
+            self.__thread_fetch = threading.Thread(target=self.__fetch_loop, args=(), daemon=True)
+            self.__thread_fetch.start()
+
+    def close(self):
+        """stop fetching and wake every waiting `get()`
+
+        Args: None
+
+        Returns: None
+        """
+        self.__stop_event.set()
+        with self.__condition:
+            self.__condition.notify_all()
+        if self.__thread_fetch is not None:
+            self.__thread_fetch.join()
+            self.__thread_fetch = None
+
+    def restore(self, cursor, ids, fetched_ids):
+        """continue a crawl saved by `snapshot()`. call it before `start()`.
+
+        Args:
+            cursor: the search cursor to continue from
+            ids: the ids searched but not downloaded yet
+            fetched_ids: the amount of ids searched so far
+
+        Returns: None
+        """
+        with self.__condition:
+            self.__cursor = cursor
+            self.search.next_cursor = cursor
+            self.fetched_ids = fetched_ids
+            if len(ids) > 0:
+                self.__pages.append(deque(ids))
+                self.__queued += len(ids)
+
+    def snapshot(self):
+        """the search cursor and the ids not downloaded yet, consistent with each other
+
+        Args: None
+
+        Returns: a dictionary of "cursor", "fetched_ids" and "pending", the taken ids followed by the queued ids
+        """
+        with self.__condition:
+            pending = list(self.__taken)
+            for page in self.__pages:
+                pending += page
+            return {"cursor": self.__cursor, "fetched_ids": self.fetched_ids, "pending": pending}
+
+    def task_done(self, tweet_id):
+        """forget an id taken by `get()`, once it is downloaded or given up
+
+        Args:
+            tweet_id: the tweet id
+
+        Returns: None
+        """
+        with self.__condition:
+            self.__taken.pop(tweet_id, None)
+
+    def exhausted(self):
+        """True once the search has ended and every queued id is taken
+        """
+        with self.__condition:
+            return self.__finished and self.__queued == 0
+
+    def qsize(self):
+        """the amount of queued ids
+        """
+        with self.__condition:
+            return self.__queued
+
+    def get(self, timeout=None):
+        """take the next tweet id, blocking until one is fetched
+
+        Args:
+            timeout: the maximum time in seconds to wait. None to wait forever.
+
+        Returns: the tweet id. None once `max_result` ids are taken, the prefetcher is closed or `timeout` is reached.
+        """
+        with self.__condition:
+            self.__condition.wait_for(
+                lambda: self.__queued > 0 or self.__finished or self.__stop_event.is_set(),
+                timeout)
+            if self.__queued == 0 or self.__stop_event.is_set():
+                return None
+
+            page = self.__pages[0]
+            tweet_id = page.popleft()
+            self.__taken[tweet_id] = True
+            self.__queued -= 1
+            if len(page) == 0:
+                self.__pages.popleft()
+                self.__condition.notify_all()
+            elif self.__queued <= self.low_watermark:
+                self.__condition.notify_all()
+            return tweet_id
+
+    def __should_wait(self):
+        if self.__stop_event.is_set():
+            return False
+        if self.__queued >= self.high_watermark:
+            self.__paused = True
+        elif self.__queued <= self.low_watermark:
+            self.__paused = False
+        return self.__paused or len(self.__pages) >= self.prefetch_pages
+
+    def __fetch_loop(self):
+        failures = 0
+        while not self.__stop_event.is_set():
+            if self.max_result != -1 and self.fetched_ids >= self.max_result:
+                logger.info("Reached max_result. Stop searching.")
+                break
+
+            with self.__condition:
+                self.__condition.wait_for(lambda: not self.__should_wait())
+            if self.__stop_event.is_set():
+                break
+
+            cursor = getattr(self.search, "next_cursor", None)
+            try:
+                ids = self.search.get_next_ids()
+            except Exception:
+                failures += 1
+                logger.error("Failed to search '{}' ({} in a row).".format(self.search.keyword, failures), exc_info=True)
+                if failures >= self.max_failures:
+                    logger.error("Stop searching '{}' after {} failed search pages.".format(self.search.keyword, failures))
+                    break
+                self.__stop_event.wait(max(self.sleep_duration, 1))
+                continue
+            failures = 0
+
+            empty = len(ids) == 0
+            next_cursor = getattr(self.search, "next_cursor", None)
+            if empty and (next_cursor is None or next_cursor == cursor):
+                logger.info("No more search results of '{}'. Stop searching.".format(self.search.keyword))
+                break
+            if self.skip is not None:
+                kept = [tweet_id for tweet_id in ids if not self.skip(tweet_id)]
+                self.skipped_ids += len(ids) - len(kept)
+                ids = kept
+            if self.max_result != -1 and len(ids) + self.fetched_ids > self.max_result:
+                ids = ids[:(self.max_result - self.fetched_ids)]
+            logger.info("Fetch {} search results.".format(len(ids)))
+
+            if empty:
+                # the cursor moved, the results may go on. do not hammer the search
+                self.__stop_event.wait(max(self.sleep_duration, 1))
+                continue
+
+            with self.__condition:
+                # the cursor moves together with the ids read from it's page
+                self.__cursor = next_cursor
+                self.fetched_ids += len(ids)
+                if len(ids) > 0:
+                    self.__pages.append(deque(ids))
+                    self.__queued += len(ids)
+                    self.__condition.notify_all()
+
+            self.__stop_event.wait(self.sleep_duration)
+
+        with self.__condition:
+            self.__finished = True
+            self.__condition.notify_all()
@@ -0,0 +1,275 @@
+import os
+import mmap
+import math
+import struct
+import heapq
+import hashlib
+import threading
+
+from tweet_crawler import logger
+
+
+ID_FORMAT = "<Q"
+ID_SIZE = struct.calcsize(ID_FORMAT)
+BLOOM_HEADER = "<QQQ"
+
+
+class BloomFilter:
+    """A bit array answering "maybe seen" or "never seen"
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Args:
+            capacity: the amount of keys expected
+            error_rate: the false positive rate at `capacity` keys
+        """
+        self.capacity = capacity
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def __positions(self, key):
+        digest = hashlib.blake2b(struct.pack(ID_FORMAT, key), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self.__positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+    def save(self, path):
+        with open(path + ".tmp", "wb") as f:
+            f.write(struct.pack(BLOOM_HEADER, self.capacity, self.size, self.hashes))
+            f.write(self.bits)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path):
+        """read the bits saved by `save()`
+
+        Returns: False if the file is missing or was saved with another size
+        """
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as f:
+            header = f.read(struct.calcsize(BLOOM_HEADER))
+            if len(header) != struct.calcsize(BLOOM_HEADER) or struct.unpack(BLOOM_HEADER, header) != (self.capacity, self.size, self.hashes):
+                return False
+            bits = f.read()
+        if len(bits) != len(self.bits):
+            return False
+        self.bits = bytearray(bits)
+        return True
+
+
+class SeenIndex:
+    """A persistent set of the tweet ids already crawled
+
+    A `BloomFilter` answers most lookups of new ids without touching the disk.
+    The ids are kept exactly in a sorted file of 64-bit integers, which is
+    memory mapped and binary searched, plus an append-only log of the ids
+    added since the last compaction. The log is merged into the sorted file by
+    `compact()`, `close()` or once it holds `compact_threshold` ids.
+
+    Files in `folder`: `ids.bin` (sorted ids), `ids.log` (new ids) and `bloom.bin`.
+    """
+
+    def __init__(self, folder, capacity=1000000, error_rate=0.001, compact_threshold=100000):
+        """
+        Args:
+            folder: the folder of the index files
+            capacity: the amount of ids of the bloom filter. more ids only raise the false positive rate, the answers stay exact.
+            error_rate: the false positive rate of the bloom filter
+            compact_threshold: the amount of logged ids to merge them into the sorted file
+        """
+        self.folder = folder
+        self.compact_threshold = compact_threshold
+        self.ids_path = os.path.join(folder, "ids.bin")
+        self.log_path = os.path.join(folder, "ids.log")
+        self.bloom_path = os.path.join(folder, "bloom.bin")
+
+        self.__lock = threading.RLock()
+        self.__recent = set()
+        self.__mmap = None
+        self.__count = 0
+        self.__log = None
+
+        self.is_new = not (os.path.exists(self.ids_path) or os.path.exists(self.log_path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.__open_sorted()
+        for tweet_id in self.__read_log():
+            self.__recent.add(tweet_id)
+        if not self.bloom.load(self.bloom_path) or len(self.__recent) > 0:
+            self.__rebuild_bloom()
+        self.__log = open(self.log_path, "ab")
+
+    def __open_sorted(self):
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap = None
+        self.__count = 0
+        if os.path.exists(self.ids_path) and os.path.getsize(self.ids_path) >= ID_SIZE:
+            with open(self.ids_path, "rb") as f:
+                self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__count = len(self.__mmap) // ID_SIZE
+
+    def __read_log(self):
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path, "rb") as f:
+            data = f.read()
+        # a record cut by a crash is dropped
+        usable = len(data) - len(data) % ID_SIZE
+        return [value for (value,) in struct.iter_unpack(ID_FORMAT, data[:usable])]
+
+    def __iter_sorted(self):
+        for i in range(self.__count):
+            yield struct.unpack_from(ID_FORMAT, self.__mmap, i * ID_SIZE)[0]
+
+    def __rebuild_bloom(self):
+        self.bloom.bits = bytearray(len(self.bloom.bits))
+        for value in self.__iter_sorted():
+            self.bloom.add(value)
+        for value in self.__recent:
+            self.bloom.add(value)
+
+    def __in_sorted(self, value):
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            current = struct.unpack_from(ID_FORMAT, self.__mmap, middle * ID_SIZE)[0]
+            if current < value:
+                low = middle + 1
+            elif current > value:
+                high = middle
+            else:
+                return True
+        return False
+
+    def __len__(self):
+        with self.__lock:
+            return self.__count + len(self.__recent)
+
+    def __contains__(self, tweet_id):
+        value = int(tweet_id)
+        with self.__lock:
+            if value not in self.bloom:
+                return False
+            return value in self.__recent or self.__in_sorted(value)
+
+    def add(self, tweet_id):
+        """mark a tweet as seen
+
+        Args:
+            tweet_id: the id of the tweet
+
+        Returns: True if the tweet was not seen before
+        """
+        value = int(tweet_id)
+        with self.__lock:
+            if value in self:
+                return False
+            self.bloom.add(value)
+            self.__recent.add(value)
+            self.__log.write(struct.pack(ID_FORMAT, value))
+            self.__log.flush()
+            if len(self.__recent) >= self.compact_threshold:
+                self.compact()
+            return True
+
+    def update(self, tweet_ids):
+        """mark many tweets as seen, e.g. the ids of a storage. see `Storage.iter_tweet_ids`.
+
+        Args:
+            tweet_ids: an iterable of tweet ids
+
+        Returns: the amount of ids added
+        """
+        count = 0
+        with self.__lock:
+            for tweet_id in tweet_ids:
+                if self.add(tweet_id):
+                    count += 1
+        return count
+
+    def compact(self):
+        """merge the logged ids into the sorted file and save the bloom filter
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            # the bloom filter already holds every id, so it is saved first
+            self.bloom.save(self.bloom_path)
+            tmp_path = self.ids_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                # the sorted file is streamed from the mmap, only the logged ids are sorted in memory
+                chunk = []
+                last = None
+                for value in heapq.merge(self.__iter_sorted(), sorted(self.__recent)):
+                    if value == last:
+                        continue
+                    last = value
+                    chunk.append(value)
+                    if len(chunk) == 65536:
+                        f.write(struct.pack("<{}Q".format(len(chunk)), *chunk))
+                        chunk = []
+                f.write(struct.pack("<{}Q".format(len(chunk)), *chunk))
+                f.flush()
+                os.fsync(f.fileno())
+            if self.__mmap is not None:
+                self.__mmap.close()
+                self.__mmap = None
+            os.replace(tmp_path, self.ids_path)
+            self.__open_sorted()
+
+            self.__recent = set()
+            if self.__log is not None:
+                self.__log.close()
+            self.__log = open(self.log_path, "wb")
+            logger.debug("Seen index compacted to {} ids.".format(self.__count))
+
+    def close(self):
+        """compact and close the index files
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            if self.__log is None:
+                return
+            self.compact()
+            self.__log.close()
+            self.__log = None
+            if self.__mmap is not None:
+                self.__mmap.close()
+                self.__mmap = None
+
+
+def open_seen_index(folder, storage=None, **kwargs):
+    """open a `SeenIndex`, built from the ids of a storage when the index is new
+
+    Args:
+        folder: the folder of the index files
+        storage: the storage, or a list of storages, to read the saved ids from. see `Storage.iter_tweet_ids`.
+        kwargs: passed to `SeenIndex`
+
+    Returns: the `SeenIndex`
+    """
+    index = SeenIndex(folder, **kwargs)
+    if index.is_new and storage is not None:
+        storages = storage if isinstance(storage, (list, tuple)) else [storage]
+        # skip the ids which are not tweet ids, e.g. the name of a foreign file in a folder
+        added = sum(index.update(tweet_id for tweet_id in s.iter_tweet_ids() if str(tweet_id).isdigit()) for s in storages)
+        index.compact()
+        logger.info("Seen index built with {} saved tweets.".format(added))
+    return index
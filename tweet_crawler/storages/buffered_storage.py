@@ -0,0 +1,205 @@
+import time
+import threading
+
+from tweet_crawler import logger
+from tweet_crawler.records import ConversationRecord, TimelineRecord
+from tweet_crawler.storages.framework import Storage
+
+
+class BufferedStorage(Storage):
+    """Queue the writes of any `Storage` and apply them from a writer thread
+
+    Pending writes are kept per tweet_id as records and coalesced:
+    consecutive appends become a single `append_records` call, and timelines
+    appended after a pending save are merged into the saved record, so the
+    ids of the records reach the wrapped storage. The writer
+    thread flushes when `flush_size` timelines are pending or every
+    `flush_interval` seconds. Callers block once `max_pending` timelines are
+    pending, so memory stays bounded when the wrapped storage is slow.
+
+    A write failing in the wrapped storage is logged and dropped, and the
+    first failure is raised by every later `flush()` and `close()`, so no
+    checkpoint counts it as saved.
+
+    Other attributes (e.g. `has_tweet`) are delegated to the wrapped storage.
+    """
+
+    def __init__(self, storage, flush_size=200, flush_interval=1.0, max_pending=5000):
+        """
+        Args:
+            storage: the wrapped `Storage`
+            flush_size: the amount of pending timelines to start a flush
+            flush_interval: the maximum time in seconds a write stays pending
+            max_pending: the amount of pending timelines to block the callers
+        """
+        self.storage = storage
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.__condition = threading.Condition()
+        # tweet_id -> ["save", ConversationRecord] or ["append", a list of TimelineRecord]
+        self.__pending = {}
+        self.__pending_count = 0
+        self.__flush_requested = 0
+        self.__flushed = 0
+        self.__error = None
+        self.__closed = False
+        self.__thread_writer = threading.Thread(target=self.__write_loop, args=(), daemon=True)
+        self.__thread_writer.start()
+
+    def __getattr__(self, name):
+        if name == "storage":
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    def __wait_for_room(self):
+        while self.__pending_count >= self.max_pending and not self.__closed:
+            self.__condition.wait()
+
+    def __add(self, tweet_id, kind, record, timelines):
+        with self.__condition:
+            if self.__closed:
+                raise ValueError("BufferedStorage is closed.")
+            self.__wait_for_room()
+
+            pending = self.__pending.get(tweet_id)
+            if kind == "save" or pending is None:
+                if pending is not None:
+                    self.__pending_count -= self.__count(pending)
+                if kind == "save":
+                    pending = ["save", ConversationRecord(record.tweet_id, record.text, record.author_id, list(record.timelines))]
+                else:
+                    pending = ["append", list(timelines)]
+                self.__pending[tweet_id] = pending
+            elif pending[0] == "save":
+                pending[1].timelines += timelines
+            else:
+                pending[1] += timelines
+
+            self.__pending_count += len(timelines) + (1 if kind == "save" else 0)
+            if self.__pending_count >= self.flush_size:
+                self.__condition.notify_all()
+
+    @staticmethod
+    def __count(pending):
+        if pending[0] == "save":
+            return len(pending[1].timelines) + 1
+        return len(pending[1])
+
+    def save_tweet(self, parsed_tweet):
+        """queue a parsed tweet object
+
+
+        Args:
+            parsed_tweet: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        self.save_record(ConversationRecord.from_dict(parsed_tweet))
+
+    def append_timeline(self, tweet_id, timeline):
+        """queue a parsed timeline
+
+
+        Args:
+            tweet_id: the id of the tweet to append
+            timeline: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        self.append_records(tweet_id, [TimelineRecord.from_texts(texts) for texts in timeline])
+
+    def save_record(self, record):
+        """queue the record of the first page of a tweet. see `Storage.save_record`
+        """
+        self.__add(record.tweet_id, "save", record, record.timelines)
+
+    def append_records(self, tweet_id, timelines):
+        """queue the records of the timelines of a later page. see `Storage.append_records`
+        """
+        self.__add(tweet_id, "append", None, timelines)
+
+    def iter_tweet_ids(self):
+        """see `Storage.iter_tweet_ids`. pending writes are not visible, see `flush()`.
+        """
+        return self.storage.iter_tweet_ids()
+
+    def __write_loop(self):
+        while True:
+            with self.__condition:
+                deadline = time.time() + self.flush_interval
+                while (not self.__closed
+                        and self.__flush_requested == self.__flushed
+                        and self.__pending_count < self.flush_size
+                        and time.time() < deadline):
+                    self.__condition.wait(max(deadline - time.time(), 0))
+
+                batch, self.__pending = self.__pending, {}
+                self.__pending_count = 0
+                generation = self.__flush_requested
+                closed = self.__closed
+                self.__condition.notify_all()
+
+            for tweet_id, (kind, payload) in batch.items():
+                try:
+                    if kind == "save":
+                        self.storage.save_record(payload)
+                    else:
+                        self.storage.append_records(tweet_id, payload)
+                except Exception as e:
+                    logger.error("Failed to write tweet {}.".format(tweet_id), exc_info=True)
+                    with self.__condition:
+                        if self.__error is None:
+                            self.__error = e
+
+            with self.__condition:
+                self.__flushed = generation
+                self.__condition.notify_all()
+                if closed and len(self.__pending) == 0:
+                    return
+
+    def flush(self):
+        """block until every queued write is applied to the wrapped storage, then flush it
+
+        Args: None
+
+        Returns: None
+
+        Raises:
+            Exception: the first write which failed in the wrapped storage
+        """
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__flush_requested += 1
+            generation = self.__flush_requested
+            self.__condition.notify_all()
+            while self.__flushed < generation and self.__thread_writer.is_alive():
+                self.__condition.wait()
+            error = self.__error
+        if error is not None:
+            raise error
+        self.storage.flush()
+
+    def close(self):
+        """apply every queued write, stop the writer thread and close the wrapped storage
+
+        Args: None
+
+        Returns: None
+
+        Raises:
+            Exception: the first write which failed in the wrapped storage
+        """
+        with self.__condition:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__condition.notify_all()
+        self.__thread_writer.join()
+        self.storage.close()
+        if self.__error is not None:
+            raise self.__error
@@ -27,4 +27,77 @@ class Storage(abc.ABC):
         Returns:
             None
         """
-        return NotImplemented
\ No newline at end of file
+        return NotImplemented
+
+    def save_record(self, record):
+        """save the first page of a tweet, as a record
+
+        The default saves `record.to_dict()` with `save_tweet`.
+
+        Args:
+            record: a `tweet_crawler.records.ConversationRecord`
+
+        Returns:
+            None
+        """
+        self.save_tweet(record.to_dict())
+
+    def append_records(self, tweet_id, timelines):
+        """append the timelines of a later page, as records
+
+        The default appends their texts with `append_timeline`.
+
+        Args:
+            tweet_id: the id of the tweet to append
+            timelines: a list of `tweet_crawler.records.TimelineRecord`
+
+        Returns:
+            None
+        """
+        self.append_timeline(tweet_id, [timeline.texts for timeline in timelines])
+
+    def iter_tweet_ids(self):
+        """iterate the ids of the saved tweets
+
+
+        Args: None
+
+        Returns:
+            a generator of tweet ids. empty if the storage can not be read back.
+        """
+        return iter(())
+
+    def flush(self):
+        """block until every write accepted so far is persisted
+
+
+        Args: None
+
+        Returns:
+            None
+        """
+        pass
+
+    def close(self):
+        """persist the pending writes and release the resources
+
+
+        Args: None
+
+        Returns:
+            None
+        """
+        pass
+
+
+def is_storage_factory(storage):
+    """check whether `storage` is a callable returning the storage of a keyword rather than a storage
+
+    A storage does not need to subclass `Storage`, any object with `save_tweet` is one.
+
+    Args:
+        storage: a storage or a callable taking a keyword
+
+    Returns: True if `storage` is a factory
+    """
+    return callable(storage) and not hasattr(storage, "save_tweet")
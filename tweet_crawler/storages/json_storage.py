@@ -1,6 +1,6 @@
 import os
-import json
 
+from tweet_crawler import json_codec
 from tweet_crawler.storages.framework import Storage
 
 class JsonStorage(Storage):
@@ -30,12 +30,12 @@ class JsonStorage(Storage):
             None
         """
         self._ensure_folder(self.folder)
-        json_str = json.dumps(parsed_tweet)
+        data = json_codec.dumps(parsed_tweet)
 
         output_path = os.path.join(self.folder, "{}.json".format(parsed_tweet["tweet_id"]))
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(json_str)
+        with open(output_path, "wb") as f:
+            f.write(data)
     
     def append_timeline(self, tweet_id, timeline):
         """append parsed timeline
@@ -50,13 +50,27 @@ class JsonStorage(Storage):
         """
 
         output_path = os.path.join(self.folder, "{}.json".format(tweet_id))
-        with open(output_path, "r", encoding="utf-8") as f:
-            json_str = f.read()
+        with open(output_path, "rb") as f:
+            data = f.read()
         
-        obj = json.loads(json_str)
+        obj = json_codec.loads(data)
         obj["timelines"] += timeline
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json_str = json.dumps(obj)
-            f.write(json_str)
+        with open(output_path, "wb") as f:
+            f.write(json_codec.dumps(obj))
 
+    def iter_tweet_ids(self):
+        """iterate the ids of the saved tweets
+
+
+        Args: None
+
+        Returns:
+            a generator of tweet ids
+        """
+        if not os.path.exists(self.folder):
+            return
+        for name in os.listdir(self.folder):
+            # other files such as a checkpoint may share the folder
+            if name.endswith(".json") and name[:-len(".json")].isdigit():
+                yield name[:-len(".json")]
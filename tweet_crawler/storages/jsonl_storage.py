@@ -0,0 +1,199 @@
+import os
+import re
+import argparse
+import threading
+
+from tweet_crawler import json_codec
+from tweet_crawler.storages.framework import Storage
+from tweet_crawler.storages.json_storage import JsonStorage
+
+
+SEGMENT_PATTERN = re.compile(r"^segment-(\d+)\.jsonl$")
+
+
+class JsonlStorage(Storage):
+    """Append tweets and timelines as json lines to rolling segment files
+
+    Every `save_tweet` and `append_timeline` call writes exactly one line, so
+    the cost of a page does not depend on the size of the conversation. A
+    process always starts a new segment, and a line cut by a crash is skipped
+    by the reader. Use `read_tweets()` or `compact()` to reassemble the tweets.
+    """
+
+    def __init__(self, folder, segment_size=64 * 1024 * 1024, fsync=False):
+        """
+        Args:
+            folder: the folder to save segments
+            segment_size: the size in bytes after which a new segment is started
+            fsync: call `os.fsync` after every record
+        """
+        self.folder = folder
+        self.segment_size = segment_size
+        self.fsync = fsync
+
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__segment_index = None
+
+    def _ensure_folder(self, folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        return folder
+
+    def _open_next_segment(self):
+        if self.__file is not None:
+            self.__file.close()
+        if self.__segment_index is None:
+            indexes = [int(m.group(1)) for m in map(SEGMENT_PATTERN.match, os.listdir(self._ensure_folder(self.folder))) if m]
+            self.__segment_index = max(indexes, default=0)
+        self.__segment_index += 1
+        path = os.path.join(self.folder, "segment-{:06d}.jsonl".format(self.__segment_index))
+        self.__file = open(path, "ab")
+
+    def _write(self, record):
+        line = json_codec.dumps(record) + b"\n"
+        with self.__lock:
+            if self.__file is None or self.__file.tell() >= self.segment_size:
+                self._open_next_segment()
+            self.__file.write(line)
+            self.__file.flush()
+            if self.fsync:
+                os.fsync(self.__file.fileno())
+
+    def save_tweet(self, parsed_tweet):
+        """save parsed tweet object
+
+
+        Args:
+            parsed_tweet: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        self._write({
+            "type": "tweet",
+            "tweet_id": parsed_tweet["tweet_id"],
+            "tweet": parsed_tweet["tweet"],
+            "timelines": parsed_tweet["timelines"],
+        })
+
+    def append_timeline(self, tweet_id, timeline):
+        """append parsed timeline
+
+
+        Args:
+            tweet_id: the id of the tweet to append
+            timeline: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        self._write({
+            "type": "timeline",
+            "tweet_id": tweet_id,
+            "timelines": timeline,
+        })
+
+    def iter_tweet_ids(self):
+        """iterate the ids of the saved tweets
+
+        Args: None
+
+        Returns: a generator of tweet ids
+        """
+        if not os.path.exists(self.folder):
+            return
+        for record in iter_records(self.folder):
+            if record["type"] == "tweet":
+                yield record["tweet_id"]
+
+    def close(self):
+        """close the current segment
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+def list_segments(folder):
+    """list the segment files of a folder in write order
+
+    Args:
+        folder: the folder of a `JsonlStorage`
+
+    Returns: a list of file paths
+    """
+    names = [name for name in os.listdir(folder) if SEGMENT_PATTERN.match(name)]
+    names.sort(key=lambda name: int(SEGMENT_PATTERN.match(name).group(1)))
+    return [os.path.join(folder, name) for name in names]
+
+
+def iter_records(folder):
+    """read every record of a `JsonlStorage` in write order
+
+    Lines which can not be decoded (e.g. cut by a crash) are skipped.
+
+    Args:
+        folder: the folder of a `JsonlStorage`
+
+    Returns: a generator of records
+    """
+    for path in list_segments(folder):
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    yield json_codec.loads(line)
+                except ValueError:
+                    continue
+
+
+def read_tweets(folder):
+    """reassemble the tweets of a `JsonlStorage`
+
+    Args:
+        folder: the folder of a `JsonlStorage`
+
+    Returns: a dictionary of tweet_id to the parsed tweet object. see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+    """
+    tweets = {}
+    for record in iter_records(folder):
+        tweet_id = record["tweet_id"]
+        if record["type"] == "tweet":
+            tweets[tweet_id] = {
+                "tweet": record["tweet"],
+                "tweet_id": tweet_id,
+                "timelines": list(record["timelines"]),
+            }
+        elif tweet_id in tweets:
+            tweets[tweet_id]["timelines"] += record["timelines"]
+    return tweets
+
+
+def compact(folder, output_folder):
+    """write the tweets of a `JsonlStorage` as `<tweet_id>.json` files of `JsonStorage`
+
+    Args:
+        folder: the folder of a `JsonlStorage`
+        output_folder: the folder to save the json files
+
+    Returns: the amount of tweets written
+    """
+    storage = JsonStorage(output_folder)
+    tweets = read_tweets(folder)
+    for parsed_tweet in tweets.values():
+        storage.save_tweet(parsed_tweet)
+    return len(tweets)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Reassemble the segments of a JsonlStorage into one json file per tweet.")
+    parser.add_argument("folder", help="The folder of the segments")
+    parser.add_argument("output_folder", help="The folder to save the json files")
+    args = parser.parse_args()
+
+    print("{} tweets written.".format(compact(args.folder, args.output_folder)))
@@ -0,0 +1,302 @@
+import os
+import re
+import argparse
+import threading
+from collections import OrderedDict
+
+from tweet_crawler import json_codec
+from tweet_crawler.storages.framework import Storage
+
+
+PART_PATTERN = re.compile(r"^part-(\d+)\.parquet$")
+JOURNAL_PATTERN = re.compile(r"^part-(\d+)\.journal$")
+COLUMNS = ["tweet_id", "tweet", "timeline_index", "reply_position", "reply"]
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("ParquetStorage requires pyarrow. Install it with `pip install pyarrow`.")
+    return pyarrow, pyarrow.parquet
+
+
+class ParquetStorage(Storage):
+    """Save tweets as flat rows into zstd compressed Parquet files
+
+    Every reply becomes one row of (tweet_id, tweet, timeline_index,
+    reply_position, reply). A tweet without timelines is kept as a single row
+    with -1 indexes and a null reply. The rows are buffered and written as a
+    row group every `row_group_size` rows, and a new part file is started every
+    `part_row_groups` row groups, since a Parquet file is only readable once it
+    is closed. String columns are dictionary encoded, so repeating `tweet` on
+    every row costs little.
+
+    The rows of the open part file are also appended to a journal next to it,
+    `part-<n>.journal`. `flush()` writes the buffered rows and syncs the
+    journal, without closing the part file, so flushing often (e.g. on every
+    checkpoint) does not end in many small part files. The journal is deleted
+    once it's part file is closed. A journal left by a crash is rebuilt into
+    it's part file when the folder is opened again.
+
+    Saving a tweet again restarts it's timeline_index from 0 without deleting
+    the rows written before. The text and the timeline count of the
+    `max_tweets` tweets written last are kept to append their next pages. A
+    page appended to a tweet dropped from them, e.g. one saved by an earlier
+    run, gets a null `tweet` and restarts it's timeline_index from 0.
+    """
+
+    def __init__(self, folder, row_group_size=65536, part_row_groups=16, compression="zstd", max_tweets=10000):
+        """
+        Args:
+            folder: the folder to save part files
+            row_group_size: the amount of rows of a row group
+            part_row_groups: the amount of row groups of a part file
+            compression: the parquet compression codec
+            max_tweets: the amount of tweets to remember for their next pages. keep it well above the amount of conversations downloaded at once.
+        """
+        self.pa, self.pq = _import_pyarrow()
+        self.folder = folder
+        self.row_group_size = row_group_size
+        self.part_row_groups = part_row_groups
+        self.compression = compression
+        self.max_tweets = max_tweets
+
+        self.schema = self.pa.schema([
+            ("tweet_id", self.pa.string()),
+            ("tweet", self.pa.string()),
+            ("timeline_index", self.pa.int32()),
+            ("reply_position", self.pa.int32()),
+            ("reply", self.pa.string()),
+        ])
+
+        self.__lock = threading.Lock()
+        self.__rows = {name: [] for name in COLUMNS}
+        # tweet_id -> [tweet, the amount of timelines written], the least recently written first
+        self.__tweets = OrderedDict()
+        self.__writer = None
+        self.__journal = None
+        self.__written_row_groups = 0
+        self.__part_index = None
+
+        if os.path.exists(folder):
+            self.__recover_journals()
+
+    def _ensure_folder(self, folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        return folder
+
+    def __remember(self, tweet_id, tweet, timeline_count):
+        self.__tweets[tweet_id] = [tweet, timeline_count]
+        self.__tweets.move_to_end(tweet_id)
+        while len(self.__tweets) > self.max_tweets:
+            self.__tweets.popitem(last=False)
+
+    def __append_rows(self, tweet_id, tweet, timelines, start):
+        rows = self.__rows
+        for offset, timeline in enumerate(timelines):
+            for position, reply in enumerate(timeline):
+                rows["tweet_id"].append(tweet_id)
+                rows["tweet"].append(tweet)
+                rows["timeline_index"].append(start + offset)
+                rows["reply_position"].append(position)
+                rows["reply"].append(reply)
+        self.__remember(tweet_id, tweet, start + len(timelines))
+
+        if len(rows["tweet_id"]) >= self.row_group_size:
+            self.__write_row_group()
+
+    def __part_path(self, index, extension):
+        return os.path.join(self.folder, "part-{:06d}.{}".format(index, extension))
+
+    def __new_writer(self, path):
+        return self.pq.ParquetWriter(
+            path,
+            self.schema,
+            compression=self.compression,
+            use_dictionary=["tweet_id", "tweet", "reply"])
+
+    def __recover_journals(self):
+        """rebuild the part files left open by a crash from their journals
+        """
+        for name in sorted(os.listdir(self.folder)):
+            match = JOURNAL_PATTERN.match(name)
+            if match is None:
+                continue
+            journal_path = os.path.join(self.folder, name)
+            path = self.__part_path(int(match.group(1)), "parquet")
+            # replaces the unreadable part file at once
+            writer = self.__new_writer(path + ".tmp")
+            with open(journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        rows = json_codec.loads(line)
+                    except ValueError:
+                        # the last line of a crash, never synced
+                        break
+                    writer.write_table(self.pa.Table.from_pydict(rows, schema=self.schema), row_group_size=self.row_group_size)
+            writer.close()
+            os.replace(path + ".tmp", path)
+            os.remove(journal_path)
+
+    def __open_next_part(self):
+        if self.__part_index is None:
+            indexes = [int(m.group(1)) for m in map(PART_PATTERN.match, os.listdir(self._ensure_folder(self.folder))) if m]
+            self.__part_index = max(indexes, default=0)
+        self.__part_index += 1
+        self.__writer = self.__new_writer(self.__part_path(self.__part_index, "parquet"))
+        self.__journal = open(self.__part_path(self.__part_index, "journal"), "wb")
+        self.__written_row_groups = 0
+
+    def __close_part(self):
+        if self.__writer is None:
+            return
+        self.__writer.close()
+        self.__writer = None
+        self.__journal.close()
+        self.__journal = None
+        os.remove(self.__part_path(self.__part_index, "journal"))
+
+    def __write_row_group(self):
+        if len(self.__rows["tweet_id"]) == 0:
+            return
+        if self.__writer is None:
+            self.__open_next_part()
+
+        table = self.pa.Table.from_pydict(self.__rows, schema=self.schema)
+        self.__writer.write_table(table, row_group_size=self.row_group_size)
+        self.__journal.write(json_codec.dumps(self.__rows) + b"\n")
+        self.__rows = {name: [] for name in COLUMNS}
+        self.__written_row_groups += 1
+
+        if self.__written_row_groups >= self.part_row_groups:
+            self.__close_part()
+
+    def save_tweet(self, parsed_tweet):
+        """save parsed tweet object
+
+
+        Args:
+            parsed_tweet: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        tweet_id = parsed_tweet["tweet_id"]
+        with self.__lock:
+            if len(parsed_tweet["timelines"]) == 0:
+                rows = self.__rows
+                rows["tweet_id"].append(tweet_id)
+                rows["tweet"].append(parsed_tweet["tweet"])
+                rows["timeline_index"].append(-1)
+                rows["reply_position"].append(-1)
+                rows["reply"].append(None)
+            self.__append_rows(tweet_id, parsed_tweet["tweet"], parsed_tweet["timelines"], 0)
+
+    def append_timeline(self, tweet_id, timeline):
+        """append parsed timeline
+
+
+        Args:
+            tweet_id: the id of the tweet to append
+            timeline: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        with self.__lock:
+            tweet, start = self.__tweets.get(tweet_id, (None, 0))
+            self.__append_rows(tweet_id, tweet, timeline, start)
+
+    def flush(self):
+        """write the buffered rows and sync the journal of the open part file
+
+        The part file stays open, it is readable once it is closed by
+        `close()` or by starting the next part.
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            self.__write_row_group()
+            if self.__journal is not None:
+                self.__journal.flush()
+                os.fsync(self.__journal.fileno())
+
+    def iter_tweet_ids(self):
+        """iterate the ids of the tweets in the closed part files
+
+        Args: None
+
+        Returns: a generator of tweet ids
+        """
+        if not os.path.exists(self.folder):
+            return
+        table = read_table(self.folder, columns=["tweet_id"])
+        if table is not None:
+            yield from set(table.column("tweet_id").to_pylist())
+
+    def close(self):
+        """write the buffered rows and close the current part file, so it can be read
+
+        Args: None
+
+        Returns: None
+        """
+        with self.__lock:
+            self.__write_row_group()
+            self.__close_part()
+
+
+def read_table(folder, columns=None):
+    """read the closed part files of a `ParquetStorage` as one pyarrow table
+
+    A part file with a journal is still open, and is skipped.
+
+    Args:
+        folder: the folder of a `ParquetStorage`
+        columns: the columns to read. None to read every column.
+
+    Returns: a `pyarrow.Table`
+    """
+    pa, pq = _import_pyarrow()
+    names = os.listdir(folder)
+    paths = sorted(os.path.join(folder, name) for name in names if PART_PATTERN.match(name) and name[:-len(".parquet")] + ".journal" not in names)
+    tables = [pq.read_table(path, columns=columns) for path in paths]
+    if len(tables) == 0:
+        return None
+    return pa.concat_tables(tables)
+
+
+def export(folder, output_folder, **kwargs):
+    """export the `<tweet_id>.json` files of a `JsonStorage` to a `ParquetStorage`
+
+    Args:
+        folder: the folder of a `JsonStorage`
+        output_folder: the folder to save part files
+        kwargs: passed to `ParquetStorage`
+
+    Returns: the amount of tweets exported
+    """
+    storage = ParquetStorage(output_folder, **kwargs)
+    count = 0
+    for name in sorted(os.listdir(folder)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(folder, name), "rb") as f:
+            storage.save_tweet(json_codec.loads(f.read()))
+        count += 1
+    storage.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the json files of a JsonStorage into Parquet files.")
+    parser.add_argument("folder", help="The folder of the json files")
+    parser.add_argument("output_folder", help="The folder to save the parquet files")
+    args = parser.parse_args()
+
+    print("{} tweets exported.".format(export(args.folder, args.output_folder)))
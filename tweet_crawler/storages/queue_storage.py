@@ -0,0 +1,119 @@
+import collections
+import threading
+
+from tweet_crawler.records import ConversationRecord, TimelineRecord
+from tweet_crawler.storages.framework import Storage
+
+
+class QueueInterrupted(Exception):
+    """raised by a write to a `QueueStorage` whose consumer has left
+    """
+
+
+class QueueStorage(Storage):
+    """Hand the downloaded records to a consumer through a bounded queue
+
+    The first page of a tweet is queued as it's `ConversationRecord`. Each
+    later page is queued as a `ConversationRecord` of the same `tweet_id`,
+    with `text` None and only the timelines of that page. Writers block while
+    `max_size` records are waiting, so a slow consumer holds the workers, and
+    through them the searches, instead of growing the queue.
+
+    `close()` ends the records: `get()` returns None once the rest is
+    consumed. `interrupt()` drops the queued records and fails the blocked
+    and later writes with `QueueInterrupted`.
+    """
+
+    def __init__(self, max_size=100):
+        """
+        Args:
+            max_size: the amount of waiting records to block the writers
+        """
+        self.max_size = max_size
+
+        self.__condition = threading.Condition()
+        self.__records = collections.deque()
+        self.__closed = False
+        self.__interrupted = False
+
+    def __put(self, record):
+        with self.__condition:
+            while len(self.__records) >= self.max_size and not self.__closed and not self.__interrupted:
+                self.__condition.wait()
+            if self.__interrupted:
+                raise QueueInterrupted("The consumer of the QueueStorage has left.")
+            if self.__closed:
+                raise ValueError("QueueStorage is closed.")
+            self.__records.append(record)
+            self.__condition.notify_all()
+
+    def save_record(self, record):
+        """queue the `ConversationRecord` of the first page of a tweet
+        """
+        self.__put(record)
+
+    def append_records(self, tweet_id, timelines):
+        """queue the `TimelineRecord`s of a later page of a tweet
+        """
+        self.__put(ConversationRecord(tweet_id, None, timelines=timelines))
+
+    def save_tweet(self, parsed_tweet):
+        """queue a parsed tweet of the dictionary shape, as a record with unknown ids
+        """
+        self.save_record(ConversationRecord.from_dict(parsed_tweet))
+
+    def append_timeline(self, tweet_id, timeline):
+        """queue parsed timelines of the dictionary shape, as records with unknown ids
+        """
+        self.append_records(tweet_id, [TimelineRecord.from_texts(texts) for texts in timeline])
+
+    def get(self):
+        """block until a record is queued, the queue is closed or interrupted
+
+
+        Args: None
+
+        Returns:
+            the oldest `ConversationRecord`. None once the queue is closed and empty, or interrupted.
+        """
+        with self.__condition:
+            while not self.__records and not self.__closed and not self.__interrupted:
+                self.__condition.wait()
+            if self.__interrupted or not self.__records:
+                return None
+            record = self.__records.popleft()
+            self.__condition.notify_all()
+            return record
+
+    def qsize(self):
+        """the amount of records waiting for the consumer
+        """
+        with self.__condition:
+            return len(self.__records)
+
+    def interrupt(self):
+        """drop the queued records and wake the blocked writers and consumer
+
+
+        Args: None
+
+        Returns:
+            None
+        """
+        with self.__condition:
+            self.__interrupted = True
+            self.__records.clear()
+            self.__condition.notify_all()
+
+    def close(self):
+        """end the records. the queued records are still handed to the consumer
+
+
+        Args: None
+
+        Returns:
+            None
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+
+from tweet_crawler import logger
+from tweet_crawler.storages.framework import Storage
+
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS tweets (
+        tweet_id TEXT PRIMARY KEY,
+        tweet TEXT NOT NULL,
+        saved_at REAL NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS timelines (
+        tweet_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        replies TEXT NOT NULL,
+        PRIMARY KEY (tweet_id, position)
+    )""",
+]
+
+
+class SqliteStorage(Storage):
+    """Save tweets into a single SQLite database
+
+    All writes are queued and executed by one writer thread holding the only
+    writing connection. The queued writes are committed in batches of
+    `batch_size` or every `batch_interval` seconds. The database runs in WAL
+    mode, so readers are never blocked by the writer.
+
+    A batch failing to commit is rolled back and it's writes are committed
+    one by one, so a single bad write loses only itself. The first write lost
+    is raised by every later `flush()` and `close()`.
+    """
+
+    def __init__(self, path, batch_size=500, batch_interval=1.0, max_pending=10000):
+        """
+        Args:
+            path: the database file
+            batch_size: the maximum amount of writes in a transaction
+            batch_interval: the maximum time in seconds a write waits to be committed
+            max_pending: the maximum amount of queued writes. `save_tweet` and `append_timeline` block when it is reached.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.commit()
+        connection.close()
+
+        self.__queue = queue.Queue(maxsize=max_pending)
+        self.__local = threading.local()
+        self.__readers = []
+        self.__readers_lock = threading.Lock()
+        self.__error = None
+        self.__closed = False
+        self.__thread_writer = threading.Thread(target=self.__write_loop, args=(), daemon=True)
+        self.__thread_writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self):
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self.__local.connection = connection
+            with self.__readers_lock:
+                self.__readers.append(connection)
+        return connection
+
+    def save_tweet(self, parsed_tweet):
+        """save parsed tweet object. a tweet saved before is replaced.
+
+
+        Args:
+            parsed_tweet: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        self.__put(("tweet", parsed_tweet["tweet_id"], parsed_tweet["tweet"], parsed_tweet["timelines"]))
+
+    def append_timeline(self, tweet_id, timeline):
+        """append parsed timeline
+
+
+        Args:
+            tweet_id: the id of the tweet to append
+            timeline: see `tweet_crawler.tweet_parser.Tweet.get_tweets`
+
+        Returns:
+            None
+        """
+        self.__put(("timeline", tweet_id, None, timeline))
+
+    def __put(self, write):
+        """queue a write for the writer thread, failing once the writer thread is stopped
+        """
+        while True:
+            try:
+                self.__queue.put(write, timeout=0.5)
+                return
+            except queue.Full:
+                if not self.__thread_writer.is_alive():
+                    raise self.__writer_error()
+
+    def __writer_error(self):
+        if self.__error is not None:
+            return self.__error
+        return RuntimeError("The writer thread of {} is stopped.".format(self.path))
+
+    def flush(self):
+        """block until every queued write is committed
+
+        Args: None
+
+        Returns: None
+
+        Raises:
+            ValueError: the storage is closed
+            sqlite3.Error: the first write which could not be committed
+            RuntimeError: the writer thread is stopped
+        """
+        if self.__closed:
+            raise ValueError("SqliteStorage is closed.")
+        done = threading.Event()
+        self.__put(("flush", None, None, done))
+        while not done.wait(0.5):
+            if not self.__thread_writer.is_alive():
+                # the writer may have set the event just before it stopped
+                if done.is_set():
+                    break
+                raise self.__writer_error()
+        if self.__error is not None:
+            raise self.__error
+
+    def close(self):
+        """commit the queued writes, stop the writer thread and close every reader connection
+
+        Args: None
+
+        Returns: None
+
+        Raises:
+            sqlite3.Error: the first write which could not be committed
+        """
+        if self.__closed:
+            return
+        self.__closed = True
+        if self.__thread_writer.is_alive():
+            try:
+                self.__put(("close", None, None, None))
+            except Exception:
+                # the writer thread stopped, it's error is raised below
+                pass
+        self.__thread_writer.join()
+        with self.__readers_lock:
+            readers, self.__readers = self.__readers, []
+        for connection in readers:
+            connection.close()
+        self.__local.connection = None
+        if self.__error is not None:
+            raise self.__error
+
+    def __write_loop(self):
+        connection = self._connect()
+        # tweet_id -> the next timeline position, read once per tweet
+        positions = {}
+        running = True
+        while running:
+            batch = [self.__queue.get()]
+            deadline = time.time() + self.batch_interval
+            while len(batch) < self.batch_size and batch[-1][0] not in ("flush", "close"):
+                try:
+                    batch.append(self.__queue.get(timeout=max(deadline - time.time(), 0)))
+                except queue.Empty:
+                    break
+
+            events = []
+            writes = []
+            for write in batch:
+                if write[0] == "flush":
+                    events.append(write[3])
+                elif write[0] == "close":
+                    running = False
+                else:
+                    writes.append(write)
+
+            try:
+                with connection:
+                    for write in writes:
+                        self.__apply(connection, positions, write)
+            except sqlite3.Error:
+                logger.warning("Failed to commit {} writes into {}. Commit them one by one.".format(len(writes), self.path), exc_info=True)
+                # the positions read in the rolled back transaction are wrong
+                positions.clear()
+                self.__apply_one_by_one(connection, positions, writes)
+            except Exception as e:
+                # e.g. a timeline which can not be serialized. the writer can not go on.
+                logger.error("Failed to commit {} writes into {}. Stop writing.".format(len(writes), self.path), exc_info=True)
+                if self.__error is None:
+                    self.__error = e
+                running = False
+            finally:
+                for event in events:
+                    event.set()
+        connection.close()
+
+    def __apply(self, connection, positions, write):
+        kind, tweet_id, tweet, timelines = write
+        if kind == "tweet":
+            connection.execute("INSERT OR REPLACE INTO tweets (tweet_id, tweet, saved_at) VALUES (?, ?, ?)", (tweet_id, tweet, time.time()))
+            connection.execute("DELETE FROM timelines WHERE tweet_id = ?", (tweet_id,))
+            positions[tweet_id] = 0
+        self.__insert_timelines(connection, positions, tweet_id, timelines)
+
+    def __apply_one_by_one(self, connection, positions, writes):
+        """commit each write in it's own transaction, keeping the first failure for `flush()` and `close()`
+        """
+        for write in writes:
+            tweet_id = write[1]
+            try:
+                with connection:
+                    self.__apply(connection, positions, write)
+            except sqlite3.Error as e:
+                logger.error("Failed to write a {} of tweet {} into {}.".format(write[0], tweet_id, self.path), exc_info=True)
+                positions.pop(tweet_id, None)
+                if self.__error is None:
+                    self.__error = e
+
+    def __insert_timelines(self, connection, positions, tweet_id, timelines):
+        if tweet_id not in positions:
+            row = connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM timelines WHERE tweet_id = ?", (tweet_id,)).fetchone()
+            positions[tweet_id] = row[0]
+        start = positions[tweet_id]
+        connection.executemany(
+            "INSERT INTO timelines (tweet_id, position, replies) VALUES (?, ?, ?)",
+            [(tweet_id, start + i, json.dumps(replies)) for i, replies in enumerate(timelines)])
+        positions[tweet_id] = start + len(timelines)
+
+    def has_tweet(self, tweet_id):
+        """check whether a tweet is saved. pending writes are not visible, see `flush()`.
+
+        Args:
+            tweet_id: the id of the tweet
+
+        Returns: True if the tweet is saved
+        """
+        row = self._reader().execute("SELECT 1 FROM tweets WHERE tweet_id = ?", (tweet_id,)).fetchone()
+        return row is not None
+
+    def get_conversation(self, tweet_id):
+        """read a saved tweet and it's timelines. pending writes are not visible, see `flush()`.
+
+        Args:
+            tweet_id: the id of the tweet
+
+        Returns: the parsed tweet object, see `tweet_crawler.tweet_parser.Tweet.get_tweets`. None if not saved.
+        """
+        connection = self._reader()
+        row = connection.execute("SELECT tweet FROM tweets WHERE tweet_id = ?", (tweet_id,)).fetchone()
+        if row is None:
+            return None
+        timelines = [
+            json.loads(replies) for (replies,) in
+            connection.execute("SELECT replies FROM timelines WHERE tweet_id = ? ORDER BY position", (tweet_id,))
+        ]
+        return {"tweet": row[0], "tweet_id": tweet_id, "timelines": timelines}
+
+    def iter_tweet_ids(self):
+        """iterate the ids of the saved tweets
+
+        Args: None
+
+        Returns: a generator of tweet ids
+        """
+        for (tweet_id,) in self._reader().execute("SELECT tweet_id FROM tweets"):
+            yield tweet_id
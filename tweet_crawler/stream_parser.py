@@ -0,0 +1,141 @@
+"""Parse the pages of a conversation from the events of a streaming json parser
+
+A page is read as a stream of events by ijson, and only the tweet ids, the
+`full_text` and the author of the tweets and the cursors are kept. The page
+is never built as a whole, so a worker holds the body of the response and a
+few texts instead of the whole json document. The results are the compact pages of
+`tweet_crawler.parse_pool`.
+
+Without ijson, the page is decoded by `tweet_crawler.json_codec` and dropped
+right after the compact page is built.
+"""
+import io
+
+from tweet_crawler import parse_pool
+from tweet_crawler.records import TimelineRecord
+
+
+def _import_ijson():
+    try:
+        import ijson
+    except ImportError:
+        raise ImportError("The streaming parser requires ijson. Install it with `pip install ijson`.")
+    return ijson
+
+
+try:
+    _ijson = _import_ijson()
+except ImportError:
+    _ijson = None
+
+
+TWEETS = "globalObjects.tweets."
+FULL_TEXT = ".full_text"
+AUTHOR = ".user_id_str"
+ENTRY = "timeline.instructions.item.addEntries.entries.item.content."
+MODULE_ITEM = ENTRY + "timelineModule.items.item.item.content."
+ADDED_ITEM = "timeline.instructions.item.addToModule.moduleItems.item.item.content."
+
+
+def has_ijson():
+    """whether the pages are parsed by ijson, or decoded as a whole by the fallback
+    """
+    return _ijson is not None
+
+
+def _events(content):
+    return _ijson.parse(io.BytesIO(content))
+
+
+class _Tweets:
+    """the texts and the authors of the tweets of a page
+    """
+
+    def __init__(self):
+        self.texts = {}
+        self.authors = {}
+
+    def add(self, prefix, value):
+        """keep the value of a `globalObjects.tweets` event if it is a text or an author
+        """
+        if prefix.endswith(FULL_TEXT):
+            self.texts[prefix[len(TWEETS):-len(FULL_TEXT)]] = value
+        elif prefix.endswith(AUTHOR):
+            self.authors[prefix[len(TWEETS):-len(AUTHOR)]] = value
+
+    def text(self, tweet_id):
+        return self.texts.get(tweet_id, "[ERROR]")
+
+    def timeline(self, tweet_ids):
+        """the `records.TimelineRecord` of the ids of a timeline
+        """
+        return TimelineRecord(tweet_ids, [self.text(i) for i in tweet_ids], [self.authors.get(i) for i in tweet_ids])
+
+
+def parse_conversation_page(content):
+    """parse a page of a conversation. see `parse_pool.parse_conversation_page`
+
+    Args:
+        content: the body of the response, as bytes.
+
+    Returns: the compact page
+    """
+    if _ijson is None:
+        return parse_pool.parse_conversation_page(content)
+
+    tweets = _Tweets()
+    main_id = None
+    modules = []
+    next_cursor = None
+    for prefix, event, value in _events(content):
+        if event == "string" or event == "number":
+            if prefix.startswith(TWEETS):
+                tweets.add(prefix, value)
+            elif prefix == MODULE_ITEM + "tweet.id":
+                modules[-1][0].append(str(value))
+            elif prefix == MODULE_ITEM + "timelineCursor.value":
+                modules[-1][1] = value
+            elif prefix == ENTRY + "item.content.tweet.id":
+                main_id = str(value)
+            elif prefix == ENTRY + "operation.cursor.value":
+                next_cursor = value
+        elif event == "start_array" and prefix == ENTRY + "timelineModule.items":
+            modules.append([[], None])
+        elif event == "start_map" and prefix == ENTRY + "item":
+            # an item without a tweet is an error, like in `Tweet._get_tweet_text`
+            main_id = ""
+
+    return {
+        "tweet": tweets.text(main_id) if main_id is not None else None,
+        "author_id": tweets.authors.get(main_id),
+        "modules": [[tweets.timeline(ids), cursor] for ids, cursor in modules],
+        "next_cursor": next_cursor,
+    }
+
+
+def parse_module_page(content):
+    """parse a page fetched with the cursor of a timeline module. see `parse_pool.parse_module_page`
+
+    Args:
+        content: the body of the response, as bytes.
+
+    Returns:
+        timeline: a `records.TimelineRecord` of the replies of the page
+        next_cursor: the cursor of the rest of the timeline, None if no cursor.
+    """
+    if _ijson is None:
+        return parse_pool.parse_module_page(content)
+
+    tweets = _Tweets()
+    ids = []
+    next_cursor = None
+    for prefix, event, value in _events(content):
+        if event != "string" and event != "number":
+            continue
+        if prefix.startswith(TWEETS):
+            tweets.add(prefix, value)
+        elif prefix == ADDED_ITEM + "tweet.id":
+            ids.append(str(value))
+        elif prefix == ADDED_ITEM + "timelineCursor.value":
+            next_cursor = value
+    return tweets.timeline(ids), next_cursor
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import threading
+
+from tweet_crawler import logger
+from tweet_crawler import tweet_fetcher
+
+
+DEFAULT_PATH = "./.cache/access_token.json"
+
+
+class AccessTokenCache:
+    """A persistent cache of the bearer token scraped from main.*.js
+
+    The entries are keyed by the url of main.*.js. Within `ttl` the cached
+    token is returned without any request. After that, the home page is
+    fetched to find the current main.*.js. If the url did not change, the
+    cached copy is revalidated with `If-None-Match`/`If-Modified-Since` so
+    an unchanged bundle is never downloaded again.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=24 * 60 * 60, max_entries=5):
+        """
+        Args:
+            path: the json file to keep the cache.
+            ttl: the time duration in seconds to trust the cached token without revalidation.
+            max_entries: the maximum amount of main.*.js urls to remember.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+
+    def load(self):
+        """read the cache file
+
+        Args: None
+
+        Returns: a dictionary. for example:
+            {
+                "latest": "https://abs.twimg.com/responsive-web/web/main.6ad4f064.js",
+                "entries": {
+                    "https://abs.twimg.com/responsive-web/web/main.6ad4f064.js": {
+                        "access_token": "AAAAA......",
+                        "etag": "\\"abc\\"",
+                        "last_modified": "Wed, 18 Mar 2020 05:00:00 GMT",
+                        "checked_at": 1584508800.0
+                    }
+                }
+            }
+        """
+        if not os.path.isfile(self.path):
+            return {"latest": None, "entries": {}}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cache = json.loads(f.read())
+        except (OSError, ValueError):
+            logger.warning("The token cache '{}' is broken. Ignored.".format(self.path))
+            return {"latest": None, "entries": {}}
+        cache.setdefault("latest", None)
+        cache.setdefault("entries", {})
+        return cache
+
+    def save(self, cache):
+        """write the cache file atomically
+
+        Args:
+            cache: see `load()`
+
+        Returns: None
+        """
+        entries = cache["entries"]
+        if len(entries) > self.max_entries:
+            for url in sorted(entries, key=lambda u: entries[u]["checked_at"])[:len(entries) - self.max_entries]:
+                del entries[url]
+
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(cache))
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """remove the cache file
+        """
+        with self.__lock:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+
+    def get_access_token(self, session=None, force=False):
+        """get the bearer token, downloading main.*.js only if it changed
+
+        Args:
+            session: the http session to use. see `tweet_crawler.http_session`.
+            force: ignore `ttl` and revalidate the cached token.
+
+        Returns: the access token. return None if it can not be found.
+        """
+        with self.__lock:
+            cache = self.load()
+            latest = cache["entries"].get(cache["latest"]) if cache["latest"] is not None else None
+            if not force and latest is not None and time.time() - latest["checked_at"] < self.ttl:
+                return latest["access_token"]
+
+            html = tweet_fetcher.fetch_twitter_home_page(session=session)
+            if html is None:
+                # keep crawling with the stale token rather than failing
+                return latest["access_token"] if latest is not None else None
+            url = tweet_fetcher.get_main_js_url(html)
+
+            entry = cache["entries"].get(url)
+            result = tweet_fetcher.fetch_main_js_if_modified(
+                url,
+                etag=entry["etag"] if entry is not None else None,
+                last_modified=entry["last_modified"] if entry is not None else None,
+                session=session)
+            if result is None:
+                return entry["access_token"] if entry is not None else None
+
+            if result["modified"] or entry is None:
+                access_token = tweet_fetcher.get_access_token(result["content"])
+                logger.info("Access token scraped from {}".format(url))
+            else:
+                access_token = entry["access_token"]
+                logger.info("Access token revalidated for {}".format(url))
+
+            cache["entries"][url] = {
+                "access_token": access_token,
+                "etag": result["etag"],
+                "last_modified": result["last_modified"],
+                "checked_at": time.time(),
+            }
+            cache["latest"] = url
+            self.save(cache)
+            return access_token
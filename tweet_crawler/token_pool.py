@@ -0,0 +1,360 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+from tweet_crawler import logger
+from tweet_crawler import tweet_fetcher
+from tweet_crawler import retry
+
+
+CONVERSATION = "conversation"
+SEARCH = "search"
+
+
+def endpoint_of(url):
+    """get the endpoint name of a twitter api url
+
+    Args:
+        url: the request url
+
+    Returns: `CONVERSATION`, `SEARCH` or the path of the url
+    """
+    path = urlsplit(url).path
+    if path.startswith("/2/timeline/conversation/"):
+        return CONVERSATION
+    if path.startswith("/2/search/adaptive"):
+        return SEARCH
+    return path
+
+
+class GuestToken:
+    """A guest token and it's rate limit accounting
+    """
+
+    def __init__(self, access_token, csrf_token, guest_token, ttl):
+        """
+        Args:
+            access_token: the access token to pass the oauth
+            csrf_token: the csrf_token sent with the guest token
+            guest_token: the guest token activated by twitter
+            ttl: the time duration in seconds before the guest token expires
+        """
+        self.access_token = access_token
+        self.csrf_token = csrf_token
+        self.guest_token = guest_token
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        self.uses = 0
+        self.in_flight = 0
+        self.valid = True
+        # endpoint -> [remaining, reset]
+        self.limits = {}
+
+    def remaining(self, endpoint, now=None):
+        """the remaining requests of an endpoint. None if unknown.
+        """
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return None
+        remaining, reset = limit
+        if reset is not None and (now or time.time()) >= reset:
+            return None
+        return remaining
+
+    def available_at(self, endpoint, now=None):
+        """the time when the token can be used for the endpoint again
+        """
+        now = now or time.time()
+        remaining = self.remaining(endpoint, now)
+        if remaining is None or remaining > 0:
+            return now
+        return self.limits[endpoint][1]
+
+    def as_dict(self):
+        return {
+            "access_token": self.access_token,
+            "csrf_token": self.csrf_token,
+            "guest_token": self.guest_token,
+        }
+
+
+class TokenPool:
+    """A pool of guest tokens handed out per request
+
+    Every token keeps the `x-rate-limit-remaining`/`x-rate-limit-reset` of each
+    endpoint it was used for. The least used token with quota left is handed
+    to a request, and tokens are replaced in the background before they expire.
+    """
+
+    def __init__(self, size=4, ttl=3 * 60 * 60, refresh_margin=300, access_token=None, session=None, check_interval=10, token_cache=None, rate_limiter=None):
+        """
+        Args:
+            size: the amount of guest tokens to keep.
+            ttl: the time duration in seconds a guest token is used before it is replaced.
+            refresh_margin: the time duration in seconds before the expiry to replace a token.
+            access_token: the bearer token. scraped from main.*.js if None.
+            session: the http session used to activate guest tokens. see `tweet_crawler.http_session`.
+            check_interval: the time duration in seconds between two background expiry checks.
+            token_cache: a `token_cache.AccessTokenCache` to reuse the bearer token scraped before.
+            rate_limiter: a `rate_limiter.RateLimiter` pacing the requests of each token. see `pace()`.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.access_token = access_token
+        self.session = session
+        self.check_interval = check_interval
+        self.token_cache = token_cache
+        self.rate_limiter = rate_limiter
+
+        self.__tokens = []
+        # the tokens being activated by a `fill()`, so concurrent fills do not overfill the pool
+        self.__pending = 0
+        self.__condition = threading.Condition()
+        self.__stop_event = threading.Event()
+        self.__thread_refresh = None
+
+    def _new_token(self):
+        csrf_token = tweet_fetcher.generate_csrf_token()
+        guest_token = tweet_fetcher.fetch_guest_token(self.access_token, csrf_token, session=self.session)
+        if guest_token is None:
+            return None
+        return GuestToken(self.access_token, csrf_token, guest_token, self.ttl)
+
+    def refresh_access_token(self):
+        """scrape the bearer token from main.*.js again, or read it from `self.token_cache`
+
+        Args: None
+
+        Returns: None
+        """
+        if self.token_cache is not None:
+            self.access_token = self.token_cache.get_access_token(session=self.session)
+            return
+        html = tweet_fetcher.fetch_twitter_home_page(session=self.session)
+        main_js = tweet_fetcher.fetch_main_js(tweet_fetcher.get_main_js_url(html), session=self.session)
+        self.access_token = tweet_fetcher.get_access_token(main_js)
+
+    def fill(self):
+        """activate guest tokens until the pool is full
+
+        Args: None
+
+        Returns: the amount of tokens in the pool
+        """
+        if self.access_token is None:
+            self.refresh_access_token()
+
+        with self.__condition:
+            missing = max(self.size - len(self.__tokens) - self.__pending, 0)
+            self.__pending += missing
+        created = []
+        try:
+            for _ in range(missing):
+                token = self._new_token()
+                if token is not None:
+                    created.append(token)
+        finally:
+            with self.__condition:
+                self.__pending -= missing
+                self.__tokens += created
+                self.__condition.notify_all()
+                count = len(self.__tokens)
+        return count
+
+    def start(self):
+        """fill the pool and start replacing tokens in the background
+
+        Args: None
+
+        Returns: None
+        """
+        self.fill()
+        logger.info("Token pool started with {} guest tokens".format(len(self.__tokens)))
+        if self.__thread_refresh is None:
+            self.__stop_event.clear()
+            self.__thread_refresh = threading.Thread(target=self.__refresh_loop, args=(), daemon=True)
+            self.__thread_refresh.start()
+
+    def close(self):
+        """stop the background refresh
+
+        Args: None
+
+        Returns: None
+        """
+        self.__stop_event.set()
+        with self.__condition:
+            self.__condition.notify_all()
+        if self.__thread_refresh is not None:
+            self.__thread_refresh.join()
+            self.__thread_refresh = None
+
+    def refresh(self, force=False):
+        """drop the invalid and (nearly) expired tokens and fill the pool again
+
+        Args:
+            force: drop every token.
+
+        Returns: None
+        """
+        now = time.time()
+        with self.__condition:
+            self.__tokens = [
+                token for token in self.__tokens
+                if not force and token.valid and token.expires_at - self.refresh_margin > now
+            ]
+        self.fill()
+
+    def __refresh_loop(self):
+        while not self.__stop_event.wait(self.check_interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.error("Failed to refresh guest tokens.", exc_info=True)
+
+    def __len__(self):
+        with self.__condition:
+            return len(self.__tokens)
+
+    def tokens(self):
+        """a snapshot of the tokens in the pool
+        """
+        with self.__condition:
+            return list(self.__tokens)
+
+    def acquire(self, endpoint=CONVERSATION, timeout=None):
+        """get a token with quota left for the endpoint
+
+        Blocks until a token is available again when every token is exhausted.
+
+        Args:
+            endpoint: `CONVERSATION`, `SEARCH` or an url path. see `endpoint_of()`.
+            timeout: the maximum time in seconds to wait. None to wait forever.
+
+        Returns: a `GuestToken`. None if no token is available within `timeout`.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.__condition:
+            while not self.__stop_event.is_set():
+                now = time.time()
+                candidates = [token for token in self.__tokens if token.valid and token.expires_at > now]
+                ready = [token for token in candidates if token.available_at(endpoint, now) <= now]
+                if len(ready) > 0:
+                    token = max(ready, key=lambda t: (t.remaining(endpoint, now) is None, t.remaining(endpoint, now) or 0, -t.in_flight, -t.uses))
+                    token.uses += 1
+                    token.in_flight += 1
+                    limit = token.limits.get(endpoint)
+                    if limit is not None and token.remaining(endpoint, now) is not None:
+                        limit[0] -= 1
+                    return token
+
+                wake_at = min([token.available_at(endpoint, now) for token in candidates], default=now + self.check_interval)
+                if deadline is not None:
+                    if now >= deadline:
+                        return None
+                    wake_at = min(wake_at, deadline)
+                self.__condition.wait(max(wake_at - now, 0.01))
+        return None
+
+    def pace(self, endpoint, token):
+        """wait for `self.rate_limiter` before sending a request with a token. returns at once without a rate limiter.
+
+        Args:
+            endpoint: see `endpoint_of()`
+            token: the `GuestToken` returned by `acquire()`
+
+        Returns: None
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(endpoint, token.guest_token, stop_event=self.__stop_event)
+
+    def release(self, token):
+        """return a token acquired by `acquire()`
+
+        Args:
+            token: the `GuestToken`
+
+        Returns: None
+        """
+        with self.__condition:
+            token.in_flight = max(token.in_flight - 1, 0)
+            self.__condition.notify_all()
+
+    def report_error(self, token, endpoint, error):
+        """react to a failed request sent with a token
+
+        A `retry.RateLimitError` marks the quota of the endpoint as used up
+        until the reset. A `retry.AuthError` invalidates the token and fills
+        the pool again, after scraping a new bearer token on a 401.
+
+        Args:
+            token: the `GuestToken`
+            endpoint: see `endpoint_of()`
+            error: the `retry.FetchError`
+
+        Returns: None
+        """
+        if isinstance(error, retry.RateLimitError):
+            reset = error.retry_after if error.retry_after is not None else time.time() + 60
+            with self.__condition:
+                token.limits[endpoint] = [0, reset]
+        elif isinstance(error, retry.AuthError):
+            self.invalidate(token)
+            if error.status_code == 401 and token.access_token == self.access_token:
+                logger.info("The bearer token is rejected. Scrape a new one.")
+                self.refresh_access_token()
+            self.refresh()
+
+    def invalidate(self, token):
+        """mark a token as unusable. it is replaced by the next refresh.
+
+        Args:
+            token: the `GuestToken`
+
+        Returns: None
+        """
+        with self.__condition:
+            token.valid = False
+
+    def update_rate_limit(self, guest_token, endpoint, remaining, reset):
+        """record the rate limit of a token
+
+        Args:
+            guest_token: the guest token string
+            endpoint: see `endpoint_of()`
+            remaining: the remaining requests
+            reset: the epoch time when the quota is reset
+
+        Returns: None
+        """
+        with self.__condition:
+            for token in self.__tokens:
+                if token.guest_token == guest_token:
+                    token.limits[endpoint] = [remaining, reset]
+                    break
+            self.__condition.notify_all()
+
+    def observe(self, response):
+        """an `HttpSession` response hook reading the rate limit headers
+
+        Args:
+            response: the response of a request sent with a guest token
+
+        Returns: None
+        """
+        request = getattr(response, "request", None)
+        if request is None:
+            return
+        guest_token = request.headers.get("x-guest-token")
+        remaining = response.headers.get("x-rate-limit-remaining")
+        if guest_token is None or remaining is None:
+            return
+        reset = response.headers.get("x-rate-limit-reset")
+        try:
+            remaining = int(remaining)
+            reset = float(reset) if reset is not None else None
+        except ValueError:
+            logger.debug("Ignore the malformed rate limit headers {!r} and {!r}.".format(remaining, reset))
+            return
+        self.update_rate_limit(guest_token, endpoint_of(request.url), remaining, reset)
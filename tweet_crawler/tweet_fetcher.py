@@ -1,15 +1,44 @@
-import requests
-import json
 import random
 import re
-from bs4 import BeautifulSoup
+import html as html_lib
 from urllib.parse import quote
 
+from tweet_crawler import http_session
+from tweet_crawler import retry
+from tweet_crawler import json_codec
 
-def fetch_twitter_home_page():
+
+def _resolve_session(session):
+    if session is None:
+        return http_session.get_default_session()
+    return session
+
+
+def _decode_json(response, raise_errors, raw=False):
+    """decode the body of a 200 response, otherwise return None or raise a classified `retry.FetchError`
+
+    the body is returned as bytes, undecoded, if `raw` is True.
+    """
+    if response.status_code != 200:
+        if raise_errors:
+            raise retry.error_from_response(response)
+        return None
+    if raw:
+        return response.content
+    try:
+        return json_codec.loads(response.content)
+    except ValueError as e:
+        if raise_errors:
+            raise retry.TransientError("Broken json body: {}".format(e), response.status_code)
+        raise
+
+
+def fetch_twitter_home_page(session=None):
     """get the twitter home page
 
-    Args: None
+    Args:
+        session: the http session to use. default is `http_session.get_default_session()`.
+
     Returns: 
         html in string. if the response code is not 200, return None.
     """
@@ -29,7 +58,7 @@ def fetch_twitter_home_page():
         ('lang', 'zh-tw'),
     )
 
-    response = requests.get('https://twitter.com/', headers=headers, params=params)
+    response = _resolve_session(session).get('https://twitter.com/', headers=headers, params=params)
 
     if response.status_code == 200:
         return response.text
@@ -37,46 +66,80 @@ def fetch_twitter_home_page():
         return None
 
 
+_LINK_TAG_PATTERN = re.compile(r"<link\b([^>]*)>", re.IGNORECASE)
+_ATTRIBUTE_PATTERN = re.compile(r"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?""")
+_MAIN_JS_PATTERN = re.compile(r"main\..+\.js")
+
+
+def _is_main_js(href):
+    return _MAIN_JS_PATTERN.match(href.rsplit("/", 1)[-1]) is not None
+
+
+def _parse_attributes(text):
+    attributes = {}
+    for match in _ATTRIBUTE_PATTERN.finditer(text):
+        name = match.group(1).lower()
+        value = next((v for v in match.group(2, 3, 4) if v is not None), "")
+        attributes.setdefault(name, html_lib.unescape(value))
+    return attributes
+
+
+def _get_main_js_url_bs4(html):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup.find_all('link', {"as": "script"}):
+        href = tag.get("href")
+        if href is not None and _is_main_js(href):
+            return href
+    return None
+
+
 def get_main_js_url(html):
     """get the main.*.js from twitter
 
 
+    The `<link>` tags are scanned with a regular expression, stopping at the
+    first `as="script"` link named `main.*.js`. BeautifulSoup is only imported
+    as a fallback when the scan finds nothing and bs4 is installed.
+
     Args:
         html: the html from twitter home page
     
-    Returns: the full url of main.*.js
+    Returns: the full url of main.*.js. return None if not found.
     """
-    soup = BeautifulSoup(html, 'html.parser')
-    tags = soup.find_all('link', {"as": "script"})
-    
-    pattern = re.compile("main\..+\.js")
-    href = None
+    for match in _LINK_TAG_PATTERN.finditer(html):
+        attributes = _parse_attributes(match.group(1))
+        href = attributes.get("href")
+        if attributes.get("as") == "script" and href is not None and _is_main_js(href):
+            return href
+
+    try:
+        return _get_main_js_url_bs4(html)
+    except ImportError:
+        return None
 
-    for tag in tags:
-        href = tag["href"]
-        if pattern.match(href):
-            break
 
-    return href
+def _main_js_headers():
+    return {
+        'Referer': 'https://twitter.com/?lang=zh-tw',
+        'Origin': 'https://twitter.com',
+        'Sec-Fetch-Dest': 'script',
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.132 Safari/537.36',
+    }
 
 
-def fetch_main_js(url):
+def fetch_main_js(url, session=None):
     """get the main.*.js content
 
 
     Args:
         url: the url of the main.*.js
+        session: the http session to use. default is `http_session.get_default_session()`.
     
     Returns: the content of the main.*.js. return None if the response code of the url is not 200.
     """
-    headers = {
-        'Referer': 'https://twitter.com/?lang=zh-tw',
-        'Origin': 'https://twitter.com',
-        'Sec-Fetch-Dest': 'script',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.132 Safari/537.36',
-    }
-
-    response = requests.get(url, headers=headers)
+    response = _resolve_session(session).get(url, headers=_main_js_headers())
 
     if response.status_code == 200:
         return response.text
@@ -84,6 +147,51 @@ def fetch_main_js(url):
         return None
 
 
+def fetch_main_js_if_modified(url, etag=None, last_modified=None, session=None):
+    """revalidate the main.*.js with a conditional request
+
+
+    Args:
+        url: the url of the main.*.js
+        etag: the `ETag` of the cached copy, sent as `If-None-Match`
+        last_modified: the `Last-Modified` of the cached copy, sent as `If-Modified-Since`
+        session: the http session to use. default is `http_session.get_default_session()`.
+
+    Returns: a dictionary. for example:
+        {
+            "modified": True,
+            "content": "the content of main.*.js. None if not modified.",
+            "etag": "the new ETag or None",
+            "last_modified": "the new Last-Modified or None"
+        }
+        return None if the response code is neither 200 nor 304.
+    """
+    headers = _main_js_headers()
+    if etag is not None:
+        headers['If-None-Match'] = etag
+    if last_modified is not None:
+        headers['If-Modified-Since'] = last_modified
+
+    response = _resolve_session(session).get(url, headers=headers)
+
+    if response.status_code == 304:
+        return {
+            "modified": False,
+            "content": None,
+            "etag": response.headers.get("ETag", etag),
+            "last_modified": response.headers.get("Last-Modified", last_modified),
+        }
+    elif response.status_code == 200:
+        return {
+            "modified": True,
+            "content": response.text,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+    else:
+        return None
+
+
 def get_access_token(main_js):
     """extract access token from main.*.js
 
@@ -122,13 +230,14 @@ def generate_csrf_token():
     return "".join(seed)
 
 
-def fetch_guest_token(access_token, csrf_token):
+def fetch_guest_token(access_token, csrf_token, session=None):
     """request guest token by access_token and csrf_token
 
 
     Args:
         access_token: the access token to pass the oauth
         csrf_token: the csrf_token hidden in twitter page or cookie
+        session: the http session to use. default is `http_session.get_default_session()`.
     
     Returns: the guest token. return None if error occured.
     """
@@ -150,12 +259,12 @@ def fetch_guest_token(access_token, csrf_token):
         'accept-language': 'zh-TW,zh;q=0.9,en-US;q=0.8,en;q=0.7,zh-CN;q=0.6,ja;q=0.5',
     }
 
-    response = requests.post('https://api.twitter.com/1.1/guest/activate.json', headers=headers)
+    response = _resolve_session(session).post('https://api.twitter.com/1.1/guest/activate.json', headers=headers)
 
     if response.status_code == 200:
         obj = None
         try:
-            obj = json.loads(response.text)
+            obj = json_codec.loads(response.content)
         except Exception:
             pass
 
@@ -167,11 +276,13 @@ def fetch_guest_token(access_token, csrf_token):
         return None
 
 
-def get_tokens():
+def get_tokens(session=None, token_cache=None):
     """get `access_token`, `csrf_token` and `guest_token`
     
     
-    Args: None
+    Args:
+        session: the http session to use. default is `http_session.get_default_session()`.
+        token_cache: a `token_cache.AccessTokenCache` to reuse the access token scraped before.
 
     Returns: a dictionary. for example:
         {
@@ -180,13 +291,16 @@ def get_tokens():
             "guest_token": "123......"
         }
     """
-    html = fetch_twitter_home_page()
-    main_js_url = get_main_js_url(html)
-    main_js = fetch_main_js(main_js_url)
+    if token_cache is not None:
+        access_token = token_cache.get_access_token(session=session)
+    else:
+        html = fetch_twitter_home_page(session=session)
+        main_js_url = get_main_js_url(html)
+        main_js = fetch_main_js(main_js_url, session=session)
+        access_token = get_access_token(main_js)
 
-    access_token = get_access_token(main_js)
     csrf_token = generate_csrf_token()
-    guest_token = fetch_guest_token(access_token, csrf_token)
+    guest_token = fetch_guest_token(access_token, csrf_token, session=session)
 
     return {
         "access_token": access_token,
@@ -195,23 +309,11 @@ def get_tokens():
     }
 
 
-def fetch_tweet(tweet_id, access_token, csrf_token, guest_token, cursor=None):
-    """Fetch tweets by id
-
-
-    Args:
-        tweet_id: the target tweet id
-        access_token: the access token to pass the oauth
-        csrf_token: the csrf_token hidden in twitter page or cookie
-        guest_token: the guest_token is calculate by twitter server. see `fetch_guest_token()`.
-        cursor: getting more response tweet start from this cursor
-
-    Returns: 
-        the json object return from twitter server (which is parsed as a python dictionary).
-        if the request is faild, return None.
+def _build_tweet_request(tweet_id, access_token, csrf_token, guest_token, cursor=None):
+    """build the url, headers and params of a conversation request
 
+    Returns: a tuple of (url, headers, params)
     """
-
     headers = {
         'authority': 'api.twitter.com',
         'x-twitter-client-language': 'zh-tw',
@@ -258,29 +360,40 @@ def fetch_tweet(tweet_id, access_token, csrf_token, guest_token, cursor=None):
     if cursor is not None:
         params.append(('cursor', cursor))
 
-    response = requests.get('https://api.twitter.com/2/timeline/conversation/{}.json'.format(tweet_id), headers=headers, params=params)
-
-    if response.status_code == 200:
-        return json.loads(response.text)
-    else:
-        return None
+    url = 'https://api.twitter.com/2/timeline/conversation/{}.json'.format(tweet_id)
+    return url, headers, params
 
 
-def fetch_search_result(keyword, access_token, csrf_token, guest_token, cursor=None):
-    """Fetch search results by keyword
+def fetch_tweet(tweet_id, access_token, csrf_token, guest_token, cursor=None, session=None, raise_errors=False, raw=False):
+    """Fetch tweets by id
 
 
     Args:
-        keyword: the keyword to search
+        tweet_id: the target tweet id
         access_token: the access token to pass the oauth
         csrf_token: the csrf_token hidden in twitter page or cookie
+        guest_token: the guest_token is calculate by twitter server. see `fetch_guest_token()`.
         cursor: getting more response tweet start from this cursor
+        session: the http session to use. default is `http_session.get_default_session()`.
+        raise_errors: raise a `retry.FetchError` classifying the failure instead of returning None.
+        raw: return the body as bytes instead of decoding it, e.g. to decode it in another process. see `tweet_crawler.parse_pool`.
 
     Returns: 
         the json object return from twitter server (which is parsed as a python dictionary).
         if the request is faild, return None.
 
     """
+
+    url, headers, params = _build_tweet_request(tweet_id, access_token, csrf_token, guest_token, cursor=cursor)
+    response = _resolve_session(session).get(url, headers=headers, params=params)
+    return _decode_json(response, raise_errors, raw=raw)
+
+
+def _build_search_request(keyword, access_token, csrf_token, guest_token, cursor=None):
+    """build the url, headers and params of a search request
+
+    Returns: a tuple of (url, headers, params)
+    """
     headers = {
         'authority': 'api.twitter.com',
         'x-twitter-client-language': 'zh-tw',
@@ -331,8 +444,27 @@ def fetch_search_result(keyword, access_token, csrf_token, guest_token, cursor=N
     if params is not None:
         params.append(('cursor', cursor))
 
-    response = requests.get('https://api.twitter.com/2/search/adaptive.json', headers=headers, params=params)
-    if response.status_code == 200:
-        return json.loads(response.text)
-    else:
-        return None
+    url = 'https://api.twitter.com/2/search/adaptive.json'
+    return url, headers, params
+
+
+def fetch_search_result(keyword, access_token, csrf_token, guest_token, cursor=None, session=None, raise_errors=False):
+    """Fetch search results by keyword
+
+
+    Args:
+        keyword: the keyword to search
+        access_token: the access token to pass the oauth
+        csrf_token: the csrf_token hidden in twitter page or cookie
+        cursor: getting more response tweet start from this cursor
+        session: the http session to use. default is `http_session.get_default_session()`.
+        raise_errors: raise a `retry.FetchError` classifying the failure instead of returning None.
+
+    Returns: 
+        the json object return from twitter server (which is parsed as a python dictionary).
+        if the request is faild, return None.
+
+    """
+    url, headers, params = _build_search_request(keyword, access_token, csrf_token, guest_token, cursor=cursor)
+    response = _resolve_session(session).get(url, headers=headers, params=params)
+    return _decode_json(response, raise_errors)
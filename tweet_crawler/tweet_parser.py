@@ -1,58 +1,145 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from tweet_crawler import tweet_fetcher
+from tweet_crawler import stream_parser
+from tweet_crawler.parse_pool import get_reply, parse_timeline_items, find_instruction
+from tweet_crawler.token_pool import CONVERSATION, SEARCH
+from tweet_crawler.retry import FetchError
+from tweet_crawler.records import ConversationRecord, TimelineRecord
 from tweet_crawler import logger
 
+
+def _fetch_with_pool(token_pool, endpoint, fetch, *args, **kwargs):
+    """call `fetch(*args, access_token, csrf_token, guest_token, **kwargs)` with a token of the pool
+    """
+    token = token_pool.acquire(endpoint)
+    if token is None:
+        raise RuntimeError("The token pool is closed.")
+    try:
+        token_pool.pace(endpoint, token)
+        return fetch(*args, token.access_token, token.csrf_token, token.guest_token, **kwargs)
+    except FetchError as e:
+        token_pool.report_error(token, endpoint, e)
+        raise
+    finally:
+        token_pool.release(token)
+
+
+def _fetch_with_retry(retry_policy, endpoint, fetch):
+    """call `fetch()` under `retry_policy`, or once if it is None
+    """
+    if retry_policy is None:
+        return fetch()
+    return retry_policy.call(endpoint, fetch)
+
+
+def _check_source(source, where):
+    if source is None:
+        raise FetchError("at '{}' no response to parse.".format(where))
+    return source
+
 class Tweet:
     """The object that represent a tweet and it's responses
     """
 
-    def __init__(self, tweet_id, access_token, csrf_token, guest_token, cursor=None):
+    def __init__(self, tweet_id, access_token, csrf_token, guest_token, cursor=None, session=None, token_pool=None, retry_policy=None, module_workers=1, parse_pool=None, streaming=False):
         """
             Args:
                 tweet_id: the id of the target tweet
                 access_token: the access token to pass the oauth
                 csrf_token: the csrf_token hidden in twitter page or cookie
                 guest_token: the guest_token is calculate by twitter server. see `tweet_fetcher.fetch_guest_token()`.
+                session: the http session shared between requests. see `tweet_crawler.http_session`.
+                token_pool: a `token_pool.TokenPool` handing a token to each request. the tokens above are ignored if set.
+                retry_policy: a `retry.RetryPolicy` retrying the failed requests. a failed request raises a `retry.FetchError` at once if None.
+                module_workers: the maximum amount of timeline modules of a page expanded concurrently. 1 to expand them one by one.
+                parse_pool: a `parse_pool.ParsePool` decoding the pages in other processes. the pages are decoded in this thread if None.
+                streaming: parse the pages with `stream_parser`, keeping only the texts and the cursors of a page instead of the whole json document.
         """
         self.tweet_id = tweet_id
         self.access_token = access_token
         self.csrf_token = csrf_token
         self.guest_token = guest_token
         self.cursor = cursor
-        self.__next_cursor = None
+        self.session = session
+        self.token_pool = token_pool
+        self.retry_policy = retry_policy
+        self.module_workers = module_workers
+        self.parse_pool = parse_pool
+        self.streaming = streaming
+        self._next_cursor = None
 
         self.entries = None
+        self.page = None
+        self.record = None
 
         self.__is_first = True
 
 
+    def _fetch(self, cursor=None, raw=False):
+        """fetch a page of the conversation with the static tokens or a token of `self.token_pool`
+
+        the body is returned as bytes, undecoded, if `raw` is True.
+        """
+        if self.token_pool is not None:
+            fetch = lambda: _fetch_with_pool(self.token_pool, CONVERSATION, tweet_fetcher.fetch_tweet, self.tweet_id, cursor=cursor, session=self.session, raise_errors=True, raw=raw)
+        else:
+            fetch = lambda: tweet_fetcher.fetch_tweet(self.tweet_id, self.access_token, self.csrf_token, self.guest_token, cursor=cursor, session=self.session, raise_errors=True, raw=raw)
+        return _fetch_with_retry(self.retry_policy, CONVERSATION, fetch)
+
+
+    def _parses_raw(self):
+        """whether the pages are fetched as bytes and parsed to compact pages. see `parse_pool.parse_conversation_page`
+        """
+        return self.parse_pool is not None or self.streaming
+
+
     def __prepare(self):
-        self.source = tweet_fetcher.fetch_tweet(self.tweet_id, self.access_token, self.csrf_token, self.guest_token, cursor=self.cursor)
+        if self._parses_raw():
+            content = _check_source(self._fetch(cursor=self.cursor, raw=True), "tweet_parser.Tweet.__prepare")
+            if self.parse_pool is not None:
+                self.page = self.parse_pool.parse_conversation(content)
+            else:
+                self.page = stream_parser.parse_conversation_page(content)
+            self._init_record()
+            return
+        source = self._fetch(cursor=self.cursor)
+        self._load_source(source)
 
-        self.tweets = self.source["globalObjects"]["tweets"]
-        self.instructions = self.source["timeline"]["instructions"]
 
-        instruction = None
-        for instruction in self.instructions:
-            if "addEntries" in instruction:
-                break
-        
-        if instruction is not None:
-            self.entries = self.instructions[0]["addEntries"]["entries"]
+    def _load_source(self, source):
+        """load the first page of a conversation
+
+        Args:
+            source: the json object returned by `tweet_fetcher.fetch_tweet`
+        """
+        source = _check_source(source, "tweet_parser.Tweet._load_source")
+        self.tweets = source["globalObjects"]["tweets"]
+        add_entries = find_instruction(source["timeline"]["instructions"], "addEntries")
+        if add_entries is not None:
+            self.entries = add_entries["entries"]
 
-        self.output = {}
-        self.__init_output()
+        self._init_record()
 
     
-    def __init_output(self):
-        self.output = {
-            "tweet": "",
-            "tweet_id": self.tweet_id,
-            "timelines": []
-        }
+    def _init_record(self):
+        self.record = ConversationRecord(self.tweet_id)
 
 
     def get_next_cursor(self):
-        return self.__next_cursor
+        return self._next_cursor
+
+
+    def set_next_cursor(self, cursor):
+        """continue a conversation from a cursor saved before, without fetching it's first page
+
+        Args:
+            cursor: a cursor returned by `get_next_cursor()`
+
+        Returns: None
+        """
+        self._next_cursor = cursor
+        self.__is_first = False
 
 
     def get_main_tweet(self, timeline_length=-1):
@@ -73,16 +160,29 @@ class Tweet:
                 ]
             }
         """
+        return self.get_main_record(timeline_length=timeline_length).to_dict()
+
+
+    def get_main_record(self, timeline_length=-1):
+        """get the tweet and it's first timelines, with the ids of the replies and of their authors
+
+        Args:
+            timeline_length: the maximun length of a timeline. -1 to get the whole timeline.
+
+        Returns: a `records.ConversationRecord`
+        """
 
         if self.__is_first:
             self.__prepare()
             self.__is_first = False
 
-        self.__init_output()
-        if self.entries is not None:
+        self._init_record()
+        if self.page is not None:
+            self._parse_page(self.page, timeline_length=timeline_length)
+        elif self.entries is not None:
             self.__parse_entries(entries=self.entries, timeline_length=timeline_length)
 
-        return self.output
+        return self.record
 
 
     def get_next_timelines(self, timeline_length=-1):
@@ -99,38 +199,128 @@ class Tweet:
                 ......
             ]
 
-            Return None if `self.__next_cursor` is None.
+            Return None if `self._next_cursor` is None.
+        """
+        timelines = self.get_next_timeline_records(timeline_length=timeline_length)
+        if timelines is None:
+            return None
+        return [timeline.texts for timeline in timelines]
+
+
+    def get_next_timeline_records(self, timeline_length=-1):
+        """get the next batch of timelines, with the ids of the replies and of their authors
+
+        The page is fetched into this parser, replacing the page parsed before.
+
+        Args:
+            timeline_length: the maximun length of a timeline. -1 to get the whole timeline.
+
+        Returns: a list of `records.TimelineRecord`. None if `self._next_cursor` is None.
         """
         
-        if self.__next_cursor is None:
+        if self._next_cursor is None:
             return None
-        else:
-            new_tweets = Tweet(self.tweet_id, self.access_token, self.csrf_token, self.guest_token, cursor=self.__next_cursor)
-            out = new_tweets.get_main_tweet(timeline_length=timeline_length)
-            self.__next_cursor = new_tweets.get_next_cursor()
-            return out["timelines"]
+        self._move_to_next_cursor()
+        self.__prepare()
+        return self.get_main_record(timeline_length=timeline_length).timelines
+
+
+    def _move_to_next_cursor(self):
+        """forget the page parsed before, to fetch the page of `self._next_cursor`
+        """
+        self.cursor = self._next_cursor
+        self._next_cursor = None
+        self.entries = None
+        self.page = None
+        self.__is_first = False
+
+
+    def iter_timelines(self, max_timelines=-1, timeline_length=-1):
+        """iterate the timelines of the conversation, a page at a time
+
+        The pages are fetched one by one as they are consumed, into this
+        parser, and no page is fetched once `max_timelines` timelines are
+        yielded. The first page is always fetched, unless the conversation is
+        continued with `set_next_cursor`, and `self.record` has the main tweet
+        once it is yielded.
+
+        Args:
+            max_timelines: the maximum amount of timelines to yield. -1 to yield every timeline.
+            timeline_length: the maximun length of a timeline. -1 to get the whole timeline.
+
+        Yields: the timelines of a page, a list of `records.TimelineRecord`. see `get_next_cursor()` for the cursor of the next page.
+        """
+        count = 0
+        while True:
+            if self.__is_first:
+                timelines = self.get_main_record(timeline_length=timeline_length).timelines
+            elif max_timelines != -1 and count >= max_timelines:
+                return
+            else:
+                timelines = self.get_next_timeline_records(timeline_length=timeline_length)
+                if timelines is None:
+                    return
+            if max_timelines != -1:
+                # in place, so `self.record` holds the timelines yielded
+                del timelines[max(max_timelines - count, 0):]
+            count += len(timelines)
+            yield timelines
 
 
     def __parse_entries(self, entries, timeline_length=-1):
         """parse entries from the json object of twitter
 
+        The timeline modules are expanded concurrently by up to
+        `self.module_workers` threads, and their timelines are appended in
+        the order of the entries.
+
         Args:
             entries: a json object which contains all responses
             timeline_length: the maximum length of a timeline
         """
-        responses_count = 0
+        modules = []
         for entry in entries:
             content = entry["content"]
             if "item" in content:
-                self.output["tweet"] = self.__get_tweet_text(content["item"]["content"])
+                _, self.record.text, self.record.author_id = self._get_reply(content["item"]["content"])
             elif "timelineModule" in content:
-                self.process_timeline_module(content, timeline_length=timeline_length)
-                responses_count += 1
+                modules.append(content)
             elif "operation" in content:
                 self.process_operation(content)
             else:
                 print("Not defined")
 
+        if self.module_workers > 1 and len(modules) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.module_workers, len(modules))) as executor:
+                futures = [executor.submit(self._collect_timeline, content, timeline_length) for content in modules]
+                self.record.timelines += [future.result() for future in futures]
+        else:
+            for content in modules:
+                self.process_timeline_module(content, timeline_length=timeline_length)
+
+
+    def _parse_page(self, page, timeline_length=-1):
+        """fill the record from a page parsed by `parse_pool.parse_conversation_page`
+
+        Args:
+            page: the parsed page
+            timeline_length: the maximum length of a timeline
+        """
+        if page["tweet"] is not None:
+            self.record.text = page["tweet"]
+            self.record.author_id = page["author_id"]
+        if page["next_cursor"] is not None:
+            self._next_cursor = page["next_cursor"]
+
+        modules = page["modules"]
+        if self.module_workers > 1 and len(modules) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.module_workers, len(modules))) as executor:
+                futures = [executor.submit(self._follow_timeline, timeline, cursor, timeline_length) for timeline, cursor in modules]
+                self.record.timelines += [future.result() for future in futures]
+        else:
+            for timeline, cursor in modules:
+                self.record.timelines.append(self._follow_timeline(timeline, cursor, timeline_length))
+
 
     def process_timeline_module(self, content, timeline_length=-1):
         """extract timeline from the json object of twitter
@@ -142,23 +332,47 @@ class Tweet:
 
         Returns: None
         """
+        self.record.timelines.append(self._collect_timeline(content, timeline_length=timeline_length))
+
+
+    def _collect_timeline(self, content, timeline_length=-1):
+        """follow the cursors of a timeline module until the timeline is complete
+
+        Args:
+            content: json object which contains several "items"
+            timeline_length: the maximum length of a timeline
+
+        Returns: the timeline, a `records.TimelineRecord`
+        """
         items = content["timelineModule"]["items"]
-        final_timeline = []
-        
-        timeline, next_cursor = self.__parse_timeline_items(items)
-        final_timeline += timeline
+        timeline, next_cursor = self._parse_timeline_items(items)
+        return self._follow_timeline(timeline, next_cursor, timeline_length)
+
+
+    def _follow_timeline(self, timeline, next_cursor, timeline_length=-1):
+        """fetch the rest of a timeline until it is complete
+
+        Args:
+            timeline: the `records.TimelineRecord` known so far
+            next_cursor: the cursor of the rest of the timeline, None if it is complete
+            timeline_length: the maximum length of a timeline
+
+        Returns: the timeline, a `records.TimelineRecord`
+        """
+        final_timeline = TimelineRecord()
+        final_timeline.extend(timeline)
 
         while next_cursor is not None:
             timeline, next_cursor = self.__fetch_data_with_cursor(cursor=next_cursor)
-            final_timeline += timeline
+            final_timeline.extend(timeline)
 
             if timeline_length != -1 and len(final_timeline) > timeline_length:
                 break
         
         if timeline_length != -1:
-            final_timeline = final_timeline[:timeline_length]
+            final_timeline.truncate(timeline_length)
 
-        self.output["timelines"].append(final_timeline)
+        return final_timeline
 
 
     def __fetch_data_with_cursor(self, cursor):
@@ -167,50 +381,48 @@ class Tweet:
         Args:
             cursor: the cursor of the timeline
         
-        Returns: see `__parse_timeline_items()`
+        Returns: see `_parse_timeline_items()`
         """
-        obj = tweet_fetcher.fetch_tweet(self.tweet_id, self.access_token, self.csrf_token, self.guest_token, cursor=cursor)
-        self.tweets.update(obj["globalObjects"]["tweets"])
+        if self._parses_raw():
+            content = _check_source(self._fetch(cursor=cursor, raw=True), "tweet_parser.Tweet.__fetch_data_with_cursor")
+            if self.parse_pool is not None:
+                return self.parse_pool.parse_module(content)
+            return stream_parser.parse_module_page(content)
+        obj = self._fetch(cursor=cursor)
+        return self._parse_module_response(obj)
 
-        instructions = obj["timeline"]["instructions"]
 
-        instruction = None
-        for instruction in instructions:
-            if "addToModule" in instruction:
-                break
-        
-        if instruction is not None:
-            items = instructions[0]["addToModule"]["moduleItems"]
-            return self.__parse_timeline_items(items)
+    def _parse_module_response(self, obj):
+        """parse a page fetched with the cursor of a timeline module
+
+        Args:
+            obj: the json object returned by `tweet_fetcher.fetch_tweet`
+
+        Returns: see `_parse_timeline_items()`
+        """
+        _check_source(obj, "tweet_parser.Tweet._parse_module_response")
+        self.tweets.update(obj["globalObjects"]["tweets"])
+
+        add_to_module = find_instruction(obj["timeline"]["instructions"], "addToModule")
+        if add_to_module is not None:
+            return self._parse_timeline_items(add_to_module["moduleItems"])
         else:
-            logger.debug("at 'tweet_parser.Tweet.__fetch_data_with_cursor' len(instructions) == 0. DUMP:\n{}".format(obj))
-            return [], None
+            logger.debug("at 'tweet_parser.Tweet._parse_module_response' len(instructions) == 0. DUMP:\n{}".format(obj))
+            return TimelineRecord(), None
 
 
-    def __parse_timeline_items(self, items):
-        """extract timeline text from items
+    def _parse_timeline_items(self, items):
+        """extract timeline text from items. see `parse_pool.parse_timeline_items`
 
 
         Args:
             items: the items object from twitter
 
         Returns:
-            timeline: the array of multiple timeline text
+            timeline: a `records.TimelineRecord` of the replies
             next_cursor: the curosr use to fetch more text. return None if no cursor.
         """
-        
-        timeline = []
-        next_cursor = None
-
-        for item in items:
-            content = item["item"]["content"]
-            if "tweet" in content:
-                timeline.append(self.__get_tweet_text(content))
-            elif "timelineCursor" in content:
-                timelineCursor = content["timelineCursor"]
-                next_cursor = timelineCursor["value"]
-        
-        return timeline, next_cursor
+        return parse_timeline_items(self.tweets, items)
 
 
     def process_operation(self, content):
@@ -223,10 +435,10 @@ class Tweet:
         """
         cursor = content["operation"]["cursor"]
         value = cursor["value"]
-        self.__next_cursor = value
+        self._next_cursor = value
 
 
-    def __get_tweet_text(self, content):
+    def _get_tweet_text(self, content):
         """getting the text of the tweet
         
         Args:
@@ -234,31 +446,42 @@ class Tweet:
 
         Returns: the text of the tweet (string)
         """
-        if "tweet" not in content:
-            logger.debug("at 'tweet_parser.Tweet.__get_tweet_text' 'tweet' not in content. DUMP:\n{}".format(content))
-            return "[ERROR]"
-        tweet_id = content["tweet"]["id"]
-        if tweet_id in self.tweets:
-            tweet = self.tweets[tweet_id]
-            return tweet["full_text"]
-        else:
-            logger.debug("at 'tweet_parser.Tweet.__get_tweet_text' the text of 'tweet_id' not found. DUMP:\n{}".format(content))
-            return "[ERROR]"
+        return self._get_reply(content)[1]
+
+
+    def _get_reply(self, content):
+        """getting the id, the text and the author id of the tweet
+
+        Args:
+            content: the "content" object from the response of twitter
+
+        Returns: a tuple of (tweet_id, text, author_id). the text is "[ERROR]" and the author None if the tweet is missing.
+        """
+        reply = get_reply(self.tweets, content)
+        if reply[2] is None and reply[1] == "[ERROR]":
+            logger.debug("at 'tweet_parser.Tweet._get_reply' the text of the tweet not found. DUMP:\n{}".format(content))
+        return reply
 
 
 class TwitterSearch:
-    def __init__(self, keyword, access_token, csrf_token, guest_token):
+    def __init__(self, keyword, access_token, csrf_token, guest_token, session=None, token_pool=None, retry_policy=None):
         """
             Args:
                 keyword: the keyword to search
                 access_token: the access token to pass the oauth
                 csrf_token: the csrf_token hidden in twitter page or cookie
                 guest_token: the guest_token is calculate by twitter server. see `tweet_fetcher.fetch_guest_token()`.
+                session: the http session shared between requests. see `tweet_crawler.http_session`.
+                token_pool: a `token_pool.TokenPool` handing a token to each request. the tokens above are ignored if set.
+                retry_policy: a `retry.RetryPolicy` retrying the failed requests. a failed request raises a `retry.FetchError` at once if None.
         """
         self.keyword = keyword
         self.access_token = access_token
         self.csrf_token = csrf_token
         self.guest_token = guest_token
+        self.session = session
+        self.token_pool = token_pool
+        self.retry_policy = retry_policy
 
         self.next_cursor = None
         self.previous_cursor = None
@@ -272,7 +495,7 @@ class TwitterSearch:
         Returns: a list of tweet id
         """
         entries = self.__fetch_data(cursor=self.next_cursor)
-        tweet_ids = self.__parse_data(entries)
+        tweet_ids = self._parse_data(entries)
         return tweet_ids
 
 
@@ -282,13 +505,26 @@ class TwitterSearch:
         Args:
             cursor: the cursor of the search result
         """
-        source = tweet_fetcher.fetch_search_result(self.keyword, self.access_token, self.csrf_token, self.guest_token, cursor=cursor)
-        instructions = source["timeline"]["instructions"]
+        if self.token_pool is not None:
+            fetch = lambda: _fetch_with_pool(self.token_pool, SEARCH, tweet_fetcher.fetch_search_result, self.keyword, cursor=cursor, session=self.session, raise_errors=True)
+        else:
+            fetch = lambda: tweet_fetcher.fetch_search_result(self.keyword, self.access_token, self.csrf_token, self.guest_token, cursor=cursor, session=self.session, raise_errors=True)
+        source = _fetch_with_retry(self.retry_policy, SEARCH, fetch)
+        return self._get_entries(source)
+
+
+    def _get_entries(self, source):
+        """get the entries of a search result
+
+        Args:
+            source: the json object returned by `tweet_fetcher.fetch_search_result`
+        """
+        instructions = _check_source(source, "tweet_parser.TwitterSearch._get_entries")["timeline"]["instructions"]
         entries = instructions[0]["addEntries"]["entries"]
         return entries
         
 
-    def __parse_data(self, entries):
+    def _parse_data(self, entries):
         """find the tweet ids in the search result
 
         Args:
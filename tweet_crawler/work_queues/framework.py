@@ -0,0 +1,161 @@
+import abc
+
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class Lease:
+    """A task handed to one worker until `deadline`
+
+    Once the deadline has passed without `WorkQueue.extend()`, the task is
+    visible again and another worker may claim it. `token` tells the leases of
+    the same task apart, so a worker whose lease expired can not extend or
+    release the lease of the next worker.
+    """
+
+    def __init__(self, task_id, kind, payload, token, deadline, attempts):
+        """
+        Args:
+            task_id: the id of the task, unique in the queue
+            kind: the kind of the task, e.g. "search" or "conversation"
+            payload: a json serializable dictionary
+            token: the token of this lease
+            deadline: the epoch time the lease expires
+            attempts: the amount of leases of the task which failed or expired, plus this one
+        """
+        self.task_id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.token = token
+        self.deadline = deadline
+        self.attempts = attempts
+
+    def __repr__(self):
+        return "Lease({!r}, kind={!r}, attempts={})".format(self.task_id, self.kind, self.attempts)
+
+
+class WorkQueue(abc.ABC):
+    """A queue of tasks shared by many crawler processes
+
+    A task is identified by it's `task_id`: putting a task twice adds it once,
+    and completing it twice completes it once, so a task repeated after a
+    crash never adds duplicate work. A claimed task is leased for a
+    visibility timeout. A worker which dies holding a lease loses the task to
+    the next `claim()` once the lease expires.
+    """
+
+    @abc.abstractmethod
+    def put(self, kind, task_id, payload, delay=0):
+        """add a task unless a task of the same id was ever added
+
+
+        Args:
+            kind: the kind of the task
+            task_id: the id of the task
+            payload: a json serializable dictionary
+            delay: the time duration in seconds before the task can be claimed
+
+        Returns:
+            True if the task is added
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def claim(self, kinds, lease_duration):
+        """lease the next visible task. an expired lease is visible again.
+
+
+        Args:
+            kinds: the kinds of task to claim, the first kind first
+            lease_duration: the time duration in seconds of the lease
+
+        Returns:
+            a `Lease`. None if no task is visible.
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def extend(self, lease, lease_duration, payload=None):
+        """extend a lease, e.g. while a long conversation is downloaded
+
+
+        Args:
+            lease: the `Lease`
+            lease_duration: the time duration in seconds from now
+            payload: a new payload to save, e.g. the progress of the task. None to keep it.
+
+        Returns:
+            False if the lease is lost to another worker
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def release(self, lease, delay=0, payload=None, count_attempt=False):
+        """give a leased task back to the queue, to be claimed again after `delay` seconds
+
+        A task given back on purpose, e.g. a search page without new results
+        polled later or a conversation interrupted by `stop()`, does not count
+        against `max_attempts`.
+
+        Args:
+            lease: the `Lease`
+            delay: the time duration in seconds before the task can be claimed
+            payload: a new payload to save. None to keep it.
+            count_attempt: count the lease as a failed attempt, e.g. after an error.
+
+        Returns:
+            False if the lease is lost to another worker
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def complete(self, lease):
+        """mark a task done. it is never claimed again.
+
+
+        Args:
+            lease: the `Lease`
+
+        Returns:
+            True if the task is completed by this call, False if it was done already
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def fail(self, lease):
+        """give a task up. it is never claimed again.
+
+
+        Args:
+            lease: the `Lease`
+
+        Returns:
+            None
+        """
+        return NotImplemented
+
+    @abc.abstractmethod
+    def stats(self):
+        """count the tasks by state
+
+
+        Args: None
+
+        Returns:
+            a dictionary of the amount of "pending", "leased", "done" and "failed" tasks
+        """
+        return NotImplemented
+
+    def close(self):
+        """release the resources
+
+
+        Args: None
+
+        Returns:
+            None
+        """
+        pass
@@ -0,0 +1,158 @@
+import json
+import time
+import uuid
+
+from tweet_crawler import logger
+from tweet_crawler.work_queues.framework import WorkQueue, Lease, PENDING, LEASED, DONE, FAILED
+
+
+def _import_redis():
+    try:
+        import redis
+    except ImportError:
+        raise ImportError("RedisWorkQueue requires redis. Install it with `pip install redis`.")
+    return redis
+
+
+class RedisWorkQueue(WorkQueue):
+    """A work queue on a Redis server, shared by the processes of many hosts
+
+    Keys, below `prefix`:
+        task:<task_id>      a hash of the kind, the payload, the state, the lease token and the attempts
+        pending:<kind>      a sorted set of the pending task ids, scored by the time they are visible
+        leased              a sorted set of the leased task ids, scored by their lease deadline
+        done, failed        sets of the finished task ids
+        kinds               the set of the kinds ever put
+
+    Only plain commands are used. Whoever removes a task id from a sorted set
+    owns the move, so two workers never claim one visible task, and `SADD`
+    on `done` elects the single completion of a task.
+    """
+
+    def __init__(self, client, prefix="tweet_crawler", max_attempts=5):
+        """
+        Args:
+            client: a `redis.Redis` created with `decode_responses=True`, or anything with the same commands
+            prefix: the prefix of the keys, to run many queues on one server
+            max_attempts: the amount of failed or expired leases of a task before it is failed
+        """
+        self.client = client
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """connect to a redis url, e.g. "redis://localhost:6379/0". requires redis.
+        """
+        redis = _import_redis()
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def __key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    def put(self, kind, task_id, payload, delay=0):
+        task_key = self.__key("task", task_id)
+        if not self.client.hsetnx(task_key, "kind", kind):
+            return False
+        self.client.hset(task_key, mapping={"payload": json.dumps(payload), "state": PENDING, "token": "", "attempts": 0})
+        self.client.sadd(self.__key("kinds"), kind)
+        self.client.zadd(self.__key("pending", kind), {task_id: time.time() + delay})
+        return True
+
+    def __requeue_expired(self, now):
+        for task_id in self.client.zrangebyscore(self.__key("leased"), "-inf", now):
+            if self.client.zrem(self.__key("leased"), task_id) == 0:
+                continue
+            task_key = self.__key("task", task_id)
+            kind = self.client.hget(task_key, "kind")
+            self.client.hset(task_key, mapping={"state": PENDING, "token": ""})
+            self.client.zadd(self.__key("pending", kind), {task_id: now})
+            logger.info("The lease of task {} expired.".format(task_id))
+
+    def claim(self, kinds, lease_duration):
+        now = time.time()
+        self.__requeue_expired(now)
+        for kind in kinds:
+            pending_key = self.__key("pending", kind)
+            while True:
+                candidates = self.client.zrangebyscore(pending_key, "-inf", now, start=0, num=1)
+                if len(candidates) == 0:
+                    break
+                task_id = candidates[0]
+                if self.client.zrem(pending_key, task_id) == 0:
+                    # claimed by another worker in between
+                    continue
+
+                task_key = self.__key("task", task_id)
+                attempts = self.client.hincrby(task_key, "attempts", 1)
+                if attempts > self.max_attempts:
+                    logger.warning("Task {} failed after {} attempts.".format(task_id, attempts - 1))
+                    self.client.hset(task_key, mapping={"state": FAILED, "token": ""})
+                    self.client.sadd(self.__key("failed"), task_id)
+                    continue
+
+                token = uuid.uuid4().hex
+                deadline = now + lease_duration
+                self.client.hset(task_key, mapping={"state": LEASED, "token": token})
+                self.client.zadd(self.__key("leased"), {task_id: deadline})
+                payload = json.loads(self.client.hget(task_key, "payload"))
+                return Lease(task_id, kind, payload, token, deadline, attempts)
+        return None
+
+    def __owns(self, lease):
+        return self.client.hget(self.__key("task", lease.task_id), "token") == lease.token
+
+    def extend(self, lease, lease_duration, payload=None):
+        if not self.__owns(lease):
+            return False
+        deadline = time.time() + lease_duration
+        # a lease requeued in between is not added back, the next extend finds it lost
+        self.client.zadd(self.__key("leased"), {lease.task_id: deadline}, xx=True)
+        if payload is not None:
+            self.client.hset(self.__key("task", lease.task_id), "payload", json.dumps(payload))
+            lease.payload = payload
+        lease.deadline = deadline
+        return True
+
+    def release(self, lease, delay=0, payload=None, count_attempt=False):
+        if not self.__owns(lease) or self.client.zrem(self.__key("leased"), lease.task_id) == 0:
+            return False
+        task_key = self.__key("task", lease.task_id)
+        mapping = {"state": PENDING, "token": ""}
+        if payload is not None:
+            mapping["payload"] = json.dumps(payload)
+            lease.payload = payload
+        self.client.hset(task_key, mapping=mapping)
+        if not count_attempt:
+            # takes back the attempt counted by `claim()`
+            self.client.hincrby(task_key, "attempts", -1)
+        self.client.zadd(self.__key("pending", lease.kind), {lease.task_id: time.time() + delay})
+        return True
+
+    def complete(self, lease):
+        # whoever did the work, the first to complete it wins
+        if self.client.sadd(self.__key("done"), lease.task_id) == 0:
+            return False
+        task_key = self.__key("task", lease.task_id)
+        self.client.hset(task_key, mapping={"state": DONE, "token": ""})
+        self.client.zrem(self.__key("leased"), lease.task_id)
+        self.client.zrem(self.__key("pending", lease.kind), lease.task_id)
+        self.client.srem(self.__key("failed"), lease.task_id)
+        return True
+
+    def fail(self, lease):
+        if self.client.sismember(self.__key("done"), lease.task_id):
+            return
+        self.client.hset(self.__key("task", lease.task_id), mapping={"state": FAILED, "token": ""})
+        self.client.sadd(self.__key("failed"), lease.task_id)
+        self.client.zrem(self.__key("leased"), lease.task_id)
+        self.client.zrem(self.__key("pending", lease.kind), lease.task_id)
+
+    def stats(self):
+        pending = sum(self.client.zcard(self.__key("pending", kind)) for kind in self.client.smembers(self.__key("kinds")))
+        return {
+            PENDING: pending,
+            LEASED: self.client.zcard(self.__key("leased")),
+            DONE: self.client.scard(self.__key("done")),
+            FAILED: self.client.scard(self.__key("failed")),
+        }
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+from tweet_crawler import logger
+from tweet_crawler.work_queues.framework import WorkQueue, Lease, PENDING, LEASED, DONE, FAILED
+
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS tasks (
+        task_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        state TEXT NOT NULL,
+        visible_at REAL NOT NULL,
+        lease_token TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS tasks_visible ON tasks (kind, state, visible_at)",
+]
+
+
+class SqliteWorkQueue(WorkQueue):
+    """A work queue in a SQLite database, shared by the processes of one host
+
+    A pending task is visible from `visible_at`. A leased task keeps it's
+    lease deadline in `visible_at`, so an expired lease is claimed exactly
+    like a pending task. Every claim runs in a `BEGIN IMMEDIATE` transaction,
+    which serializes the claims of all processes.
+    """
+
+    def __init__(self, path, max_attempts=5, timeout=30):
+        """
+        Args:
+            path: the database file
+            max_attempts: the amount of failed or expired leases of a task before it is failed
+            timeout: the maximum time in seconds to wait for the lock of another process
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        self.__local = threading.local()
+        self.__connections = []
+        self.__lock = threading.Lock()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            connection.execute(statement)
+
+    def _connection(self):
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            # autocommit, the transactions are opened explicitly
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+            with self.__lock:
+                self.__connections.append(connection)
+        return connection
+
+    def __transaction(self, work):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def put(self, kind, task_id, payload, delay=0):
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO tasks (task_id, kind, payload, state, visible_at) VALUES (?, ?, ?, ?, ?)",
+            (task_id, kind, json.dumps(payload), PENDING, time.time() + delay))
+        return cursor.rowcount == 1
+
+    def claim(self, kinds, lease_duration):
+        def work(connection):
+            now = time.time()
+            for kind in kinds:
+                while True:
+                    row = connection.execute(
+                        "SELECT task_id, payload, attempts FROM tasks WHERE kind = ? AND state IN (?, ?) AND visible_at <= ? ORDER BY visible_at LIMIT 1",
+                        (kind, PENDING, LEASED, now)).fetchone()
+                    if row is None:
+                        break
+                    task_id, payload, attempts = row
+                    if attempts >= self.max_attempts:
+                        logger.warning("Task {} failed after {} attempts.".format(task_id, attempts))
+                        connection.execute("UPDATE tasks SET state = ?, lease_token = NULL WHERE task_id = ?", (FAILED, task_id))
+                        continue
+                    token = uuid.uuid4().hex
+                    deadline = now + lease_duration
+                    connection.execute(
+                        "UPDATE tasks SET state = ?, visible_at = ?, lease_token = ?, attempts = ? WHERE task_id = ?",
+                        (LEASED, deadline, token, attempts + 1, task_id))
+                    return Lease(task_id, kind, json.loads(payload), token, deadline, attempts + 1)
+            return None
+        return self.__transaction(work)
+
+    def __update_lease(self, lease, state, visible_at, payload, refund=0):
+        # `refund` takes back the attempt counted by `claim()`
+        if payload is None:
+            cursor = self._connection().execute(
+                "UPDATE tasks SET state = ?, visible_at = ?, attempts = MAX(attempts - ?, 0) WHERE task_id = ? AND state = ? AND lease_token = ?",
+                (state, visible_at, refund, lease.task_id, LEASED, lease.token))
+        else:
+            cursor = self._connection().execute(
+                "UPDATE tasks SET state = ?, visible_at = ?, attempts = MAX(attempts - ?, 0), payload = ? WHERE task_id = ? AND state = ? AND lease_token = ?",
+                (state, visible_at, refund, json.dumps(payload), lease.task_id, LEASED, lease.token))
+            if cursor.rowcount == 1:
+                lease.payload = payload
+        return cursor.rowcount == 1
+
+    def extend(self, lease, lease_duration, payload=None):
+        deadline = time.time() + lease_duration
+        if not self.__update_lease(lease, LEASED, deadline, payload):
+            return False
+        lease.deadline = deadline
+        return True
+
+    def release(self, lease, delay=0, payload=None, count_attempt=False):
+        return self.__update_lease(lease, PENDING, time.time() + delay, payload, refund=0 if count_attempt else 1)
+
+    def complete(self, lease):
+        # whoever did the work, the first to complete it wins
+        cursor = self._connection().execute(
+            "UPDATE tasks SET state = ?, lease_token = NULL WHERE task_id = ? AND state != ?",
+            (DONE, lease.task_id, DONE))
+        return cursor.rowcount == 1
+
+    def fail(self, lease):
+        self._connection().execute(
+            "UPDATE tasks SET state = ?, lease_token = NULL WHERE task_id = ? AND state != ?",
+            (FAILED, lease.task_id, DONE))
+
+    def stats(self):
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for state, count in self._connection().execute("SELECT state, COUNT(*) FROM tasks GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def close(self):
+        with self.__lock:
+            for connection in self.__connections:
+                connection.close()
+            self.__connections = []
+        self.__local = threading.local()